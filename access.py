@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+
+from data_store import LOCATION_COLUMNS
+
+# Age groups in the order of the select-multiple options for "who slept under this net last night"
+AGE_GROUPS = ['Infant (<1 yr)', 'Young child (1-4 yrs)', 'Older child (5-9 yrs)', 'Adolescent (10-19)', 'Adult']
+AGE_GROUP_BINS = [0, 1, 5, 10, 20, np.inf]
+# Ages at or above this are Kobo "don't know" codes (98, 99), like 'NK'
+UNKNOWN_AGE = 98
+# Select-multiple question per net table recording which age groups used the net last night
+NET_USERS_QUESTION = {'campnets': 'usdnet', 'othernets': 'othrslpyes'}
+NET_USER_COLUMNS = {
+    table: [f"{question}/{option}" for option in range(1, len(AGE_GROUPS) + 1)]
+    for table, question in NET_USERS_QUESTION.items()
+}
+
+# Columns build_household_access() reads from each table
+ACCESS_COLUMNS = {
+    'campnets': ['hhid'] + NET_USER_COLUMNS['campnets'],
+    'hhmembers': ['hhid', 'styhr', 'ageyrs'],
+    'othernets': ['hhid', 'othrnetsleep'] + NET_USER_COLUMNS['othernets'],
+}
+
+POPULATION_PREFIX = 'population_'
+USERS_PREFIX = 'users_'
+
+
+def household_positions(households, hhids):
+    """Return each row's position in the shared hhid index, -1 for households not in it"""
+    return households.get_indexer(np.asarray(hhids))
+
+
+def _tally(positions, size, weights=None):
+    """Sum weights (default 1) per household position in one pass, ignoring rows outside the index"""
+    known = positions >= 0
+    weights = None if weights is None else np.asarray(weights, dtype=float)[known]
+    return np.bincount(positions[known], weights=weights, minlength=size)
+
+
+def _flags(df, columns):
+    """Return a (rows, columns) boolean matrix from 0/1 or boolean columns, missing as False"""
+    present = [col for col in columns if col in df.columns]
+    matrix = np.zeros((len(df), len(columns)), dtype=bool)
+    for i, col in enumerate(columns):
+        if col in present:
+            matrix[:, i] = df[col].to_numpy(dtype=float, na_value=0) > 0
+    return matrix
+
+
+def age_group_codes(hhmembers_df):
+    """Return each member's AGE_GROUPS position, -1 when the age is unknown"""
+    ages = pd.to_numeric(hhmembers_df['ageyrs'].astype(str), errors='coerce').to_numpy(dtype=float, copy=True)
+    ages[ages >= UNKNOWN_AGE] = np.nan
+    codes = np.digitize(ages, AGE_GROUP_BINS[1:-1])
+    return np.where(np.isnan(ages), -1, codes)
+
+
+def build_household_access(household_summary, campnets_df, hhmembers_df, othernets_df):
+    """Build one row per household with the counts behind the access and use indicators
+
+    Every table is mapped onto the household summary's hhid index once and
+    tallied with bincount, so no table is merged with another. Columns: the
+    four location levels, members, de_facto (slept there last night),
+    campaign_nets, other_nets, nets, campaign_nets_used, other_nets_used
+    (used by anyone last night), persons_with_access (de facto members
+    covered at one net per two people), households_with_members,
+    households_enough_nets (at least one net per two members) and, per age
+    group, ``population_<group>`` and ``users_<group>``: de facto members of
+    the group in households where a net was used by that group last night.
+    """
+    households = household_summary.index
+    size = len(households)
+    access = household_summary[LOCATION_COLUMNS].copy()
+
+    member_positions = household_positions(households, hhmembers_df['hhid'])
+    de_facto = (hhmembers_df['styhr'] == 'Yes').to_numpy()
+    access['members'] = _tally(member_positions, size)
+    access['de_facto'] = _tally(member_positions, size, de_facto)
+
+    campaign_positions = household_positions(households, campnets_df['hhid'])
+    other_positions = household_positions(households, othernets_df['hhid'])
+    campaign_users = _flags(campnets_df, NET_USER_COLUMNS['campnets'])
+    other_users = _flags(othernets_df, NET_USER_COLUMNS['othernets'])
+    if 'othrnetsleep' in othernets_df.columns:
+        other_users &= (othernets_df['othrnetsleep'] == 'Yes').to_numpy()[:, None]
+    access['campaign_nets'] = _tally(campaign_positions, size)
+    access['other_nets'] = _tally(other_positions, size)
+    access['nets'] = access['campaign_nets'] + access['other_nets']
+    access['campaign_nets_used'] = _tally(campaign_positions, size, campaign_users.any(axis=1))
+    access['other_nets_used'] = _tally(other_positions, size, other_users.any(axis=1))
+    access['persons_with_access'] = np.minimum(access['de_facto'], 2 * access['nets'])
+    access['households_with_members'] = access['de_facto'] > 0
+    access['households_enough_nets'] = access['households_with_members'] & (2 * access['nets'] >= access['de_facto'])
+
+    age_codes = age_group_codes(hhmembers_df)
+    for code, group in enumerate(AGE_GROUPS):
+        population = _tally(member_positions, size, de_facto & (age_codes == code))
+        net_used = (_tally(campaign_positions, size, campaign_users[:, code])
+                    + _tally(other_positions, size, other_users[:, code])) > 0
+        access[POPULATION_PREFIX + group] = population
+        access[USERS_PREFIX + group] = np.where(net_used, population, 0)
+
+    count_columns = [col for col in access.columns if col not in LOCATION_COLUMNS]
+    access[count_columns] = access[count_columns].astype(int)
+    return access
+
+
+def build_access_cube(household_access):
+    """Sum the household access counts to one row per district/subcounty/parish/village"""
+    counts = household_access.drop(columns=LOCATION_COLUMNS)
+    cube = counts.groupby([household_access[col] for col in LOCATION_COLUMNS], observed=True).sum()
+    cube.index = cube.index.remove_unused_levels()
+    return cube.sort_index()
+
+
+def _percentage(numerator, denominator):
+    return float(numerator / denominator * 100) if denominator else 0.0
+
+
+def access_indicators(cube):
+    """Return the headline access and use indicators for a (sliced) access cube"""
+    totals = cube.sum()
+    population = sum(totals[POPULATION_PREFIX + group] for group in AGE_GROUPS)
+    users = sum(totals[USERS_PREFIX + group] for group in AGE_GROUPS)
+    return {
+        'de_facto_population': int(totals['de_facto']),
+        'nets': int(totals['nets']),
+        'nets_per_two_people': float(2 * totals['nets'] / totals['de_facto']) if totals['de_facto'] else 0.0,
+        'population_with_access_pct': _percentage(totals['persons_with_access'], totals['de_facto']),
+        'households_enough_nets_pct': _percentage(totals['households_enough_nets'], totals['households_with_members']),
+        'use_pct': _percentage(users, population),
+    }
+
+
+def use_by_age_group(cube):
+    """Return de facto population, net users and use (%) per age group"""
+    totals = cube.sum()
+    table = pd.DataFrame({
+        'population': [totals[POPULATION_PREFIX + group] for group in AGE_GROUPS],
+        'users': [totals[USERS_PREFIX + group] for group in AGE_GROUPS],
+    }, index=pd.Index(AGE_GROUPS, name='age_group'))
+    table['use_pct'] = (table['users'] / table['population'].where(table['population'] > 0) * 100).fillna(0)
+    return table
+
+
+def net_source_comparison(cube):
+    """Compare campaign and other (non-campaign) nets: count, nets used last night and use (%)"""
+    totals = cube.sum()
+    table = pd.DataFrame({
+        'nets': [totals['campaign_nets'], totals['other_nets']],
+        'nets_used': [totals['campaign_nets_used'], totals['other_nets_used']],
+    }, index=pd.Index(['Campaign', 'Other'], name='source'))
+    table['used_pct'] = (table['nets_used'] / table['nets'].where(table['nets'] > 0) * 100).fillna(0)
+    return table
+
+
+def access_by(cube, levels):
+    """Return population with access (%), nets per two people and use (%) rolled up to the given levels"""
+    rolled = cube.groupby(level=levels, observed=True).sum()
+    population = rolled[[POPULATION_PREFIX + group for group in AGE_GROUPS]].sum(axis=1)
+    users = rolled[[USERS_PREFIX + group for group in AGE_GROUPS]].sum(axis=1)
+    de_facto = rolled['de_facto'].where(rolled['de_facto'] > 0)
+    return pd.DataFrame({
+        'de_facto_population': rolled['de_facto'],
+        'nets': rolled['nets'],
+        'nets_per_two_people': (2 * rolled['nets'] / de_facto).fillna(0),
+        'population_with_access_pct': (rolled['persons_with_access'] / de_facto * 100).fillna(0),
+        'use_pct': (users / population.where(population > 0) * 100).fillna(0),
+    })
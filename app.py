@@ -1,13 +1,35 @@
+import os
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import numpy as np
-from datetime import datetime
-import folium
-from streamlit_folium import folium_static
-import json
-import matplotlib as plt
+# Plotting and mapping libraries (plotly express, folium, matplotlib) are imported inside the sections that draw
+# with them, so a cold start or recycled worker only pays for them once a section renders;
+# scripts/check_import_time.py holds the startup imports to a budget
+from data_store import LOCATION_COLUMNS, load_table, data_version, union_columns
+from metrics import (
+    HOUSEHOLD_SUMMARY_COLUMNS, build_household_summary, brand_counts,
+    build_location_cube, slice_cube, roll_up, net_counts_by, brand_pivot, filtered_view, filter_by_location,
+)
+from durability import (
+    DURABILITY_COLUMNS, build_net_frame, build_lost_frame, household_survey_dates, durability_summary,
+    attrition_reasons, net_survival,
+)
+from access import (
+    ACCESS_COLUMNS, build_household_access, build_access_cube, access_indicators, use_by_age_group,
+    net_source_comparison, access_by,
+)
+from snapshots import snapshot_version, load_trend, load_brand_trend, round_deltas
+from validation import CHECKS, issue_counts, load_issues
+from bootstrap import lost_percentage_intervals, brand_share_intervals, format_interval
+from filter_cache import LRUCache
+from profiling import PROFILE_MODE, RunProfiler
+from map_view import MAP_HEIGHT_PX, MAP_WIDTH_PX, render_map_html
+from spatial import build_household_index, village_centroids
+from table_view import PAGE_SIZE, color_scale, gradient_css, page_count, search_rows, table_page
+import sql_backend
+
+# 'pandas' computes from the columnar cache in memory; 'sql' pushes filters and
+# aggregates down to the database configured through database.py (DB_BACKEND)
+DATA_BACKEND = os.getenv('DASHBOARD_BACKEND', 'pandas').lower()
 
 # Configure the page
 st.set_page_config(
@@ -16,6 +38,9 @@ st.set_page_config(
     layout="wide"
 )
 
+# Per-section timings for this rerun: DASHBOARD_PROFILE for every session, ?profile=1 for one
+profiler = RunProfiler(PROFILE_MODE or ('timing' if st.query_params.get('profile') else ''))
+
 # Apply custom CSS
 st.markdown("""
     <style>
@@ -39,20 +64,197 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Cache data loading
+# Columns each dashboard section reads; load_data() only materialises their union
+SECTION_COLUMNS = {
+    'filters': {'survey': ['selected_district', 'selected_subcounty']},
+    'kpis': {'survey': ['hhid', 'selected_parish', 'selected_village']},
+    'location_coverage': {'survey': LOCATION_COLUMNS},
+    'brand_distribution': {'campnets': ['brand']},
+    'coverage_map': {'survey': ['_gpsloc_latitude', '_gpsloc_longitude']},
+    'household_summary': HOUSEHOLD_SUMMARY_COLUMNS,
+    'durability': DURABILITY_COLUMNS,
+    'access': ACCESS_COLUMNS,
+}
+DASHBOARD_COLUMNS = union_columns(*SECTION_COLUMNS.values())
+
+# Detail views load every column of a table, but only when opened
+DETAIL_TABLES = {
+    'Survey Data': 'survey',
+    'Campaign Nets': 'campnets',
+    'Lost Nets': 'lostnets',
+}
+
+# Cache data loading, keyed on the source files' version so edited exports are picked up
 @st.cache_data
-def load_data():
-    """Load and process the survey, campaign nets, and lost nets data"""
-    survey_df = pd.read_csv('survey.csv')
-    campnets_df = pd.read_csv('campnets.csv')
-    lostnets_df = pd.read_csv('lostnets.csv')
+def load_data(version):
+    """Load the columns the dashboard uses from the survey, campaign nets, and lost nets caches"""
+    survey_df = load_table('survey', DASHBOARD_COLUMNS['survey'])
+    campnets_df = load_table('campnets', DASHBOARD_COLUMNS['campnets'])
+    lostnets_df = load_table('lostnets', DASHBOARD_COLUMNS['lostnets'])
     
     return survey_df, campnets_df, lostnets_df
 
+@st.cache_data(max_entries=len(DETAIL_TABLES))
+def load_detail_table(version, name):
+    """Load all columns of one table for the detail view"""
+    return load_table(name)
+
+@st.cache_data(max_entries=len(DETAIL_TABLES) * 4)
+def load_detail_table_sql(version, name, district, subcounty):
+    """Load all columns of one table for the selected households from the database"""
+    return sql_backend.load_detail_table(name, district, subcounty)
+
+@st.cache_data
+def load_household_summary(version):
+    """Build the per-household net summary once per data load"""
+    survey_df, campnets_df, lostnets_df = load_data(version)
+    return build_household_summary(survey_df, campnets_df, lostnets_df)
+
+@st.cache_data
+def load_location_cube(version):
+    """Build the location x brand aggregate cube once per data load"""
+    survey_df, _, _ = load_data(version)
+    return build_location_cube(survey_df, load_household_summary(version))
+
+@st.cache_resource
+def prepare_database():
+    """Create the indexes the pushed-down queries use, once per server"""
+    sql_backend.ensure_indexes()
+    return {table: set(sql_backend.table_columns(table)) for table in ['survey', 'campnets', 'lostnets']}
+
+@st.cache_data
+def load_household_summary_sql(version):
+    """Aggregate the per-household net summary inside the database"""
+    return sql_backend.query_household_summary()
+
+@st.cache_data
+def load_location_cube_sql(version):
+    """Aggregate the location x brand cube inside the database"""
+    return sql_backend.query_location_cube()
+
+@st.cache_data
+def load_durability_frames(version):
+    """Build the per-net hole index/age frame and the lost-net frame once per data load"""
+    if DATA_BACKEND == 'sql':
+        survey_df, campnets_df, lostnets_df = sql_backend.load_durability_tables()
+        summary = load_household_summary_sql(version)
+    else:
+        survey_df, campnets_df, lostnets_df = load_data(version)
+        summary = load_household_summary(version)
+    nets = build_net_frame(campnets_df, summary, household_survey_dates(survey_df))
+    return nets, build_lost_frame(lostnets_df, summary)
+
+@st.cache_data
+def missing_access_tables(version):
+    """Name the member/other-net rosters the SQL database lacks, once per data load"""
+    return sql_backend.missing_tables(['hhmembers', 'othernets'])
+
+@st.cache_data
+def load_access_cube(version):
+    """Build the household member and net access/use counts per village once per data load"""
+    if DATA_BACKEND == 'sql':
+        campnets_access, hhmembers_df, othernets_df = sql_backend.load_access_tables()
+        summary = load_household_summary_sql(version)
+    else:
+        _, campnets_access, _ = load_data(version)
+        hhmembers_df = load_table('hhmembers', DASHBOARD_COLUMNS['hhmembers'])
+        othernets_df = load_table('othernets', DASHBOARD_COLUMNS['othernets'])
+        summary = load_household_summary(version)
+    return build_access_cube(build_household_access(summary, campnets_access, hhmembers_df, othernets_df))
+
+@st.cache_data
+def load_validation_issues(version):
+    """Read the issues validation.py found when this data version was ingested"""
+    if DATA_BACKEND == 'sql':
+        return sql_backend.load_validation_issues()
+    return load_issues()
+
+@st.cache_data(max_entries=32)
+def load_round_trends(archive_version, district, subcounty):
+    """Read the selection's per-snapshot KPIs and brand counts from the archive's stored aggregates"""
+    return load_trend(district, subcounty), load_brand_trend(district, subcounty)
+
+@st.cache_data(max_entries=32)
+def load_selection_intervals(version, district, subcounty):
+    """Cluster-bootstrap intervals for the selection's Nets Lost (%) and brand shares"""
+    cube = slice_cube(location_cube, district, subcounty)
+    return lost_percentage_intervals(cube), brand_share_intervals(cube)
+
+@st.cache_data
+def load_subcounty_intervals(version):
+    """Cluster-bootstrap intervals for Nets Lost (%) in every subcounty"""
+    return lost_percentage_intervals(location_cube, ['selected_district', 'selected_subcounty'])
+
+@st.cache_data(max_entries=32)
+def render_coverage_map(version, district, subcounty):
+    """Render the coverage map HTML for a selection once per data version"""
+    households = filter_by_location(household_summary, district, subcounty)
+    return render_map_html(households)
+
+@st.cache_resource(max_entries=2)
+def load_household_index(version):
+    """Grid index over every household's GPS point, weighted by its lost nets, built once per data version"""
+    return build_household_index(household_summary, weights='nets_lost')
+
+@st.cache_data
+def load_village_centroids(version):
+    """Median position and spread of each village's households, once per data version"""
+    return village_centroids(household_summary)
+
+@st.cache_resource
+def get_filter_cache():
+    """One filtered-view cache shared by every session on this server"""
+    return LRUCache(maxsize=32)
+
+# Large tables are searched, sorted and paged here; the browser only receives the page it shows,
+# shaded against the whole table's range. Paging reruns just this fragment.
+@st.fragment
+def paged_table(df, key, gradient=None, cmap='Blues', formats=None, totals=None, page_size=PAGE_SIZE):
+    scale = color_scale(df, gradient)
+    if len(df) > page_size:
+        search_col, sort_col, order_col, page_col = st.columns([3, 2, 1, 1])
+        query = search_col.text_input("Search", key=f"{key}_search", placeholder="Filter rows")
+        sort_choice = sort_col.selectbox("Sort by", ['Table order'] + list(df.columns), key=f"{key}_sort")
+        sort_by = None if sort_choice == 'Table order' else sort_choice
+        descending = order_col.toggle("Descending", key=f"{key}_descending")
+        rows = df[search_rows(df, query)] if query else df
+        pages = page_count(len(rows), page_size)
+        # A narrower search can leave the remembered page past the end
+        if st.session_state.get(f"{key}_page", 1) > pages:
+            st.session_state[f"{key}_page"] = pages
+        page = page_col.number_input("Page", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+        matched = len(rows)
+        rows = table_page(rows, sort_by, descending, page, page_size)
+        first = (page - 1) * page_size
+        st.caption(f"Rows {min(first + 1, matched):,}–{first + len(rows):,} of {matched:,}"
+                   + (f" matching '{query}'" if query else ""))
+    else:
+        rows = df
+    if totals is not None:
+        rows = pd.concat([rows, totals])
+    styler = rows.style.apply(lambda page_rows: gradient_css(page_rows, scale, cmap), axis=None)
+    if formats:
+        styler = styler.format(formats)
+    st.dataframe(styler, use_container_width=True, hide_index=True)
+
 # Load the data
-survey_df, campnets_df, lostnets_df = load_data()
+profiler.start_section("Data load")
+if DATA_BACKEND == 'sql':
+    table_columns = prepare_database()
+    version = sql_backend.data_version()
+    household_summary = load_household_summary_sql(version)
+    location_cube = load_location_cube_sql(version)
+else:
+    version = data_version()
+    survey_df, campnets_df, lostnets_df = load_data(version)
+    household_summary = load_household_summary(version)
+    location_cube = load_location_cube(version)
+    table_columns = {'survey': set(survey_df.columns), 'campnets': set(campnets_df.columns)}
+
+profiler.add_rows(len(household_summary))
 
 # Title
+profiler.start_section("Sidebar and filters")
 st.title("🦟 Vestergaard LLIN Durability Study")
 
 # Sidebar
@@ -66,33 +268,58 @@ with st.sidebar:
     """)
     
     # Get unique districts and subcounties
-    districts = sorted(survey_df['selected_district'].unique()) if 'selected_district' in survey_df.columns else []
+    districts = sorted(location_cube.index.get_level_values('selected_district').unique())
     selected_district = st.selectbox("Select District", ['All'] + districts)
     
     if selected_district != 'All':
-        subcounties = sorted(survey_df[survey_df['selected_district'] == selected_district]['selected_subcounty'].unique()) if 'selected_subcounty' in survey_df.columns else []
+        subcounties = sorted(slice_cube(location_cube, selected_district).index.get_level_values('selected_subcounty').unique())
         selected_subcounty = st.selectbox("Select Subcounty", ['All'] + subcounties)
     else:
         selected_subcounty = 'All'
 
-# Filter data based on selection
-def filter_data(df):
-    if selected_district != 'All':
-        df = df[df['selected_district'] == selected_district]
-        if selected_subcounty != 'All':
-            df = df[df['selected_subcounty'] == selected_subcounty]
-    return df
+# Filter data based on selection, reusing any session's work for the same selection
+def compute_filtered_view():
+    if DATA_BACKEND == 'sql':
+        return sql_backend.filtered_view(selected_district, selected_subcounty)
+    return filtered_view(survey_df, campnets_df, lostnets_df, location_cube, selected_district, selected_subcounty)
 
-filtered_survey = filter_data(survey_df)
-total_households = len(filtered_survey)
+filter_cache = get_filter_cache()
+view = filter_cache.get_or_compute(
+    (DATA_BACKEND, version, selected_district, selected_subcounty),
+    compute_filtered_view
+)
+filtered_survey = view['survey']
+filtered_cube = view['cube']
+profiler.add_rows(len(filtered_survey))
 
 # Calculate metrics first
-total_villages = filtered_survey.groupby(['selected_village', 'selected_parish']).ngroups
-total_campaign_nets = len(campnets_df[campnets_df['hhid'].isin(filtered_survey['hhid'])])
-total_lost_nets = len(lostnets_df[lostnets_df['hhid'].isin(filtered_survey['hhid'])])
-lost_nets_percentage = (total_lost_nets / (total_lost_nets + total_campaign_nets)) * 100 if (total_lost_nets + total_campaign_nets) > 0 else 0
+total_households = view['kpis']['households']
+total_villages = view['kpis']['villages']
+total_campaign_nets = view['kpis']['nets_tagged']
+total_lost_nets = view['kpis']['nets_lost']
+lost_nets_percentage = view['kpis']['lost_percentage']
+lost_interval, brand_intervals = load_selection_intervals(version, selected_district, selected_subcounty)
+lost_interval_text = f"95% CI {format_interval(lost_interval['lower'].iloc[0], lost_interval['upper'].iloc[0])}"
+
+with st.sidebar:
+    with st.expander("Filter cache"):
+        cache_stats = filter_cache.stats()
+        st.caption(
+            f"{cache_stats['size']}/{cache_stats['maxsize']} selections cached · "
+            f"{cache_stats['hits']:,} hits · {cache_stats['misses']:,} misses · "
+            f"{cache_stats['hit_rate']:.0%} hit rate"
+        )
+
+    # Checked once per ingest; issues without a location (orphan rows) only show under 'All'
+    selection_issues = filter_by_location(load_validation_issues(version), selected_district, selected_subcounty)
+    with st.expander(f"Data quality ({len(selection_issues):,} issues)"):
+        for check, count in issue_counts(selection_issues).items():
+            st.caption(f"{CHECKS[check]}: {count:,}")
+        if len(selection_issues):
+            st.dataframe(selection_issues, use_container_width=True, hide_index=True)
 
 # KPIs
+profiler.start_section("KPIs")
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
@@ -120,452 +347,601 @@ with col4:
     st.metric(
         "Nets Lost (%)", 
         f"{lost_nets_percentage:.1f}%",
-        help="Percentage of nets that were lost, damaged, or given away"
-    )
-
-st.markdown("---")
-
-# Add Location Summary Section
-st.header("Location Coverage Summary")
-
-# Create three columns for district, subcounty, and village summaries
-loc_col1, loc_col2 = st.columns(2)
-
-with loc_col1:
-    st.subheader("District Coverage")
-    
-    # District summary
-    district_summary = survey_df['selected_district'].value_counts().reset_index()
-    district_summary.columns = ['District', 'Number of Households']
-    
-    # District pie chart
-    fig_district = px.pie(
-        district_summary,
-        values='Number of Households',
-        names='District',
-        title='Household Distribution by District',
-        hole=0.4
-    )
-    fig_district.update_traces(textposition='inside', textinfo='percent+label')
-    st.plotly_chart(fig_district, use_container_width=True, key="district_pie")
-    
-    # District frequency table
-    st.markdown("#### District Frequency Table")
-    st.dataframe(
-        district_summary.style.background_gradient(cmap='Blues'),
-        use_container_width=True
+        help="Percentage of nets that were lost, damaged, or given away. "
+             "The interval resamples villages within subcounties (cluster bootstrap)."
     )
+    st.caption(lost_interval_text)
+
+# Everything below the KPIs renders in tabs; only the open tab runs, and widgets inside a
+# fragment rerun just that fragment
+def render_location_coverage():
+    """Household coverage by district, subcounty and village"""
+    import plotly.express as px
+    # Add Location Summary Section
+    profiler.start_section("Location coverage")
+    profiler.add_rows(len(location_cube))
+    st.header("Location Coverage Summary")
+
+    # Create three columns for district, subcounty, and village summaries
+    loc_col1, loc_col2 = st.columns(2)
+
+    with loc_col1:
+        st.subheader("District Coverage")
+
+        # District summary
+        district_summary = roll_up(location_cube, ['selected_district'])['households'].sort_values(ascending=False).reset_index()
+        district_summary.columns = ['District', 'Number of Households']
+
+        # District pie chart
+        fig_district = px.pie(
+            district_summary,
+            values='Number of Households',
+            names='District',
+            title='Household Distribution by District',
+            hole=0.4
+        )
+        fig_district.update_traces(textposition='inside', textinfo='percent+label')
+        st.plotly_chart(fig_district, use_container_width=True, key="district_pie")
+
+        # District frequency table
+        st.markdown("#### District Frequency Table")
+        paged_table(district_summary, key="district_frequency")
+
+    with loc_col2:
+        st.subheader("Subcounty Coverage")
+
+        # Subcounty summary
+        subcounty_summary = roll_up(location_cube, ['selected_district', 'selected_subcounty'])['households'].reset_index()
+        subcounty_summary.columns = ['District', 'Subcounty', 'Number of Households']
+        subcounty_intervals = load_subcounty_intervals(version)
+        subcounty_keys = pd.MultiIndex.from_frame(subcounty_summary[['District', 'Subcounty']])
+        subcounty_summary['Nets Lost (%)'] = subcounty_intervals['estimate'].reindex(subcounty_keys).round(1).to_numpy()
+        subcounty_summary['95% CI'] = [
+            format_interval(lower, upper)
+            for lower, upper in subcounty_intervals[['lower', 'upper']].reindex(subcounty_keys).to_numpy()
+        ]
 
-with loc_col2:
-    st.subheader("Subcounty Coverage")
-    
-    # Subcounty summary
-    subcounty_summary = survey_df.groupby(['selected_district', 'selected_subcounty']).size().reset_index()
-    subcounty_summary.columns = ['District', 'Subcounty', 'Number of Households']
-    
-    # Subcounty pie chart
-    fig_subcounty = px.pie(
-        subcounty_summary,
-        values='Number of Households',
-        names='Subcounty',
-        title='Household Distribution by Subcounty',
-        hole=0.4
-    )
-    fig_subcounty.update_traces(textposition='inside', textinfo='percent+label')
-    st.plotly_chart(fig_subcounty, use_container_width=True, key="subcounty_pie")
-    
-    # Subcounty frequency table
-    st.markdown("#### Subcounty Frequency Table")
-    st.dataframe(
-        subcounty_summary.style.background_gradient(cmap='Blues'),
-        use_container_width=True
+        # Subcounty pie chart
+        fig_subcounty = px.pie(
+            subcounty_summary,
+            values='Number of Households',
+            names='Subcounty',
+            title='Household Distribution by Subcounty',
+            hole=0.4
+        )
+        fig_subcounty.update_traces(textposition='inside', textinfo='percent+label')
+        st.plotly_chart(fig_subcounty, use_container_width=True, key="subcounty_pie")
+
+        # Subcounty frequency table
+        st.markdown("#### Subcounty Frequency Table")
+        paged_table(subcounty_summary, key="subcounty_frequency", gradient=['Number of Households'],
+                    formats={'Nets Lost (%)': '{:.1f}%'})
+
+    # Village section in full width
+    profiler.start_section("Village coverage")
+    st.subheader("Village Coverage")
+
+    # Village summary - including parish to differentiate villages
+    village_summary = filtered_cube['households'].reset_index()
+    village_summary.columns = ['District', 'Subcounty', 'Parish', 'Village', 'Number of Households']
+
+    # Create a combined village name with parish for display
+    village_summary['Village_Display'] = village_summary.apply(
+        lambda x: f"{x['Village']} ({x['Parish']})" if x['Village'] == 'PAROMO' else x['Village'],
+        axis=1
     )
 
-# Village section in full width
-st.subheader("Village Coverage")
-
-# Village summary - including parish to differentiate villages
-village_summary = filtered_survey.groupby(['selected_district', 'selected_subcounty', 'selected_parish', 'selected_village']).size().reset_index()
-village_summary.columns = ['District', 'Subcounty', 'Parish', 'Village', 'Number of Households']
-
-# Create a combined village name with parish for display
-village_summary['Village_Display'] = village_summary.apply(
-    lambda x: f"{x['Village']} ({x['Parish']})" if x['Village'] == 'PAROMO' else x['Village'],
-    axis=1
-)
-
-# Verify total villages matches
-assert total_villages == len(village_summary), "Village count mismatch between KPI and frequency table"
-
-# Village bar chart
-fig_village = px.bar(
-    village_summary,
-    x='Village_Display',
-    y='Number of Households',
-    title=f'Household Distribution by Village (Total Villages: {total_villages})',
-    color='Number of Households',
-    color_continuous_scale='Blues',
-    labels={'Village_Display': 'Village (Parish)'}
-)
-fig_village.update_layout(
-    xaxis_tickangle=-45,
-    height=500  # Make the chart taller
-)
-st.plotly_chart(fig_village, use_container_width=True, key="village_bar")
-
-# Village frequency table
-st.markdown("#### Village Frequency Table")
-# Add percentage calculation
-village_summary['Percentage'] = (village_summary['Number of Households'] / village_summary['Number of Households'].sum() * 100).round(1)
-village_summary['Percentage'] = village_summary['Percentage'].astype(str) + '%'
-
-# Reorder columns for better readability
-village_summary = village_summary[['District', 'Subcounty', 'Parish', 'Village', 'Number of Households', 'Percentage']]
-
-# Display the table with custom width
-st.dataframe(
-    village_summary.style.background_gradient(cmap='Blues', subset=['Number of Households']),
-    use_container_width=True,
-    height=400  # Set a fixed height for the table
-)
-
-# Update the total villages metric to reflect the correct count
-total_villages = len(village_summary)
-
-# Update the villages metric in the KPI section
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    total_households = len(filtered_survey)
-    st.metric(
-        "Total Households Visited", 
-        f"{total_households:,}",
-        help="Number of households surveyed"
+    profiler.add_rows(len(village_summary))
+
+    # Village bar chart
+    fig_village = px.bar(
+        village_summary,
+        x='Village_Display',
+        y='Number of Households',
+        title=f'Household Distribution by Village (Total Villages: {total_villages})',
+        color='Number of Households',
+        color_continuous_scale='Blues',
+        labels={'Village_Display': 'Village (Parish)'}
     )
-
-with col2:
-    st.metric(
-        "Villages Visited", 
-        f"{total_villages:,}",
-        help="Number of unique villages visited during the survey (differentiated by parish when names are identical)"
+    fig_village.update_layout(
+        xaxis_tickangle=-45,
+        height=500  # Make the chart taller
     )
+    st.plotly_chart(fig_village, use_container_width=True, key="village_bar")
+
+    # Village frequency table
+    st.markdown("#### Village Frequency Table")
+    # Add percentage calculation
+    village_summary['Percentage'] = (village_summary['Number of Households'] / village_summary['Number of Households'].sum() * 100).round(1)
+
+    # Reorder columns for better readability
+    village_summary = village_summary[['District', 'Subcounty', 'Parish', 'Village', 'Number of Households', 'Percentage']]
+
+    paged_table(village_summary, key="village_frequency", gradient=['Number of Households'],
+                formats={'Percentage': '{:.1f}%'})
+
+def render_village_brand_charts():
+    """Households per village and the tagged-net brand split"""
+    import plotly.express as px
+    # Visualizations
+    profiler.start_section("Village and brand charts")
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("Net Distribution by Village")
+        if 'selected_village' in filtered_survey.columns:
+            village_dist = roll_up(filtered_cube, ['selected_village'])['households'].reset_index()
+            fig = px.bar(
+                village_dist,
+                x='selected_village',
+                y='households',
+                title='Household Distribution by Village',
+                labels={'households': 'Number of Households', 'selected_village': 'Village'},
+                color='households',
+                color_continuous_scale='Blues'
+            )
+            fig.update_layout(xaxis_tickangle=-45)
+            st.plotly_chart(fig, use_container_width=True, key="village_dist_bar")
+        else:
+            st.warning("Village data not available in the survey dataset")
+
+    with col2:
+        if 'brand' in table_columns['campnets']:
+            st.subheader("Net Brand Distribution")
+            # Create brand summary
+            brand_summary = brand_counts(filtered_cube).sum().sort_values(ascending=False).reset_index()
+            brand_summary.columns = ['Brand', 'Number of Nets']
+
+            # Create pie chart for brand distribution
+            fig_brand = px.pie(
+                brand_summary,
+                values='Number of Nets',
+                names='Brand',
+                title='Net Brand Distribution',
+                hole=0.4,
+                color_discrete_sequence=['#1f77b4', '#ff7f0e']  # Blue and Orange colors
+            )
+            fig_brand.update_traces(textposition='inside', textinfo='percent+label')
+            st.plotly_chart(fig_brand, use_container_width=True, key="brand_pie")
+
+            # Add brand frequency table below the chart
+            st.markdown("##### Brand Frequency Table")
+            # Add percentage column
+            brand_summary['Percentage'] = (brand_summary['Number of Nets'] / brand_summary['Number of Nets'].sum() * 100).round(1)
+            brand_summary['95% CI'] = [
+                format_interval(brand_intervals.loc[brand, 'lower'], brand_intervals.loc[brand, 'upper'])
+                for brand in brand_summary['Brand']
+            ]
+
+            # Display the frequency table with styling
+            paged_table(brand_summary, key="brand_frequency", gradient=['Number of Nets'],
+                        formats={'Percentage': '{:.1f}%'})
+
+            # Add total row
+            st.markdown(f"**Total Nets: {brand_summary['Number of Nets'].sum():,}**")
+        else:
+            st.warning("Brand information not available in the dataset")
+
+def render_nets_lost():
+    """Lost versus active nets for the selection"""
+    import plotly.graph_objects as go
+    # Add Nets Lost Distribution Section
+    profiler.start_section("Nets lost")
+    st.header("Nets Lost Distribution")
+    lost_col1, lost_col2 = st.columns(2)
+
+    with lost_col1:
+        st.subheader("Nets Lost vs Active")
+        # Create a doughnut chart for nets lost percentage
+        fig = go.Figure(data=[go.Pie(
+            labels=['Lost Nets', 'Active Nets'],
+            values=[total_lost_nets, total_campaign_nets - total_lost_nets],
+            hole=0.7,
+            marker_colors=['#FF9999', '#99FF99']
+        )])
+        fig.update_layout(
+            title='Nets Lost vs Active Nets',
+            annotations=[dict(text=f'{lost_nets_percentage:.1f}%', x=0.5, y=0.5, font_size=20, showarrow=False)]
+        )
+        st.plotly_chart(fig, use_container_width=True, key="nets_lost_donut")
+
+    with lost_col2:
+        st.subheader("Lost Nets Summary")
+        # Create summary table for lost nets
+        lost_summary = pd.DataFrame({
+            'Category': ['Lost Nets', 'Active Nets', 'Total Nets'],
+            'Count': [
+                total_lost_nets,
+                total_campaign_nets - total_lost_nets,
+                total_campaign_nets
+            ],
+            'Percentage': [
+                f"{lost_nets_percentage:.1f}%",
+                f"{100 - lost_nets_percentage:.1f}%",
+                "100%"
+            ]
+        })
+
+        paged_table(lost_summary, key="lost_summary", gradient=['Count'], cmap='RdYlGn_r')
+
+def render_access_and_use():
+    """Population access to nets and net use last night, by age group and net source"""
+    import plotly.express as px
+    profiler.start_section("Access and use")
+    st.header("Net Access and Use")
+    missing = missing_access_tables(version) if DATA_BACKEND == 'sql' else []
+    if missing:
+        st.info(f"The database has no {' or '.join(missing)} table. Rebuild it from the exports with "
+                "`python create_database.py` to see access and use.")
+        return
+    access_cube = slice_cube(load_access_cube(version), selected_district, selected_subcounty)
+    profiler.add_rows(len(access_cube))
+    indicators = access_indicators(access_cube)
+
+    acc_col1, acc_col2, acc_col3, acc_col4 = st.columns(4)
+    with acc_col1:
+        st.metric(
+            "Population with Access", f"{indicators['population_with_access_pct']:.1f}%",
+            help="Share of the de facto population (slept in the household last night) who could sleep under a "
+                 "net if each net covered two people"
+        )
+    with acc_col2:
+        st.metric("Nets per 2 People", f"{indicators['nets_per_two_people']:.2f}",
+                  help="Campaign and other nets present per two de facto household members")
+    with acc_col3:
+        st.metric("Households with 1 Net per 2 People", f"{indicators['households_enough_nets_pct']:.1f}%")
+    with acc_col4:
+        st.metric(
+            "Slept Under a Net", f"{indicators['use_pct']:.1f}%",
+            help="De facto members of an age group count as users when a net in their household was used by "
+                 "that age group last night"
+        )
 
-with col3:
-    total_campaign_nets = len(campnets_df[campnets_df['hhid'].isin(filtered_survey['hhid'])])
-    st.metric(
-        "Campaign Nets Tagged", 
-        f"{total_campaign_nets:,}",
-        help="Total number of nets tagged during the campaign"
-    )
+    use_col1, use_col2 = st.columns(2)
+    with use_col1:
+        st.subheader("Net Use by Age Group")
+        age_use = use_by_age_group(access_cube).reset_index()
+        fig = px.bar(age_use, x='age_group', y='use_pct', range_y=[0, 100],
+                     labels={'age_group': 'Age Group', 'use_pct': 'Slept Under a Net (%)'},
+                     hover_data={'population': True, 'users': True})
+        st.plotly_chart(fig, use_container_width=True, key="use_by_age_bar")
+
+    with use_col2:
+        st.subheader("Campaign vs Other Nets")
+        st.dataframe(
+            net_source_comparison(access_cube).rename(
+                columns={'nets': 'Nets', 'nets_used': 'Used Last Night', 'used_pct': 'Used Last Night (%)'}
+            ).round(1),
+            use_container_width=True
+        )
 
-with col4:
-    total_lost_nets = len(lostnets_df[lostnets_df['hhid'].isin(filtered_survey['hhid'])])
-    lost_nets_percentage = (total_lost_nets / (total_lost_nets + total_campaign_nets)) * 100 if (total_lost_nets + total_campaign_nets) > 0 else 0
-    st.metric(
-        "Nets Lost (%)", 
-        f"{lost_nets_percentage:.1f}%",
-        help="Percentage of nets that were lost, damaged, or given away"
+    access_level = 'selected_village' if selected_subcounty != 'All' else 'selected_subcounty'
+    st.subheader(f"Access and Use by {access_level.replace('selected_', '').title()}")
+    st.dataframe(
+        access_by(access_cube, [access_level]).rename(columns={
+            'de_facto_population': 'De Facto Population', 'nets': 'Nets',
+            'nets_per_two_people': 'Nets per 2 People', 'population_with_access_pct': 'Population with Access (%)',
+            'use_pct': 'Slept Under a Net (%)',
+        }).round(2),
+        use_container_width=True
     )
 
-st.markdown("---")
+def render_net_durability():
+    """Hole index, attrition and survival of campaign nets"""
+    import plotly.express as px
+    import plotly.graph_objects as go
+    profiler.start_section("Net durability")
+    st.header("Net Durability")
+    durability_nets, durability_lost = load_durability_frames(version)
+    durability_nets = filter_by_location(durability_nets, selected_district, selected_subcounty)
+    durability_lost = filter_by_location(durability_lost, selected_district, selected_subcounty)
+    profiler.add_rows(len(durability_nets) + len(durability_lost))
+    durability_level = 'selected_village' if selected_subcounty != 'All' else 'selected_subcounty'
+    durability_labels = {
+        'nets_present': 'Nets Present', 'nets_assessed': 'Nets Assessed', 'mean_phi': 'Mean pHI',
+        'median_phi': 'Median pHI', 'good_pct': 'Good (%)', 'damaged_pct': 'Damaged (%)',
+        'too_torn_pct': 'Too Torn (%)', 'nets_lost': 'Nets Lost', 'lost_wear_and_tear': 'Lost to Wear and Tear',
+        'attrition_pct': 'Attrition (%)', 'wear_and_tear_attrition_pct': 'Wear and Tear Attrition (%)',
+        'functional_survival_pct': 'Functional Survival (%)',
+    }
 
-# Visualizations
-col1, col2 = st.columns(2)
+    dur_col1, dur_col2 = st.columns(2)
 
-with col1:
-    st.subheader("Net Distribution by Village")
-    if 'selected_village' in filtered_survey.columns:
-        village_dist = filtered_survey.groupby('selected_village').size().reset_index(name='households')
-        fig = px.bar(
-            village_dist,
-            x='selected_village',
-            y='households',
-            title='Household Distribution by Village',
-            labels={'households': 'Number of Households', 'selected_village': 'Village'},
-            color='households',
-            color_continuous_scale='Blues'
-        )
-        fig.update_layout(xaxis_tickangle=-45)
-        st.plotly_chart(fig, use_container_width=True, key="village_dist_bar")
-    else:
-        st.warning("Village data not available in the survey dataset")
-
-with col2:
-    # Filter campnets for the selected households
-    filtered_campnets = campnets_df[campnets_df['hhid'].isin(filtered_survey['hhid'])]
-    
-    if 'brand' in filtered_campnets.columns:
-        st.subheader("Net Brand Distribution")
-        # Create brand summary
-        brand_summary = filtered_campnets['brand'].value_counts().reset_index()
-        brand_summary.columns = ['Brand', 'Number of Nets']
-        
-        # Create pie chart for brand distribution
-        fig_brand = px.pie(
-            brand_summary,
-            values='Number of Nets',
-            names='Brand',
-            title='Net Brand Distribution',
-            hole=0.4,
-            color_discrete_sequence=['#1f77b4', '#ff7f0e']  # Blue and Orange colors
+    with dur_col1:
+        st.subheader("Hole Index by Brand")
+        st.dataframe(
+            durability_summary(durability_nets, durability_lost, ['brand']).rename(columns=durability_labels).round(1),
+            use_container_width=True
         )
-        fig_brand.update_traces(textposition='inside', textinfo='percent+label')
-        st.plotly_chart(fig_brand, use_container_width=True, key="brand_pie")
-        
-        # Add brand frequency table below the chart
-        st.markdown("##### Brand Frequency Table")
-        # Add percentage column
-        brand_summary['Percentage'] = (brand_summary['Number of Nets'] / brand_summary['Number of Nets'].sum() * 100).round(1)
-        brand_summary['Percentage'] = brand_summary['Percentage'].astype(str) + '%'
-        
-        # Display the frequency table with styling
+        st.subheader(f"Durability by {durability_level.replace('selected_', '').title()}")
         st.dataframe(
-            brand_summary.style.background_gradient(cmap='Blues', subset=['Number of Nets']),
+            durability_summary(durability_nets, durability_lost, [durability_level])
+            .rename(columns=durability_labels).round(1),
             use_container_width=True
         )
-        
-        # Add total row
-        st.markdown(f"**Total Nets: {brand_summary['Number of Nets'].sum():,}**")
-    else:
-        st.warning("Brand information not available in the dataset")
 
-# Add Nets Lost Distribution Section
-st.markdown("---")
-st.header("Nets Lost Distribution")
-lost_col1, lost_col2 = st.columns(2)
-
-with lost_col1:
-    st.subheader("Nets Lost vs Active")
-    # Create a doughnut chart for nets lost percentage
-    fig = go.Figure(data=[go.Pie(
-        labels=['Lost Nets', 'Active Nets'],
-        values=[total_lost_nets, total_campaign_nets - total_lost_nets],
-        hole=0.7,
-        marker_colors=['#FF9999', '#99FF99']
-    )])
-    fig.update_layout(
-        title='Nets Lost vs Active Nets',
-        annotations=[dict(text=f'{lost_nets_percentage:.1f}%', x=0.5, y=0.5, font_size=20, showarrow=False)]
+    with dur_col2:
+        st.subheader("Net Survival by Age")
+        survival = net_survival(durability_nets, durability_lost)
+        fig = go.Figure([
+            go.Scatter(x=survival['month'], y=survival['upper'] * 100, line_shape='hv', line_width=0,
+                       showlegend=False, hoverinfo='skip'),
+            go.Scatter(x=survival['month'], y=survival['lower'] * 100, line_shape='hv', line_width=0,
+                       fill='tonexty', fillcolor='rgba(31,119,180,0.2)', name='95% CI'),
+            go.Scatter(x=survival['month'], y=survival['survival'] * 100, line_shape='hv', name='Survival'),
+        ])
+        fig.update_layout(xaxis_title='Net Age (months)', yaxis_title='Nets Still Present (%)', yaxis_range=[0, 100])
+        st.plotly_chart(fig, use_container_width=True, key="net_survival_curve")
+
+        st.subheader("Attrition Reasons")
+        reasons = attrition_reasons(durability_lost).reset_index()
+        fig = px.bar(reasons, x='reason', y='nets_lost', labels={'reason': 'Reason', 'nets_lost': 'Nets Lost'})
+        st.plotly_chart(fig, use_container_width=True, key="attrition_reasons_bar")
+
+def render_round_trends():
+    """KPIs of every archived snapshot and the change since the previous one"""
+    import plotly.express as px
+    profiler.start_section("Rounds and trends")
+    st.header("Survey Rounds")
+    archive_version = snapshot_version()
+    if not archive_version:
+        st.info("No snapshots archived yet. Each `python ingest.py` run adds one to mosquito_netArchive.db.")
+        return
+    trend, brand_trend = load_round_trends(archive_version, selected_district, selected_subcounty)
+    profiler.add_rows(len(trend))
+    trend['round'] = trend['label'].fillna('Snapshot ' + trend['snapshot_id'].astype(str))
+
+    latest = trend.iloc[-1]
+    previous = trend.iloc[-2] if len(trend) > 1 else None
+    def change(column):
+        return None if previous is None else latest[column] - previous[column]
+
+    st.caption(f"Latest snapshot: {latest['round']} ({latest['taken_at']})"
+               + ('' if previous is None else f", compared with {previous['round']}"))
+    round_col1, round_col2, round_col3, round_col4 = st.columns(4)
+    with round_col1:
+        st.metric("Households", f"{latest['households']:,}", delta=change('households'))
+    with round_col2:
+        st.metric("Villages", f"{latest['villages']:,}", delta=change('villages'))
+    with round_col3:
+        st.metric("Campaign Nets Tagged", f"{latest['nets_tagged']:,}", delta=change('nets_tagged'))
+    with round_col4:
+        lost_change = change('lost_percentage')
+        st.metric("Nets Lost (%)", f"{latest['lost_percentage']:.1f}%",
+                  delta=None if lost_change is None else f"{lost_change:+.1f} pts", delta_color='inverse')
+
+    trend_col1, trend_col2 = st.columns(2)
+    with trend_col1:
+        fig = px.line(trend, x='round', y='lost_percentage', markers=True, title='Nets Lost (%) by Snapshot',
+                      labels={'round': 'Snapshot', 'lost_percentage': 'Nets Lost (%)'})
+        st.plotly_chart(fig, use_container_width=True, key="lost_trend_line")
+    with trend_col2:
+        brand_rounds = brand_trend.rename(index=trend.set_index('snapshot_id')['round']).stack()
+        fig = px.line(brand_rounds.reset_index(name='nets'), x='snapshot_id', y='nets', color='brand', markers=True,
+                      title='Tagged Nets by Brand and Snapshot',
+                      labels={'snapshot_id': 'Snapshot', 'nets': 'Nets Tagged', 'brand': 'Brand'})
+        st.plotly_chart(fig, use_container_width=True, key="brand_trend_line")
+
+    st.subheader("Change from the Previous Snapshot")
+    deltas = round_deltas(trend).join(trend['round']).set_index('round').drop(columns='snapshot_id')
+    st.dataframe(
+        deltas.rename(columns={
+            'households': 'Households', 'villages': 'Villages', 'nets_tagged': 'Nets Tagged',
+            'nets_lost': 'Nets Lost', 'lost_percentage': 'Nets Lost (pts)',
+        }).round(1),
+        use_container_width=True
     )
-    st.plotly_chart(fig, use_container_width=True, key="nets_lost_donut")
-
-with lost_col2:
-    st.subheader("Lost Nets Summary")
-    # Create summary table for lost nets
-    lost_summary = pd.DataFrame({
-        'Category': ['Lost Nets', 'Active Nets', 'Total Nets'],
-        'Count': [
-            total_lost_nets,
-            total_campaign_nets - total_lost_nets,
-            total_campaign_nets
-        ],
-        'Percentage': [
-            f"{lost_nets_percentage:.1f}%",
-            f"{100 - lost_nets_percentage:.1f}%",
-            "100%"
-        ]
-    })
-    
+
+@st.fragment
+def render_coverage_map_section():
+    """Coverage map with an on-demand household lookup"""
+    import streamlit.components.v1 as components
+    # Map visualization
+    profiler.start_section("Coverage map")
+    st.subheader("Net Distribution Coverage Map")
+    profiler.add_rows(len(filtered_survey))
+    if filter_by_location(household_summary, selected_district, selected_subcounty)['latitude'].notna().any():
+        try:
+            components.html(
+                render_coverage_map(version, selected_district, selected_subcounty),
+                height=MAP_HEIGHT_PX + 10, width=MAP_WIDTH_PX
+            )
+
+            # Household details are fetched on demand rather than embedded in every marker
+            lookup_hhid = st.text_input("Look up a household ID", key="map_household_lookup").strip()
+            if lookup_hhid:
+                match = household_summary.index.astype(str) == lookup_hhid
+                if match.any():
+                    household = household_summary[match].iloc[0]
+                    st.markdown(
+                        f"**Household ID:** {lookup_hhid}  \n"
+                        f"**District:** {household['selected_district']}  \n"
+                        f"**Subcounty:** {household['selected_subcounty']}  \n"
+                        f"**Village:** {household['selected_village']}  \n"
+                        f"**Nets Tagged:** {household['nets_tagged']}  \n"
+                        f"**Nets Lost:** {household['nets_lost']}"
+                    )
+                else:
+                    st.info(f"No household with ID {lookup_hhid}")
+
+            render_spatial_queries()
+        except Exception as e:
+            st.error(f"Error processing GPS coordinates: {str(e)}")
+    else:
+        st.warning("GPS location data not available for the selected location(s)")
+
+def render_spatial_queries():
+    """Households near a point and the spread of each village's GPS points"""
+    household_index = load_household_index(version)
+    selection = filter_by_location(household_summary, selected_district, selected_subcounty)
+    if selection['latitude'].isna().all():
+        selection = household_summary
+    st.subheader("Households Near a Point")
+    point_col1, point_col2, point_col3 = st.columns(3)
+    latitude = point_col1.number_input("Latitude", value=float(selection['latitude'].median()), format="%.5f",
+                                       key="spatial_latitude")
+    longitude = point_col2.number_input("Longitude", value=float(selection['longitude'].median()), format="%.5f",
+                                        key="spatial_longitude")
+    radius_km = point_col3.number_input("Radius (km)", min_value=0.1, max_value=50.0, value=2.0, step=0.5,
+                                        key="spatial_radius")
+    nearby = household_index.within(latitude, longitude, radius_km)
+    nearby_households = household_summary.loc[nearby.index]
+    st.markdown(
+        f"**{len(nearby):,} households** within {radius_km:g} km · "
+        f"{nearby_households['nets_tagged'].sum():,} nets tagged · {nearby_households['nets_lost'].sum():,} nets lost"
+    )
+    nearest = household_index.nearest(latitude, longitude, k=10)
+    nearest_table = household_summary.loc[nearest.index, ['selected_village', 'nets_tagged', 'nets_lost']]
+    # Lost nets among the household's neighbours show where losses cluster
+    nearest_table['Nets Lost within 1 km'] = household_index.sum_within(
+        household_summary.loc[nearest.index, 'latitude'], household_summary.loc[nearest.index, 'longitude'], 1.0
+    ).astype(int)
+    nearest_table.insert(0, 'Distance (km)', nearest.round(2).to_numpy())
+    st.markdown("##### Nearest Households")
     st.dataframe(
-        lost_summary.style.background_gradient(cmap='RdYlGn_r', subset=['Count']),
+        nearest_table.rename_axis('Household ID').rename(columns={
+            'selected_village': 'Village', 'nets_tagged': 'Nets Tagged', 'nets_lost': 'Nets Lost'}),
         use_container_width=True
     )
 
-st.markdown("---")
+    st.subheader("Village GPS Spread")
+    spread = filter_by_location(load_village_centroids(version).reset_index(), selected_district, selected_subcounty)
+    paged_table(
+        spread.sort_values('max_km', ascending=False).rename(columns={
+            'selected_district': 'District', 'selected_subcounty': 'Subcounty', 'selected_parish': 'Parish',
+            'selected_village': 'Village', 'households': 'Households', 'latitude': 'Latitude',
+            'longitude': 'Longitude', 'median_km': 'Median (km)', 'p90_km': '90th Percentile (km)',
+            'max_km': 'Furthest (km)'}),
+        key="village_spread", gradient=['Furthest (km)'], cmap='Reds',
+        formats={'Latitude': '{:.5f}', 'Longitude': '{:.5f}', 'Median (km)': '{:.2f}',
+                 '90th Percentile (km)': '{:.2f}', 'Furthest (km)': '{:.2f}'}
+    )
 
-# Map visualization
-st.subheader("Net Distribution Coverage Map")
-if 'gpsloc' in survey_df.columns:
-    try:
-        # Extract latitude and longitude from gpsloc (taking only first two values)
-        survey_df[['latitude', 'longitude']] = survey_df['gpsloc'].str.split(expand=True).iloc[:, :2].astype(float)
-        
-        # Create a map centered on the mean coordinates
-        center_lat = survey_df['latitude'].mean()
-        center_lon = survey_df['longitude'].mean()
-        m = folium.Map(location=[center_lat, center_lon], zoom_start=10)
-
-        # Create a legend using Folium's HTML class
-        legend = folium.Element("""
-            <div class="legend" style="
-                position: absolute;
-                bottom: 30px;
-                right: 10px;
-                z-index: 9999;
-                background-color: white;
-                padding: 10px;
-                border: 2px solid rgba(0,0,0,0.2);
-                border-radius: 4px;
-                font-family: Arial, sans-serif;
-                ">
-                <div style="text-align: center; margin-bottom: 5px;">
-                    <b>Legend</b>
-                </div>
-                <div style="margin-bottom: 5px;">
-                    <span style="display: inline-block; width: 12px; height: 12px; border-radius: 50%; background-color: green; margin-right: 5px;"></span>
-                    <span>All Nets Active</span>
-                </div>
-                <div>
-                    <span style="display: inline-block; width: 12px; height: 12px; border-radius: 50%; background-color: red; margin-right: 5px;"></span>
-                    <span>Has Lost Nets</span>
-                </div>
-            </div>
-            """)
-        m.get_root().html.add_child(legend)
-        
-        # Add markers for each household
-        for idx, row in survey_df.iterrows():
-            # Count nets for this household
-            household_nets = len(campnets_df[campnets_df['hhid'] == row['hhid']])
-            household_lost = len(lostnets_df[lostnets_df['hhid'] == row['hhid']])
-            
-            # Create popup content
-            popup_content = f"""
-                <b>Household ID:</b> {row['hhid']}<br>
-                <b>District:</b> {row['selected_district']}<br>
-                <b>Subcounty:</b> {row['selected_subcounty']}<br>
-                <b>Village:</b> {row['selected_village']}<br>
-                <b>Nets Tagged:</b> {household_nets}<br>
-                <b>Nets Lost:</b> {household_lost}
-            """
-            
-            # Add marker with popup
-            folium.CircleMarker(
-                location=[row['latitude'], row['longitude']],
-                radius=8,
-                popup=popup_content,
-                color='red' if household_lost > 0 else 'green',
-                fill=True,
-                fill_color='red' if household_lost > 0 else 'green'
-            ).add_to(m)
-
-        # Add custom CSS to ensure legend visibility
-        css = """
-        <style>
-        .legend {
-            background-color: white;
-            padding: 10px;
-            position: fixed !important;
-            bottom: 20px !important;
-            right: 20px !important;
-            z-index: 9999 !important;
-            border: 2px solid rgba(0,0,0,0.2);
-            border-radius: 4px;
-            font-family: Arial, sans-serif;
+def render_distribution_tables():
+    """Tagged nets by location and brand"""
+    import plotly.express as px
+    profiler.start_section("Distribution tables")
+    st.header("Campaign Net Distribution Analysis")
+
+    # Net counts per brand come from the location cube, rolled up to each table's level
+    net_distribution = filtered_cube
+
+    # Create detailed frequency table
+    st.subheader("Detailed Net Distribution by Location and Brand")
+    net_freq_table = net_counts_by(
+        net_distribution, ['selected_district', 'selected_subcounty', 'selected_village']
+    ).stack().reorder_levels(['brand', 'selected_district', 'selected_subcounty', 'selected_village']).sort_index()
+    net_freq_table = net_freq_table[net_freq_table > 0].reset_index(name='Net Count')
+    profiler.add_rows(len(net_freq_table))
+
+    paged_table(net_freq_table, key="net_frequency", gradient=['Net Count'])
+
+    # Create summary tables with totals
+    st.subheader("Net Distribution Summary Tables")
+
+    def show_brand_pivot(levels, key):
+        # The Total row stays under every page instead of being sorted, searched or shaded
+        pivot = brand_pivot(net_distribution, levels)
+        brands = list(pivot.columns[:-1])
+        pivot = pivot.reset_index()
+        paged_table(pivot.iloc[:-1], key=key, gradient=brands, formats=dict.fromkeys(brands + ['Total'], '{:,.0f}'),
+                    totals=pivot.iloc[[-1]])
+
+    # 1. District-level summary
+    st.markdown("#### Distribution by District")
+    show_brand_pivot(['selected_district'], "district_brands")
+
+    # 2. Subcounty-level summary
+    st.markdown("#### Distribution by Subcounty")
+    show_brand_pivot(['selected_district', 'selected_subcounty'], "subcounty_brands")
+
+    # 3. Village-level summary
+    st.markdown("#### Distribution by Village")
+    show_brand_pivot(['selected_district', 'selected_subcounty', 'selected_village'], "village_brands")
+
+    # 4. Overall Brand Summary
+    st.markdown("#### Overall Brand Distribution")
+    brand_totals = brand_counts(net_distribution).sum().sort_values(ascending=False)
+    brand_summary = pd.DataFrame({
+        'Net Count': brand_totals,
+        'Percentage': (brand_totals / brand_totals.sum() * 100).round(1)
+    })
+    brand_summary['95% CI'] = [
+        format_interval(brand_intervals.loc[brand, 'lower'], brand_intervals.loc[brand, 'upper'])
+        for brand in brand_summary.index
+    ]
+    brand_summary.loc['Total'] = [brand_summary['Net Count'].sum(), 100.0, '']
+    brand_summary = brand_summary.rename_axis('Brand').reset_index()
+
+    paged_table(brand_summary.iloc[:-1], key="overall_brands", gradient=['Net Count'],
+                formats={'Net Count': '{:,.0f}', 'Percentage': '{:.1f}%'}, totals=brand_summary.iloc[[-1]])
+
+    # Add a bar chart showing distribution by subcounty and brand
+    subcounty_brand_dist = net_counts_by(net_distribution, ['selected_subcounty']).stack().reset_index(name='Net Count')
+
+    fig2 = px.bar(
+        subcounty_brand_dist,
+        x='selected_subcounty',
+        y='Net Count',
+        color='brand',
+        title='Net Distribution by Subcounty and Brand',
+        labels={
+            'selected_subcounty': 'Subcounty',
+            'Net Count': 'Number of Nets',
+            'brand': 'Brand'
         }
-        </style>
-        """
-        m.get_root().html.add_child(folium.Element(css))
-        
-        # Display the map
-        folium_static(m)
-    except Exception as e:
-        st.error(f"Error processing GPS coordinates: {str(e)}")
-else:
-    st.warning("GPS location data not available in the survey dataset")
-
-st.markdown("---")
-st.header("Campaign Net Distribution Analysis")
-
-# Create a cross-tabulation of net counts
-filtered_campnets = campnets_df[campnets_df['hhid'].isin(filtered_survey['hhid'])]
-
-# Merge with survey data to get village and subcounty information
-net_distribution = pd.merge(
-    filtered_campnets,
-    filtered_survey[['hhid', 'selected_village', 'selected_subcounty', 'selected_district']],
-    on='hhid',
-    how='left'
-)
-
-# Create detailed frequency table
-st.subheader("Detailed Net Distribution by Location and Brand")
-net_freq_table = net_distribution.groupby(
-    ['brand', 'selected_district', 'selected_subcounty', 'selected_village']
-).size().reset_index(name='Net Count')
-
-st.dataframe(
-    net_freq_table.style.background_gradient(cmap='Blues', subset=['Net Count']),
-    use_container_width=True
-)
-
-# Create summary tables with totals
-st.subheader("Net Distribution Summary Tables")
-
-# 1. District-level summary
-district_summary = net_distribution.groupby(['selected_district', 'brand']).size().unstack(fill_value=0)
-district_summary.loc['Total'] = district_summary.sum()
-district_summary['Total'] = district_summary.sum(axis=1)
-
-st.markdown("#### Distribution by District")
-st.dataframe(
-    district_summary.style.background_gradient(cmap='Blues', subset=pd.IndexSlice[:, district_summary.columns != 'Total'])
-                          .format("{:,.0f}"),
-    use_container_width=True
-)
-
-# 2. Subcounty-level summary
-subcounty_summary = net_distribution.groupby(['selected_district', 'selected_subcounty', 'brand']).size().unstack(fill_value=0)
-subcounty_summary.loc['Total'] = subcounty_summary.sum()
-subcounty_summary['Total'] = subcounty_summary.sum(axis=1)
-
-st.markdown("#### Distribution by Subcounty")
-st.dataframe(
-    subcounty_summary.style.background_gradient(cmap='Blues', subset=pd.IndexSlice[:, subcounty_summary.columns != 'Total'])
-                            .format("{:,.0f}"),
-    use_container_width=True
-)
-
-# 3. Village-level summary
-village_summary = net_distribution.groupby(['selected_district', 'selected_subcounty', 'selected_village', 'brand']).size().unstack(fill_value=0)
-village_summary.loc['Total'] = village_summary.sum()
-village_summary['Total'] = village_summary.sum(axis=1)
-
-st.markdown("#### Distribution by Village")
-st.dataframe(
-    village_summary.style.background_gradient(cmap='Blues', subset=pd.IndexSlice[:, village_summary.columns != 'Total'])
-                         .format("{:,.0f}"),
-    use_container_width=True
-)
-
-# 4. Overall Brand Summary
-st.markdown("#### Overall Brand Distribution")
-brand_summary = pd.DataFrame({
-    'Net Count': net_distribution['brand'].value_counts(),
-    'Percentage': (net_distribution['brand'].value_counts(normalize=True) * 100).round(1)
-})
-brand_summary.loc['Total'] = [brand_summary['Net Count'].sum(), 100.0]
-
-st.dataframe(
-    brand_summary.style.background_gradient(cmap='Blues', subset=['Net Count'])
-                       .format({
-                           'Net Count': '{:,.0f}',
-                           'Percentage': '{:.1f}%'
-                       }),
-    use_container_width=True
-)
-
-# Add a bar chart showing distribution by subcounty and brand
-subcounty_brand_dist = net_distribution.groupby(['selected_subcounty', 'brand']).size().reset_index(name='Net Count')
-
-fig2 = px.bar(
-    subcounty_brand_dist,
-    x='selected_subcounty',
-    y='Net Count',
-    color='brand',
-    title='Net Distribution by Subcounty and Brand',
-    labels={
-        'selected_subcounty': 'Subcounty',
-        'Net Count': 'Number of Nets',
-        'brand': 'Brand'
-    }
-)
-fig2.update_layout(
-    xaxis_tickangle=-45,
-    barmode='group'
-)
-st.plotly_chart(fig2, use_container_width=True)
+    )
+    fig2.update_layout(
+        xaxis_tickangle=-45,
+        barmode='group'
+    )
+    st.plotly_chart(fig2, use_container_width=True)
+
+@st.fragment
+def render_detail_tables():
+    """Full records for the selected households, loaded when a table is chosen"""
+    # Detailed records, loaded with all their columns only when requested
+    profiler.start_section("Detail tables")
+    st.header("Detailed Data Tables")
+    detail_choice = st.selectbox("Show records for the selected households", ['None'] + list(DETAIL_TABLES))
+    if detail_choice != 'None':
+        if DATA_BACKEND == 'sql':
+            detail_df = load_detail_table_sql(version, DETAIL_TABLES[detail_choice], selected_district, selected_subcounty)
+        else:
+            detail_df = load_detail_table(version, DETAIL_TABLES[detail_choice])
+            detail_df = detail_df[detail_df['hhid'].isin(filtered_survey['hhid'])]
+        st.markdown(f"**{len(detail_df):,} records**")
+        profiler.add_rows(len(detail_df))
+        paged_table(detail_df, key=f"detail_{DETAIL_TABLES[detail_choice]}", gradient=[])
+
+SECTION_TABS = {
+    'Location Coverage': render_location_coverage,
+    'Villages & Brands': render_village_brand_charts,
+    'Nets Lost': render_nets_lost,
+    'Net Durability': render_net_durability,
+    'Access & Use': render_access_and_use,
+    'Rounds': render_round_trends,
+    'Coverage Map': render_coverage_map_section,
+    'Distribution Tables': render_distribution_tables,
+    'Detailed Data': render_detail_tables,
+}
 
 st.markdown("---")
-
-# Map visualization continues below... 
\ No newline at end of file
+section_tabs = st.tabs(list(SECTION_TABS), key="dashboard_section", on_change="rerun")
+for tab, render_section in zip(section_tabs, SECTION_TABS.values()):
+    with tab:
+        if tab.open:
+            render_section()
+
+profile_path = profiler.finish()
+if profiler.records:
+    with st.sidebar:
+        with st.expander("Profiling", expanded=True):
+            st.dataframe(
+                profiler.report().round({'seconds': 3, 'memory_delta_mb': 1, 'peak_mb': 1}),
+                use_container_width=True, hide_index=True
+            )
+            if profiler.memory_skipped:
+                st.caption("Memory is blank for sections that ran while another session was being profiled.")
+            if profile_path:
+                st.caption(f"Profile written to {profile_path}")
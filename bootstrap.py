@@ -0,0 +1,139 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from metrics import brand_counts
+
+REPLICATES = 2000
+# Replicates drawn per batch; each batch gets its own seed, so results do not depend on the worker count
+BATCH_SIZE = 250
+SEED = 20250508
+CONFIDENCE = 0.95
+# Villages (clusters) are resampled within these strata, mirroring the survey design
+STRATA_LEVELS = ['selected_district', 'selected_subcounty']
+# Below this many replicate x cluster draws, starting worker processes costs more than it saves
+PARALLEL_MIN_DRAWS = 2_000_000
+MAX_WORKERS = int(os.getenv('BOOTSTRAP_WORKERS', str(os.cpu_count() or 1)))
+
+
+def resample_counts(strata, size, rng):
+    """Return a (size, clusters) matrix of how often each cluster is drawn in each replicate
+
+    Every stratum keeps its number of clusters: a replicate draws that many
+    clusters with replacement from the stratum. All strata and replicates
+    are drawn at once and tallied with one bincount.
+    """
+    order = np.argsort(strata, kind='stable')
+    _, starts, sizes = np.unique(strata[order], return_index=True, return_counts=True)
+    # Each of a replicate's draws picks uniformly among the clusters of one stratum
+    slot_start = np.repeat(starts, sizes)
+    slot_size = np.repeat(sizes, sizes)
+    picks = order[slot_start + (rng.random((size, len(strata))) * slot_size).astype(np.int64)]
+    picks += np.arange(size)[:, None] * len(strata)
+    # Float counts so the replicate totals are BLAS matrix products
+    return np.bincount(picks.ravel(), minlength=size * len(strata)).reshape(size, len(strata)).astype(float)
+
+
+def ratio_batch(numerators, denominators, strata, size, seed):
+    """Draw one batch of replicates of sum(numerators) / sum(denominators), column by column"""
+    counts = resample_counts(strata, size, np.random.default_rng(seed))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (counts @ numerators) / (counts @ denominators)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process pool shared by every bootstrap in this process, starting it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned workers only import this module, never the Streamlit app
+            _executor = ProcessPoolExecutor(MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def bootstrap_ratios(numerators, denominators, strata=None, replicates=REPLICATES, seed=SEED,
+                     confidence=CONFIDENCE, parallel=None):
+    """Cluster-bootstrap percentile intervals for ratios of cluster totals
+
+    ``numerators`` and ``denominators`` hold one row per cluster and one
+    column per ratio. Replicates are drawn in batches of BATCH_SIZE as
+    matrix products; large jobs are spread across the process pool unless
+    ``parallel`` says otherwise. Returns (estimate, lower, upper) arrays.
+    """
+    numerators = np.asarray(numerators, dtype=float)
+    denominators = np.asarray(denominators, dtype=float)
+    strata = np.zeros(len(numerators), dtype=np.int64) if strata is None else np.asarray(strata)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        estimate = numerators.sum(axis=0) / denominators.sum(axis=0)
+    if len(numerators) == 0:
+        return estimate, estimate.copy(), estimate.copy()
+
+    sizes = [BATCH_SIZE] * (replicates // BATCH_SIZE) + ([replicates % BATCH_SIZE] if replicates % BATCH_SIZE else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if parallel is None:
+        parallel = MAX_WORKERS > 1 and replicates * len(numerators) >= PARALLEL_MIN_DRAWS
+    args = (repeat(numerators), repeat(denominators), repeat(strata), sizes, seeds)
+    batches = get_executor().map(ratio_batch, *args) if parallel else map(ratio_batch, *args)
+    draws = np.vstack(list(batches))
+
+    tail = (1 - confidence) / 2 * 100
+    with np.errstate(invalid='ignore'):
+        lower, upper = np.nanpercentile(draws, [tail, 100 - tail], axis=0)
+    return estimate, lower, upper
+
+
+def cube_strata(cube):
+    """Return a stratum code per cube row (village) from its district and subcounty"""
+    codes, _ = pd.MultiIndex.from_arrays(
+        [cube.index.get_level_values(level) for level in STRATA_LEVELS]
+    ).factorize()
+    return codes
+
+
+def _interval_frame(estimate, lower, upper, index):
+    return pd.DataFrame({'estimate': estimate, 'lower': lower, 'upper': upper}, index=index) * 100
+
+
+def lost_percentage_intervals(cube, levels=None, **options):
+    """Return Nets Lost (%) with its cluster-bootstrap interval, overall or per group of the cube
+
+    Columns: estimate, lower, upper (percentages). Without ``levels`` the
+    single row is labelled 'All'.
+    """
+    lost = cube['nets_lost'].to_numpy(float)
+    cohort = lost + cube['nets_tagged'].to_numpy(float)
+    if not levels:
+        index = pd.Index(['All'])
+        membership = np.ones((len(cube), 1))
+    else:
+        groups = cube.index.droplevel([name for name in cube.index.names if name not in levels])
+        codes, index = groups.factorize(sort=True)
+        membership = np.zeros((len(cube), len(index)))
+        membership[np.arange(len(cube)), codes] = 1
+    result = bootstrap_ratios(lost[:, None] * membership, cohort[:, None] * membership,
+                              cube_strata(cube), **options)
+    return _interval_frame(*result, index)
+
+
+def brand_share_intervals(cube, **options):
+    """Return each brand's share of tagged nets (%) with its cluster-bootstrap interval"""
+    brands = brand_counts(cube)
+    nets = brands.to_numpy(float)
+    totals = np.repeat(nets.sum(axis=1, keepdims=True), nets.shape[1], axis=1)
+    return _interval_frame(*bootstrap_ratios(nets, totals, cube_strata(cube), **options), brands.columns)
+
+
+def format_interval(lower, upper):
+    """Format an interval of percentages for tables and KPI captions"""
+    if pd.isna(lower) or pd.isna(upper):
+        return 'n/a'
+    return f"{lower:.1f}% – {upper:.1f}%"
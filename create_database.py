@@ -1,77 +1,171 @@
+import argparse
+import os
 import sqlite3
+import time
+
 import pandas as pd
-import os
 
-def create_database():
-    # Create database connection
-    db_path = 'mosquito_net.db'
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # Create survey table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS survey (
-        hhid TEXT PRIMARY KEY,
-        selected_district TEXT,
-        selected_subcounty TEXT,
-        selected_parish TEXT,
-        selected_village TEXT,
-        gpsloc TEXT
-    )
-    ''')
-
-    # Create campaign nets table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS campnets (
-        net_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        hhid TEXT,
-        brand TEXT,
-        distribution_date DATE,
-        FOREIGN KEY (hhid) REFERENCES survey (hhid)
-    )
-    ''')
-
-    # Create lost nets table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS lostnets (
-        lost_net_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        hhid TEXT,
-        reason TEXT,
-        loss_date DATE,
-        FOREIGN KEY (hhid) REFERENCES survey (hhid)
-    )
-    ''')
-
-    # Commit and close
-    conn.commit()
-    conn.close()
-
-    print(f"Database created successfully at: {os.path.abspath(db_path)}")
-
-def load_data():
+from data_store import DATA_DIR, LOCATION_COLUMNS, TABLES, TABLE_NAMES
+from ingest import DB_PATH, SUBMISSION_KEYS, bump_revision, insert_rows, quote
+from snapshots import read_database, take_snapshot
+from validation import issue_counts, validate, write_issues
+
+# Rows parsed and inserted at a time; bounds memory whatever the size of the export
+CHUNK_ROWS = 50_000
+
+# Bulk-load settings: WAL so readers are not blocked, no fsync until the load is done
+# and a large page cache so index builds sort in memory
+LOAD_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -262144",
+    "PRAGMA foreign_keys = OFF",
+]
+# Settings left in place for the dashboard and ingest.py once the load is durable
+SERVE_PRAGMAS = [
+    "PRAGMA synchronous = NORMAL",
+]
+
+# Built after the rows are in, which is much faster than maintaining them row by row.
+# Names match sql_backend.INDEXES and ingest.ensure_table() so neither creates duplicates.
+INDEXES = {
+    'idx_survey_hhid': ('survey', ['hhid']),
+    'idx_survey_location': ('survey', LOCATION_COLUMNS),
+    'idx_campnets_hhid': ('campnets', ['hhid', 'brand']),
+    'idx_campnets_brand': ('campnets', ['brand']),
+    'idx_campnets_submission': ('campnets', ['_submission__id']),
+    'idx_lostnets_hhid': ('lostnets', ['hhid']),
+    'idx_lostnets_submission': ('lostnets', ['_submission__id']),
+    'idx_hhmembers_hhid': ('hhmembers', ['hhid']),
+    'idx_hhmembers_submission': ('hhmembers', ['_submission__id']),
+    'idx_othernets_hhid': ('othernets', ['hhid']),
+    'idx_othernets_submission': ('othernets', ['_submission__id']),
+}
+
+
+def column_type(name, series, schema):
+    """Return the SQLite type of an export column, from the table schema or its first chunk"""
+    if name in schema['integer']:
+        return 'INTEGER'
+    if name in schema['datetime'] or name in schema['category']:
+        # Timestamps stay in the exports' ISO text form, which sorts and compares correctly
+        return 'TEXT'
+    values = series.dropna()
+    if values.empty:
+        # Unanswered so far: NUMERIC keeps later numbers as numbers and text as text
+        return 'NUMERIC'
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(series):
+        return 'INTEGER' if (values == values.round()).all() else 'REAL'
+    return 'TEXT'
+
+
+def create_table(conn, name, first_chunk):
+    """Create a table with every export column typed, keyed on the submission id for the survey"""
+    schema = TABLES[name]
+    key, _ = SUBMISSION_KEYS[name]
+    definitions = []
+    for col in first_chunk.columns:
+        definition = f"{quote(col)} {column_type(col, first_chunk[col], schema)}"
+        if name == 'survey' and col == key:
+            definition += ' PRIMARY KEY'
+        elif name != 'survey' and col == key:
+            definition += ' REFERENCES survey (_id)'
+        definitions.append(definition)
+    conn.execute(f"DROP TABLE IF EXISTS {quote(name)}")
+    conn.execute(f"CREATE TABLE {quote(name)} ({', '.join(definitions)})")
+
+
+def load_table(conn, name, path, chunk_rows=CHUNK_ROWS):
+    """Stream one CSV export into a fresh table, chunk by chunk; return the row count"""
+    rows = 0
+    for chunk in pd.read_csv(path, chunksize=chunk_rows, low_memory=False):
+        if rows == 0:
+            create_table(conn, name, chunk)
+        insert_rows(conn, name, chunk)
+        rows += len(chunk)
+    return rows
+
+
+def create_indexes(conn, tables):
+    for name, (table, columns) in INDEXES.items():
+        if table in tables:
+            conn.execute(f"CREATE INDEX {quote(name)} ON {quote(table)} ({', '.join(quote(col) for col in columns)})")
+
+
+def bulk_load(conn, data_dir=DATA_DIR, chunk_rows=CHUNK_ROWS, report=print):
+    """Replace the database's tables with the CSV exports in one transaction
+
+    Each export is streamed in chunks of ``chunk_rows`` into a table with its
+    full typed schema; indexes and planner statistics are built once every
+    row is in. Readers see either the old tables or the new ones, never a
+    partial load. Returns {table: rows}.
+    """
+    for pragma in LOAD_PRAGMAS:
+        conn.execute(pragma)
+    start = time.perf_counter()
+    loaded = {}
+    conn.execute('BEGIN')
     try:
-        # Load CSV files
-        survey_df = pd.read_csv('survey.csv')
-        campnets_df = pd.read_csv('campnets.csv')
-        lostnets_df = pd.read_csv('lostnets.csv')
+        for name in TABLE_NAMES:
+            path = os.path.join(data_dir, TABLES[name]['source'])
+            if not os.path.exists(path):
+                report(f"{name}: {path} not found, skipped")
+                continue
+            table_start = time.perf_counter()
+            loaded[name] = load_table(conn, name, path, chunk_rows)
+            seconds = time.perf_counter() - table_start
+            report(f"{name}: {loaded[name]:,} rows in {seconds:.2f}s ({loaded[name] / seconds:,.0f} rows/s)")
 
-        # Connect to database
-        conn = sqlite3.connect('mosquito_net.db')
+        index_start = time.perf_counter()
+        create_indexes(conn, loaded)
+        bump_revision(conn)
+        report(f"Indexes built in {time.perf_counter() - index_start:.2f}s")
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
 
-        # Insert data into tables
-        survey_df.to_sql('survey', conn, if_exists='replace', index=False)
-        campnets_df.to_sql('campnets', conn, if_exists='replace', index=False)
-        lostnets_df.to_sql('lostnets', conn, if_exists='replace', index=False)
+    for pragma in SERVE_PRAGMAS:
+        conn.execute(pragma)
+    conn.execute("ANALYZE")
+    total = sum(loaded.values())
+    seconds = time.perf_counter() - start
+    report(f"Loaded {total:,} rows in {seconds:.2f}s ({total / seconds:,.0f} rows/s)")
+    return loaded
 
-        print("Data loaded successfully into the database!")
 
-    except FileNotFoundError as e:
-        print(f"Error: Could not find one or more CSV files. {str(e)}")
-    except Exception as e:
-        print(f"Error loading data: {str(e)}")
+def load_data(data_dir=DATA_DIR, db_path=DB_PATH, chunk_rows=CHUNK_ROWS, report=print):
+    """Bulk-load the CSV exports into a database, validate it and archive a snapshot; return {table: rows}"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        loaded = bulk_load(conn, data_dir, chunk_rows, report)
+
+        database = read_database(conn)
+        issues = validate(database)
+        write_issues(conn, issues)
+        # The dashboard caches the issues per data version too; move past the version the tables committed under
+        bump_revision(conn)
+        report("Validation: " + ', '.join(f"{count:,} {check}" for check, count in issue_counts(issues).items()))
+
+        # Archive the tables just loaded as a new snapshot; earlier rounds stay in the archive as they were
+        snapshot_id, created = take_snapshot(conn)
+        report(f"Snapshot {snapshot_id} {'written' if created else 'unchanged'}")
+        return loaded
     finally:
         conn.close()
 
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load the Kobo CSV exports into the SQLite database")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="Directory holding the CSV exports")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database to (re)create the tables in")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help="Rows read and inserted at a time")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    create_database()
-    load_data() 
\ No newline at end of file
+    args = parse_args()
+    load_data(args.data_dir, args.db, args.chunk_rows)
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from schema_inference import memory_usage, optimize_dtypes
+
+DATA_DIR = '.'
+CACHE_DIR = '.cache'
+# Bump when the typed schemas below change so existing caches are rebuilt
+SCHEMA_VERSION = 2
+
+LOCATION_COLUMNS = ['selected_district', 'selected_subcounty', 'selected_parish', 'selected_village']
+SUBMISSION_COLUMNS = ['_submission__submission_time']
+
+# Typed schema for each Kobo export. Other columns get inferred types (schema_inference.optimize_dtypes).
+TABLES = {
+    'survey': {
+        'source': 'survey.csv',
+        'integer': ['hhid'],
+        'category': LOCATION_COLUMNS + ['device_id', 'username', 'intname', 'intstatus', 'agree'],
+        'datetime': ['start', 'end', 'visitnum1date', 'visitnum2date', 'visitnum3date', '_submission_time'],
+    },
+    'campnets': {
+        'source': 'campnets.csv',
+        'integer': ['hhid'],
+        'category': ['brand', 'shpnet', 'clrnet', 'netcampaign', 'placenet', 'slplace', 'usdnet', 'usdweek'],
+        'datetime': SUBMISSION_COLUMNS,
+    },
+    'lostnets': {
+        'source': 'lostnets.csv',
+        'integer': ['hhid'],
+        'category': ['hpnnet', 'mnet', 'nkpnet'],
+        'datetime': SUBMISSION_COLUMNS,
+    },
+    'hhmembers': {
+        'source': 'hhmembers.csv',
+        'integer': ['hhid'],
+        'category': ['rltshp', 'sex'],
+        'datetime': SUBMISSION_COLUMNS,
+    },
+    'othernets': {
+        'source': 'othernets.csv',
+        'integer': ['hhid'],
+        'category': ['obs', 'brandnet', 'oshapenet', 'ocolour', 'othrobtain', 'othrlocation', 'othrnights'],
+        'datetime': SUBMISSION_COLUMNS,
+    },
+}
+TABLE_NAMES = list(TABLES)
+
+
+def file_hash(path):
+    """Return the SHA-256 hex digest of a file, read in 1 MiB blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def apply_schema(df, schema):
+    """Convert a raw CSV frame to the typed schema, then infer compact types for the remaining columns"""
+    for col in schema['integer']:
+        if col in df.columns:
+            values = pd.to_numeric(df[col])
+            df[col] = values.astype('Int64' if values.isna().any() else 'int64')
+    for col in schema['datetime']:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce', format='mixed')
+    for col in schema['category']:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return optimize_dtypes(df, skip=schema['integer'] + schema['datetime'] + schema['category'])
+
+
+def _paths(name, data_dir, cache_dir):
+    source = os.path.join(data_dir, TABLES[name]['source'])
+    cache = os.path.join(cache_dir, f"{name}.feather")
+    meta = os.path.join(cache_dir, f"{name}.json")
+    return source, cache, meta
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_json(path, payload):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def build_cache(name, data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """Parse one CSV export into a typed, uncompressed Feather file and record its source metadata"""
+    source, cache, meta_path = _paths(name, data_dir, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    stat = os.stat(source)
+    df = pd.read_csv(source, low_memory=False)
+    memory_before = memory_usage(df)
+    df = apply_schema(df, TABLES[name])
+
+    # Uncompressed Arrow IPC so readers can memory-map it
+    tmp_path = cache + '.tmp'
+    feather.write_feather(df, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, cache)
+
+    meta = {
+        'schema_version': SCHEMA_VERSION,
+        'source_mtime': stat.st_mtime,
+        'source_size': stat.st_size,
+        'source_sha256': file_hash(source),
+        'rows': len(df),
+        'memory_before': memory_before,
+        'memory_after': memory_usage(df),
+    }
+    _write_json(meta_path, meta)
+    return meta
+
+
+def ensure_cache(name, data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """Return the cache metadata for a table, rebuilding the cache only if its source changed"""
+    source, cache, meta_path = _paths(name, data_dir, cache_dir)
+    meta = _read_meta(meta_path)
+    if meta is None or meta.get('schema_version') != SCHEMA_VERSION or not os.path.exists(cache):
+        return build_cache(name, data_dir, cache_dir)
+
+    stat = os.stat(source)
+    if meta['source_mtime'] == stat.st_mtime and meta['source_size'] == stat.st_size:
+        return meta
+
+    # The file was touched; only re-parse it if the content actually differs
+    if stat.st_size == meta['source_size'] and file_hash(source) == meta['source_sha256']:
+        meta['source_mtime'] = stat.st_mtime
+        _write_json(meta_path, meta)
+        return meta
+    return build_cache(name, data_dir, cache_dir)
+
+
+def load_table(name, columns=None, data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """Load one table from its memory-mapped columnar cache, building it first if needed
+
+    Pass ``columns`` to materialise only those columns; names missing from the
+    export are ignored so sections can declare optional columns.
+    """
+    ensure_cache(name, data_dir, cache_dir)
+    _, cache, _ = _paths(name, data_dir, cache_dir)
+    if columns is not None:
+        with pa.memory_map(cache) as source:
+            available = set(pa.ipc.open_file(source).schema.names)
+        columns = [col for col in columns if col in available]
+    return feather.read_table(cache, columns=columns, memory_map=True).to_pandas()
+
+
+def union_columns(*requirements):
+    """Merge per-section column requirements ({table: [columns]}) into one ordered list per table"""
+    merged = {}
+    for requirement in requirements:
+        for name, columns in requirement.items():
+            table_columns = merged.setdefault(name, [])
+            table_columns.extend(col for col in columns if col not in table_columns)
+    return merged
+
+
+def data_version(names=TABLE_NAMES, data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """Return a short identifier that changes whenever any of the given source files changes"""
+    digest = hashlib.sha256()
+    for name in names:
+        digest.update(ensure_cache(name, data_dir, cache_dir)['source_sha256'].encode())
+    return digest.hexdigest()[:16]
+
+
+def ingest(data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """Build or refresh the columnar cache for every table"""
+    for name in TABLE_NAMES:
+        meta = ensure_cache(name, data_dir, cache_dir)
+        print(f"{name}: {meta['rows']:,} rows cached, {meta['memory_before'] / 2 ** 20:,.2f} MB as parsed -> "
+              f"{meta['memory_after'] / 2 ** 20:,.2f} MB typed")
+
+    # Imported here because validation reads the tables through this module
+    from validation import ensure_issues
+    print(f"Validation issues: {ensure_issues(data_dir, cache_dir)}")
+
+
+if __name__ == "__main__":
+    ingest()
@@ -1,49 +1,228 @@
 import os
-import pyodbc
-from dotenv import load_dotenv
+import queue
+import sqlite3
+import threading
+import time
 from contextlib import contextmanager
 
+import pandas as pd
+
+try:
+    from dotenv import load_dotenv
+except ImportError:
+    load_dotenv = None
+
 # Load environment variables
-load_dotenv()
+if load_dotenv is not None:
+    load_dotenv()
+
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+# Idle connections older than this are pinged before being handed out again
+HEALTH_CHECK_INTERVAL = 30
+FETCH_SIZE = 10000
+
+
+class SQLiteBackend:
+    """Local backend over a SQLite file such as mosquito_net.db"""
+
+    name = 'sqlite'
+
+    def __init__(self, path='mosquito_net.db'):
+        self.path = path
+
+    def connect(self):
+        # Pooled connections move between Streamlit's session threads, one user at a time
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+
+class SQLServerBackend:
+    """SQL Server backend through pyodbc, configured from the DB_* environment variables"""
+
+    name = 'sqlserver'
+
+    def __init__(self, conn_str=None, timeout=30):
+        self.conn_str = conn_str or (
+            f"DRIVER={os.getenv('DB_DRIVER')};"
+            f"SERVER={os.getenv('DB_SERVER')};"
+            f"DATABASE={os.getenv('DB_DATABASE')};"
+            f"UID={os.getenv('DB_USERNAME')};"
+            f"PWD={os.getenv('DB_PASSWORD')};"
+        )
+        self.timeout = timeout
+
+    def connect(self):
+        import pyodbc
+        return pyodbc.connect(self.conn_str, timeout=self.timeout)
+
+
+def backend_from_env():
+    """Pick the backend from DB_BACKEND ('sqlserver' or 'sqlite'; sqlite reads DB_SQLITE_PATH)"""
+    if os.getenv('DB_BACKEND', 'sqlserver').lower() == 'sqlite':
+        return SQLiteBackend(os.getenv('DB_SQLITE_PATH', 'mosquito_net.db'))
+    return SQLServerBackend()
+
+
+class ConnectionPool:
+    """Bounded pool of open connections shared by every caller in the process
+
+    At most ``maxsize`` connections exist at once; callers wait up to
+    ``timeout`` seconds for one to be released. Connections that sat idle for
+    a while are health-checked with ``SELECT 1`` and replaced if broken.
+    """
+
+    def __init__(self, backend, maxsize=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.backend = backend
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(maxsize)
+        self._lock = threading.Lock()
+        self.created = 0
+
+    def _is_healthy(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchall()
+            return True
+        except Exception:
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        """Take a connection from the pool, opening one if none is idle"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No database connection available within {self.timeout}s")
+        try:
+            while True:
+                try:
+                    conn, released_at = self._idle.get_nowait()
+                except queue.Empty:
+                    conn = self.backend.connect()
+                    with self._lock:
+                        self.created += 1
+                    return conn
+                if time.monotonic() - released_at < HEALTH_CHECK_INTERVAL or self._is_healthy(conn):
+                    return conn
+                self._close(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, broken=False):
+        """Return a connection to the pool, discarding it if it failed"""
+        try:
+            if broken:
+                self._close(conn)
+            else:
+                try:
+                    # Never hand the next caller an open transaction
+                    conn.rollback()
+                    self._idle.put((conn, time.monotonic()))
+                except Exception:
+                    self._close(conn)
+        finally:
+            self._slots.release()
 
-def get_db_connection():
-    """Create and return a database connection"""
-    conn_str = (
-        f"DRIVER={os.getenv('DB_DRIVER')};"
-        f"SERVER={os.getenv('DB_SERVER')};"
-        f"DATABASE={os.getenv('DB_DATABASE')};"
-        f"UID={os.getenv('DB_USERNAME')};"
-        f"PWD={os.getenv('DB_PASSWORD')};"
-    )
-    
     @contextmanager
-    def conn_context():
-        conn = None
+    def connection(self):
+        conn = self.acquire()
+        broken = False
         try:
-            conn = pyodbc.connect(conn_str, timeout=30)
             yield conn
+        except Exception:
+            broken = not self._is_healthy(conn)
+            raise
         finally:
-            if conn:
-                conn.close()
-    
-    return conn_context()
+            # Also runs when a streaming reader is abandoned mid-iteration
+            self.release(conn, broken)
+
+    def close(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close(conn)
+
+    def stats(self):
+        return {'backend': self.backend.name, 'maxsize': self.maxsize, 'idle': self._idle.qsize(), 'created': self.created}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, creating it from the environment on first use
+
+    The pool lives at module level, so it survives Streamlit reruns and is
+    shared by every session served by the process.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(backend_from_env())
+        return _pool
+
+
+def configure_pool(backend, maxsize=POOL_SIZE, timeout=POOL_TIMEOUT):
+    """Replace the process-wide pool, e.g. to point local runs and tests at SQLite"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(backend, maxsize, timeout)
+        return _pool
+
+
+def get_db_connection():
+    """Return a context manager that borrows a pooled database connection"""
+    return get_pool().connection()
+
 
 def execute_query(query, params=None):
     """Execute a query and return results"""
-    conn = get_db_connection()
-    try:
+    with get_db_connection() as conn:
         cursor = conn.cursor()
         if params:
             cursor.execute(query, params)
         else:
             cursor.execute(query)
-        
+
         if query.strip().upper().startswith('SELECT'):
             results = cursor.fetchall()
             columns = [column[0] for column in cursor.description]
             return results, columns
         else:
             conn.commit()
-            
-    finally:
-        conn.close() 
\ No newline at end of file
+
+
+def iter_query(query, params=None, chunksize=FETCH_SIZE):
+    """Run a query and yield its result as DataFrames of at most chunksize rows"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params or ())
+        columns = [column[0] for column in cursor.description]
+        empty = True
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                break
+            empty = False
+            yield pd.DataFrame.from_records([tuple(row) for row in rows], columns=columns)
+        if empty:
+            # Callers still get the column names of an empty result
+            yield pd.DataFrame(columns=columns)
+
+
+def read_query(query, params=None, chunksize=FETCH_SIZE):
+    """Run a query and return its full result as one DataFrame"""
+    return pd.concat(iter_query(query, params, chunksize), ignore_index=True)
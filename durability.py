@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+
+from data_store import LOCATION_COLUMNS
+from metrics import HOLE_COLUMNS, UNKNOWN_HOLE_COUNTS
+
+# WHO proportionate Hole Index weights for hole sizes 1 (< thumb) to 4 (> head)
+PHI_WEIGHTS = np.array([1, 23, 196, 576], dtype=float)
+# pHI damage categories: good 0-64, damaged 65-642, too torn 643+
+DAMAGE_BINS = [-np.inf, 64, 642, np.inf]
+DAMAGE_LABELS = ['Good', 'Damaged', 'Too torn']
+SERVICEABLE = ['Good', 'Damaged']
+
+# Nets were distributed in late 2023 with a top-up in February 2024; ages are measured from mid-month
+CAMPAIGN_DATES = {
+    'November': '2023-11-15',
+    'December': '2023-12-15',
+    'February 2024': '2024-02-15',
+}
+DAYS_PER_MONTH = 365.25 / 12
+
+# Reasons a net left the household (lostnets.hpnnet), grouped as in the WHO durability guidelines
+ATTRITION_REASONS = {
+    'Net was thrown away': 'Wear and tear',
+    'Net was destroyed accidentally': 'Wear and tear',
+    'Material used for other purpose': 'Wear and tear',
+    'Net was given away to relatives': 'Given away',
+    'Net was given away to others': 'Given away',
+    'Used by family members elsewhere (e.g. farm, school)': 'Used elsewhere',
+    'Net was stolen': 'Stolen',
+}
+OTHER_REASON = 'Other / unknown'
+
+# Columns the durability frames read from each table
+DURABILITY_COLUMNS = {
+    'survey': ['hhid', 'start'],
+    'campnets': ['hhid', 'brand', 'netcampaign', 'holesever'] + HOLE_COLUMNS,
+    'lostnets': ['hhid', 'netlong', 'hpnnet'],
+}
+
+
+def hole_index(campnets_df):
+    """Return each net's proportionate Hole Index (pHI)
+
+    Nets whose hole counts are missing or coded as unknown get NaN, except
+    nets reported as never having had holes, which score 0.
+    """
+    counts = campnets_df[HOLE_COLUMNS].to_numpy(dtype=float, na_value=np.nan, copy=True)
+    counts[np.isin(counts, UNKNOWN_HOLE_COUNTS)] = np.nan
+    phi = counts @ PHI_WEIGHTS
+    if 'holesever' in campnets_df.columns:
+        no_holes = (campnets_df['holesever'] == 'No').to_numpy() & np.isnan(counts).all(axis=1)
+        phi[no_holes] = 0
+    return pd.Series(phi, index=campnets_df.index, name='phi')
+
+
+def damage_category(phi):
+    """Classify pHI values as Good, Damaged or Too torn (NaN stays missing)"""
+    return pd.cut(phi, DAMAGE_BINS, labels=DAMAGE_LABELS).rename('damage')
+
+
+def household_survey_dates(survey_df):
+    """Return the first-visit survey date of each household, indexed by hhid"""
+    first_visit = survey_df[~survey_df['hhid'].duplicated()]
+    dates = pd.to_datetime(first_visit['start'], errors='coerce', format='mixed', utc=True).dt.tz_localize(None)
+    return pd.Series(dates.to_numpy(), index=first_visit['hhid'].to_numpy(), name='survey_date')
+
+
+def build_net_frame(campnets_df, household_summary, survey_dates):
+    """Build one row per campaign net still in the household
+
+    Columns: hhid, brand, the four location levels (from the household's first
+    visit, as in the household summary), phi, damage, serviceable and
+    age_months, the net's age on the survey date.
+    """
+    nets = campnets_df[['hhid', 'brand']].copy()
+    nets = nets.join(household_summary[LOCATION_COLUMNS], on='hhid')
+    nets['phi'] = hole_index(campnets_df)
+    nets['damage'] = damage_category(nets['phi'])
+    # Unassessed nets stay NaN rather than counting as unserviceable
+    nets['serviceable'] = nets['damage'].isin(SERVICEABLE).astype(float).where(nets['damage'].notna())
+
+    campaign_dates = pd.to_datetime(campnets_df['netcampaign'].astype(object).map(CAMPAIGN_DATES))
+    survey_date = nets['hhid'].map(survey_dates)
+    nets['age_months'] = np.floor((survey_date - campaign_dates).dt.days / DAYS_PER_MONTH)
+    return nets
+
+
+def build_lost_frame(lostnets_df, household_summary):
+    """Build one row per lost campaign net
+
+    Columns: hhid, the four location levels, age_at_loss (months the household
+    had the net, from netlong), reason (grouped hpnnet) and wear_and_tear.
+    """
+    lost = lostnets_df[['hhid']].copy()
+    lost = lost.join(household_summary[LOCATION_COLUMNS], on='hhid')
+    lost['age_at_loss'] = pd.to_numeric(lostnets_df['netlong'], errors='coerce')
+    lost['reason'] = lostnets_df['hpnnet'].astype(object).map(ATTRITION_REASONS).fillna(OTHER_REASON)
+    lost['wear_and_tear'] = lost['reason'] == 'Wear and tear'
+    return lost
+
+
+def durability_summary(nets, lost, levels):
+    """Return hole index, damage and attrition figures grouped by the given columns
+
+    Columns: nets_present, nets_assessed, mean_phi, median_phi, the share of
+    assessed nets per damage category (%), and, when the lost nets carry the
+    grouping columns, nets_lost, attrition (%), wear_and_tear_attrition (%)
+    and functional_survival (%): present and serviceable nets as a share of
+    all campaign nets the households received.
+    Lost nets are not recorded with a brand, so brand groupings only get the
+    damage figures.
+    """
+    damage = pd.get_dummies(nets['damage']).astype(int)
+    present = nets[levels].join(damage).assign(phi=nets['phi'], serviceable=nets['serviceable'])
+    grouped = present.groupby(levels, observed=True)
+    summary = grouped.agg(
+        nets_present=('phi', 'size'),
+        nets_assessed=('phi', 'count'),
+        mean_phi=('phi', 'mean'),
+        median_phi=('phi', 'median'),
+        serviceable=('serviceable', 'mean'),
+    )
+    category_counts = grouped[DAMAGE_LABELS].sum()
+    assessed = summary['nets_assessed'].where(summary['nets_assessed'] > 0)
+    for label in DAMAGE_LABELS:
+        summary[f'{label.lower().replace(" ", "_")}_pct'] = category_counts[label] / assessed * 100
+
+    if all(level in lost.columns for level in levels):
+        attrition = lost.groupby(levels, observed=True).agg(
+            nets_lost=('wear_and_tear', 'size'),
+            lost_wear_and_tear=('wear_and_tear', 'sum'),
+        )
+        summary = summary.join(attrition, how='outer')
+        summary[['nets_present', 'nets_assessed', 'nets_lost', 'lost_wear_and_tear']] = (
+            summary[['nets_present', 'nets_assessed', 'nets_lost', 'lost_wear_and_tear']].fillna(0).astype(int)
+        )
+        cohort = (summary['nets_present'] + summary['nets_lost']).where(lambda total: total > 0)
+        summary['attrition_pct'] = summary['nets_lost'] / cohort * 100
+        summary['wear_and_tear_attrition_pct'] = summary['lost_wear_and_tear'] / cohort * 100
+        summary['functional_survival_pct'] = summary['nets_present'] * summary['serviceable'] / cohort * 100
+    return summary.drop(columns='serviceable')
+
+
+def attrition_reasons(lost, levels=None):
+    """Return lost-net counts per grouped reason, optionally split by location columns"""
+    if not levels:
+        return lost['reason'].value_counts().rename_axis('reason').rename('nets_lost')
+    return lost.groupby(levels + ['reason'], observed=True).size().unstack(fill_value=0)
+
+
+def survival_curves(ages, lost, groups=None, z=1.96):
+    """Kaplan-Meier survival of campaign nets by age in whole months
+
+    ``ages`` holds each net's age at loss (lost nets) or on the survey date
+    (nets still present, which are censored there); ``lost`` flags the
+    losses. All groups are estimated at once from 2-D month counts. Returns
+    one row per group and month with at_risk, lost, survival and a log-log
+    Greenwood confidence interval (lower, upper).
+    """
+    ages = np.asarray(ages, dtype=float)
+    lost = np.asarray(lost, dtype=bool)
+    if groups is None:
+        groups = pd.Series('All', index=range(len(ages)))
+    codes, labels = pd.factorize(pd.Series(np.asarray(groups)), sort=True)
+    known = ~np.isnan(ages) & (codes >= 0)
+    ages, lost, codes = ages[known].astype(np.int64), lost[known], codes[known]
+
+    months = int(ages.max()) + 1 if len(ages) else 1
+    cells = codes * months + ages
+    shape = (len(labels), months)
+    exits = np.bincount(cells, minlength=shape[0] * months).reshape(shape)
+    events = np.bincount(cells, weights=lost, minlength=shape[0] * months).reshape(shape)
+    # Nets censored in a month are still at risk during it
+    at_risk = exits[:, ::-1].cumsum(axis=1)[:, ::-1]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hazard = np.where(at_risk > 0, events / at_risk, 0.0)
+        survival = np.cumprod(1 - hazard, axis=1)
+        greenwood = np.cumsum(np.where(at_risk > events, events / (at_risk * (at_risk - events)), 0.0), axis=1)
+        log_survival = np.log(survival)
+        spread = z * np.sqrt(greenwood) / np.abs(log_survival)
+        interior = (survival > 0) & (survival < 1)
+        lower = np.where(interior, survival ** np.exp(spread), survival)
+        upper = np.where(interior, survival ** np.exp(-spread), survival)
+
+    curves = pd.DataFrame({
+        'group': np.repeat(np.asarray(labels), months),
+        'month': np.tile(np.arange(months), len(labels)),
+        'at_risk': at_risk.ravel(),
+        'lost': events.ravel().astype(np.int64),
+        'survival': survival.ravel(),
+        'lower': lower.ravel(),
+        'upper': upper.ravel(),
+    })
+    return curves[curves['at_risk'] > 0].reset_index(drop=True)
+
+
+def net_survival(nets, lost, level=None):
+    """Return survival_curves() for the present and lost nets, optionally by one location column"""
+    ages = np.concatenate([nets['age_months'].to_numpy(float), lost['age_at_loss'].to_numpy(float)])
+    events = np.concatenate([np.zeros(len(nets), dtype=bool), np.ones(len(lost), dtype=bool)])
+    groups = None
+    if level is not None:
+        groups = np.concatenate([nets[level].astype(object).to_numpy(), lost[level].astype(object).to_numpy()])
+    return survival_curves(ages, events, groups)
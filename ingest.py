@@ -0,0 +1,197 @@
+import os
+import sqlite3
+import sys
+import time
+
+import pandas as pd
+
+from data_store import LOCATION_COLUMNS, TABLES
+from snapshots import ARCHIVE_PATH, take_snapshot
+from validation import issue_counts, revalidate
+
+DB_PATH = 'mosquito_net.db'
+
+# Kobo identifies each submission by a numeric id; editing a submission gives it a new uuid.
+# Repeat-group tables (nets, members) carry their parent submission's id and uuid.
+SUBMISSION_KEYS = {
+    'survey': ('_id', '_uuid'),
+    'campnets': ('_submission__id', '_submission__uuid'),
+    'lostnets': ('_submission__id', '_submission__uuid'),
+    'hhmembers': ('_submission__id', '_submission__uuid'),
+    'othernets': ('_submission__id', '_submission__uuid'),
+}
+INGEST_ORDER = ['survey', 'campnets', 'lostnets', 'hhmembers', 'othernets']
+# Counts the writes to the database; sql_backend.data_version() includes it so caches see edits
+# to existing submissions, which leave the row counts and ids unchanged
+REVISION_TABLE = 'data_revision'
+
+
+def quote(name):
+    """Quote a column or table name for SQLite (Kobo names contain '/')"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def table_columns(conn, name):
+    """Return the column names of a table, or [] if it does not exist"""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({quote(name)})")]
+
+
+def _sqlite_type(dtype):
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+
+def _stage_ids(conn, temp_table, ids):
+    """Load submission ids into a temp table so lookups join against the key index"""
+    conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {temp_table} (id INTEGER PRIMARY KEY)")
+    conn.execute(f"DELETE FROM {temp_table}")
+    conn.executemany(f"INSERT OR IGNORE INTO {temp_table} (id) VALUES (?)", ((int(i),) for i in ids))
+
+
+def ensure_table(conn, name, df):
+    """Create the table (with a submission-id index) or add any columns the export introduced"""
+    existing = table_columns(conn, name)
+    if not existing:
+        columns = ', '.join(f"{quote(col)} {_sqlite_type(df[col].dtype)}" for col in df.columns)
+        conn.execute(f"CREATE TABLE {quote(name)} ({columns})")
+    else:
+        for col in df.columns:
+            if col not in existing:
+                conn.execute(f"ALTER TABLE {quote(name)} ADD COLUMN {quote(col)} {_sqlite_type(df[col].dtype)}")
+    key, _ = SUBMISSION_KEYS[name]
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {quote('idx_' + name + '_submission')} ON {quote(name)} ({quote(key)})")
+    if 'hhid' in df.columns:
+        # Validation after an ingest looks up the households the replaced submissions touch
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {quote('idx_' + name + '_hhid')} ON {quote(name)} (hhid)")
+
+
+def insert_rows(conn, name, df):
+    """Insert a frame's rows with one executemany (NaN becomes NULL)"""
+    if df.empty:
+        return
+    columns = ', '.join(quote(col) for col in df.columns)
+    placeholders = ', '.join('?' for _ in df.columns)
+    # One object array with NULLs filled in place is much cheaper than DataFrame.where on wide exports
+    values = df.to_numpy(dtype=object)
+    values[df.isna().to_numpy()] = None
+    conn.executemany(f"INSERT INTO {quote(name)} ({columns}) VALUES ({placeholders})", map(tuple, values))
+
+
+def bump_revision(conn):
+    """Count one more write to the database (SQLite creates the table on first use)"""
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {REVISION_TABLE} (revision INTEGER NOT NULL)")
+    if conn.execute(f"UPDATE {REVISION_TABLE} SET revision = revision + 1").rowcount == 0:
+        conn.execute(f"INSERT INTO {REVISION_TABLE} (revision) VALUES (1)")
+
+
+def classify_submissions(conn, name, df):
+    """Split an export's submissions into new, changed and unchanged ids relative to the database"""
+    key, uuid = SUBMISSION_KEYS[name]
+    incoming = df[[key, uuid]].drop_duplicates(key)
+    _stage_ids(conn, 'ingest_lookup', incoming[key])
+    stored = pd.read_sql_query(
+        f"SELECT DISTINCT t.{quote(key)} AS {quote(key)}, t.{quote(uuid)} AS stored_uuid "
+        f"FROM {quote(name)} t JOIN ingest_lookup l ON t.{quote(key)} = l.id",
+        conn
+    ).drop_duplicates(key)
+    merged = incoming.merge(stored, on=key, how='left')
+    is_new = merged['stored_uuid'].isna()
+    is_changed = ~is_new & (merged[uuid] != merged['stored_uuid'])
+    return (
+        list(merged.loc[is_new, key]),
+        list(merged.loc[is_changed, key]),
+        list(merged.loc[~is_new & ~is_changed, key]),
+    )
+
+
+def read_exports(export_dir):
+    """Read whichever Kobo CSV exports are present in a directory"""
+    frames = {}
+    for name in INGEST_ORDER:
+        path = os.path.join(export_dir, TABLES[name]['source'])
+        if os.path.exists(path):
+            frames[name] = pd.read_csv(path, low_memory=False)
+    return frames
+
+
+def ingest_submissions(conn, frames):
+    """Apply new and changed submissions from the exports to the database in one transaction
+
+    Unseen submission ids are appended; ids whose uuid changed have their rows
+    replaced. Only those submissions' rows are touched, so the work done is
+    proportional to the submissions in the exports, not the study. The
+    replaced ids stay in the connection's temp table ingest_replaced, and
+    the hhid and location their survey rows had before in ingest_previous.
+    """
+    report = {}
+    conn.execute('BEGIN')
+    try:
+        classified = {}
+        for name, df in frames.items():
+            ensure_table(conn, name, df)
+            new_ids, changed_ids, unchanged_ids = classify_submissions(conn, name, df)
+            classified[name] = (new_ids, changed_ids)
+            report[name] = {'new': len(new_ids), 'changed': len(changed_ids), 'unchanged': len(unchanged_ids)}
+
+        # A submission is replaced as a unit in every exported table, so repeat-group rows
+        # removed by an edit disappear even when no row of theirs is left in that export
+        affected = set()
+        for new_ids, changed_ids in classified.values():
+            affected.update(new_ids)
+            affected.update(changed_ids)
+
+        _stage_ids(conn, 'ingest_replaced', affected)
+        # What the replaced survey rows were, so validation can recheck the households and villages they left
+        conn.execute("DROP TABLE IF EXISTS temp.ingest_previous")
+        survey_columns = table_columns(conn, 'survey')
+        previous = ', '.join(quote(col) for col in ['hhid'] + LOCATION_COLUMNS if col in survey_columns)
+        if previous:
+            conn.execute(f"CREATE TEMP TABLE ingest_previous AS SELECT {previous} FROM survey "
+                         f"WHERE _id IN (SELECT id FROM ingest_replaced)")
+        for name, df in frames.items():
+            key, _ = SUBMISSION_KEYS[name]
+            conn.execute(f"DELETE FROM {quote(name)} WHERE {quote(key)} IN (SELECT id FROM ingest_replaced)")
+            insert_rows(conn, name, df[df[key].isin(affected)])
+        if affected:
+            bump_revision(conn)
+
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return report
+
+
+def main(export_dir='.', db_path=DB_PATH, archive_path=ARCHIVE_PATH):
+    start = time.perf_counter()
+    frames = read_exports(export_dir)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        report = ingest_submissions(conn, frames)
+        changed = any(counts['new'] or counts['changed'] for counts in report.values())
+        if changed:
+            submissions = pd.read_sql_query("SELECT id FROM ingest_replaced", conn)['id']
+            previous = pd.read_sql_query("SELECT * FROM ingest_previous", conn).reindex(columns=['hhid'] + LOCATION_COLUMNS)
+            # Recheck what the replaced submissions touch, so the dashboard only has to read the results
+            issues = revalidate(conn, submissions, previous)
+            # The dashboard caches the issues per data version too; move past the version the rows committed under
+            bump_revision(conn)
+            # Archive the replaced submissions' rows, so earlier rounds stay comparable
+            snapshot_id, created = take_snapshot(conn, archive_path, submissions=submissions)
+    finally:
+        conn.close()
+    for name, counts in report.items():
+        print(f"{name}: {counts['new']:,} new, {counts['changed']:,} changed, {counts['unchanged']:,} unchanged submissions")
+    if changed:
+        print("Validation: " + ', '.join(f"{count:,} {check}" for check, count in issue_counts(issues).items()))
+        print(f"Snapshot {snapshot_id} {'written' if created else 'unchanged'} in {archive_path}")
+    else:
+        print("No new or changed submissions; validation issues and snapshots left as they were")
+    print(f"Ingest finished in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,207 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+# Above this many households the map switches from one marker each to grid cells
+MAX_MARKERS = 2000
+MAP_WIDTH_PX = 700
+MAP_HEIGHT_PX = 500
+# Grid cells are this many pixels wide at the zoom level they are drawn at
+CELL_PX = 32
+# Binned maps get a layer of finer cells for each zoom level past the opening one, up to this many
+BIN_ZOOM_LEVELS = 4
+MAX_ZOOM = 18
+# Opening view for a selection without GPS points: the whole of Uganda
+DEFAULT_CENTER = [1.37, 32.29]
+DEFAULT_ZOOM = 7
+ACTIVE_COLOR = 'green'
+LOST_COLOR = 'red'
+MIXED_COLOR = 'orange'
+
+LEGEND_CSS = """
+<style>
+.legend {
+    background-color: white;
+    padding: 10px;
+    position: fixed !important;
+    bottom: 20px !important;
+    right: 20px !important;
+    z-index: 9999 !important;
+    border: 2px solid rgba(0,0,0,0.2);
+    border-radius: 4px;
+    font-family: Arial, sans-serif;
+}
+</style>
+"""
+
+
+def _legend(entries):
+    import folium
+
+    rows = "".join(
+        f"""
+        <div style="margin-bottom: 5px;">
+            <span style="display: inline-block; width: 12px; height: 12px; border-radius: 50%; background-color: {color}; margin-right: 5px;"></span>
+            <span>{label}</span>
+        </div>"""
+        for color, label in entries
+    )
+    return folium.Element(f"""
+        <div class="legend">
+            <div style="text-align: center; margin-bottom: 5px;">
+                <b>Legend</b>
+            </div>{rows}
+        </div>
+        """)
+
+
+def fit_zoom(latitudes, longitudes, width_px=MAP_WIDTH_PX, height_px=MAP_HEIGHT_PX):
+    """Return the highest web-map zoom level at which all points fit in the map frame (DEFAULT_ZOOM if none)"""
+    if latitudes.dropna().empty or longitudes.dropna().empty:
+        return DEFAULT_ZOOM
+    lat_span = max(float(latitudes.max() - latitudes.min()), 1e-4)
+    lon_span = max(float(longitudes.max() - longitudes.min()), 1e-4)
+    # A 256 px tile spans 360 / 2**zoom degrees of longitude (latitude is close enough near the equator)
+    zoom_lon = math.log2(width_px * 360 / (256 * lon_span))
+    zoom_lat = math.log2(height_px * 360 / (256 * lat_span))
+    return int(max(1, min(18, math.floor(min(zoom_lon, zoom_lat)))))
+
+
+def grid_cell_degrees(zoom, cell_px=CELL_PX):
+    """Return the grid cell size in degrees that is cell_px wide at a zoom level"""
+    return 360 / (2 ** zoom) / 256 * cell_px
+
+
+def bin_households(households, cell_degrees):
+    """Aggregate households into square grid cells, one row per occupied cell"""
+    cells = pd.DataFrame({
+        'row': np.floor(households['latitude'].to_numpy() / cell_degrees).astype('int64'),
+        'col': np.floor(households['longitude'].to_numpy() / cell_degrees).astype('int64'),
+        'latitude': households['latitude'].to_numpy(),
+        'longitude': households['longitude'].to_numpy(),
+        'nets_tagged': households['nets_tagged'].to_numpy(),
+        'nets_lost': households['nets_lost'].to_numpy(),
+        'has_lost': (households['nets_lost'].to_numpy() > 0).astype('int64'),
+    })
+    return cells.groupby(['row', 'col']).agg(
+        latitude=('latitude', 'mean'),
+        longitude=('longitude', 'mean'),
+        households=('has_lost', 'size'),
+        households_with_lost=('has_lost', 'sum'),
+        nets_tagged=('nets_tagged', 'sum'),
+        nets_lost=('nets_lost', 'sum'),
+    ).reset_index(drop=True)
+
+
+# Shows the binned layer drawn for the current zoom level (the deepest one at or below it)
+ZOOM_LAYERS_JS = """
+{% macro script(this, kwargs) %}
+(function() {
+    var map = {{ this._parent.get_name() }};
+    var layers = [{% for zoom, layer in this.layers %}[{{ zoom }}, {{ layer.get_name() }}],{% endfor %}];
+    function showLayer() {
+        var current = layers[0][1];
+        layers.forEach(function(entry) { if (entry[0] <= map.getZoom()) { current = entry[1]; } });
+        layers.forEach(function(entry) {
+            if (entry[1] === current) { map.addLayer(entry[1]); } else { map.removeLayer(entry[1]); }
+        });
+    }
+    map.on('zoomend', showLayer);
+    showLayer();
+})();
+{% endmacro %}
+"""
+
+
+def _cell_layer(cells):
+    """Draw binned cells as circles sized by households and coloured by the share that lost nets"""
+    import folium
+
+    layer = folium.FeatureGroup(control=False)
+    lost_share = cells['households_with_lost'] / cells['households']
+    colors = np.where(lost_share >= 0.5, LOST_COLOR, np.where(lost_share > 0, MIXED_COLOR, ACTIVE_COLOR))
+    # Circle area grows with the number of households in the cell
+    radii = 4 + 12 * np.sqrt(cells['households'] / cells['households'].max())
+    for cell, color, radius in zip(cells.itertuples(index=False), colors, radii):
+        folium.CircleMarker(
+            location=[cell.latitude, cell.longitude],
+            radius=float(radius),
+            tooltip=f"{cell.households:,} households · {cell.nets_tagged:,} nets tagged · {cell.nets_lost:,} lost",
+            color=color,
+            fill=True,
+            fill_color=color,
+            fill_opacity=0.6
+        ).add_to(layer)
+    return layer
+
+
+def zoom_bins(households, zoom, max_cells=MAX_MARKERS, levels=BIN_ZOOM_LEVELS):
+    """Bin households for the opening zoom level and each deeper one, as [(zoom, cells)]
+
+    Each level's cells are CELL_PX wide at that zoom, so zooming in splits
+    them. Levels stop before the circles of all levels together would exceed
+    max_cells, the same budget as drawing households individually.
+    """
+    bins = [(zoom, bin_households(households, grid_cell_degrees(zoom)))]
+    drawn = len(bins[0][1])
+    for level in range(zoom + 1, min(zoom + levels, MAX_ZOOM + 1)):
+        cells = bin_households(households, grid_cell_degrees(level))
+        drawn += len(cells)
+        if drawn > max_cells:
+            break
+        bins.append((level, cells))
+    return bins
+
+
+def build_map(households, max_markers=MAX_MARKERS):
+    """Build the coverage map for a set of household summary rows
+
+    Up to max_markers households are drawn individually with only a short
+    tooltip; household details are looked up on demand outside the map.
+    Larger selections are binned server-side into grid cells, one layer per
+    zoom level from the one that fits the selection (see zoom_bins()); the
+    browser shows the layer for its current zoom.
+    """
+    # folium is imported on first use so importing this module (the dashboard does at startup) stays cheap
+    import folium
+    from jinja2 import Template
+
+    households = households.dropna(subset=['latitude', 'longitude'])
+    zoom = fit_zoom(households['latitude'], households['longitude'])
+    center = [households['latitude'].mean(), households['longitude'].mean()] if len(households) else DEFAULT_CENTER
+    m = folium.Map(location=center, zoom_start=zoom)
+
+    if len(households) <= max_markers:
+        m.get_root().html.add_child(_legend([(ACTIVE_COLOR, 'All Nets Active'), (LOST_COLOR, 'Has Lost Nets')]))
+        for hhid, lat, lon, lost in zip(households.index, households['latitude'], households['longitude'],
+                                        households['nets_lost']):
+            color = LOST_COLOR if lost > 0 else ACTIVE_COLOR
+            folium.CircleMarker(
+                location=[lat, lon],
+                radius=8,
+                tooltip=f"Household {hhid}",
+                color=color,
+                fill=True,
+                fill_color=color
+            ).add_to(m)
+    else:
+        m.get_root().html.add_child(_legend([
+            (ACTIVE_COLOR, 'No Lost Nets'),
+            (MIXED_COLOR, 'Some Households Lost Nets'),
+            (LOST_COLOR, 'Most Households Lost Nets'),
+        ]))
+        switch = folium.MacroElement()
+        switch._template = Template(ZOOM_LAYERS_JS)
+        switch.layers = [(level, _cell_layer(cells).add_to(m)) for level, cells in zoom_bins(households, zoom, max_markers)]
+        m.add_child(switch)
+
+    m.get_root().html.add_child(folium.Element(LEGEND_CSS))
+    return m
+
+
+def render_map_html(households, max_markers=MAX_MARKERS):
+    """Render the coverage map to a standalone HTML document"""
+    import folium
+
+    return folium.Figure().add_child(build_map(households, max_markers)).render()
@@ -0,0 +1,172 @@
+import pandas as pd
+
+from data_store import LOCATION_COLUMNS
+
+HOLE_COLUMNS = ['numhole1', 'numhole2', 'numhole3', 'numhole4']
+# Kobo codes for "don't know" / "refused" in the hole counts
+UNKNOWN_HOLE_COUNTS = [98, 99]
+BRAND_PREFIX = 'brand_'
+
+# Columns build_household_summary() reads from each table
+HOUSEHOLD_SUMMARY_COLUMNS = {
+    'survey': ['hhid'] + LOCATION_COLUMNS + ['gpsloc', '_gpsloc_latitude', '_gpsloc_longitude'],
+    'campnets': ['hhid', 'brand'] + HOLE_COLUMNS,
+    'lostnets': ['hhid'],
+}
+
+
+def household_coordinates(survey_df):
+    """Return latitude/longitude for each survey row, preferring the Kobo split columns"""
+    if {'_gpsloc_latitude', '_gpsloc_longitude'}.issubset(survey_df.columns):
+        coords = survey_df[['_gpsloc_latitude', '_gpsloc_longitude']].astype(float)
+    else:
+        # Older exports only carry the raw "lat lon altitude precision" string
+        coords = survey_df['gpsloc'].str.split(expand=True).iloc[:, :2].astype(float)
+    coords.columns = ['latitude', 'longitude']
+    return coords
+
+
+def build_household_summary(survey_df, campnets_df, lostnets_df):
+    """Build one row per household (indexed by hhid) with its location, GPS and net counts
+
+    Every per-household figure the dashboard needs is computed here once with
+    grouped aggregations, so callers never have to scan the net tables per row.
+    Columns: the four location levels, latitude, longitude, nets_tagged,
+    nets_lost, hole_count, net_brands and one ``brand_<name>`` count per brand.
+    """
+    # Households surveyed more than once keep their first visit
+    first_visit = ~survey_df['hhid'].duplicated()
+    households = survey_df.loc[first_visit, ['hhid'] + LOCATION_COLUMNS]
+    households = households.join(household_coordinates(survey_df.loc[first_visit]))
+    households = households.set_index('hhid')
+
+    nets_tagged = campnets_df.groupby('hhid').size().rename('nets_tagged')
+    nets_lost = lostnets_df.groupby('hhid').size().rename('nets_lost')
+
+    hole_columns = [col for col in HOLE_COLUMNS if col in campnets_df.columns]
+    hole_counts = campnets_df[hole_columns]
+    # Counts coded as unknown are not holes
+    hole_counts = hole_counts.mask(hole_counts.isin(UNKNOWN_HOLE_COUNTS))
+    hole_count = hole_counts.sum(axis=1).groupby(campnets_df['hhid']).sum().rename('hole_count')
+
+    brand_counts = campnets_df.groupby(['hhid', 'brand'], observed=True).size().unstack(fill_value=0)
+    brand_counts.columns = [BRAND_PREFIX + str(brand) for brand in brand_counts.columns]
+
+    summary = households.join([nets_tagged, nets_lost, hole_count, brand_counts])
+    count_columns = ['nets_tagged', 'nets_lost', 'hole_count'] + list(brand_counts.columns)
+    summary[count_columns] = summary[count_columns].fillna(0).astype(int)
+    summary['net_brands'] = brand_list(summary)
+    return summary
+
+
+def brand_list(household_summary):
+    """Return each household's comma-separated brands, built one brand column at a time"""
+    net_brands = pd.Series('', index=household_summary.index)
+    for brand, counts in brand_counts(household_summary).items():
+        has_brand = counts > 0
+        separator = net_brands.where(net_brands == '', ', ').where(has_brand, '')
+        net_brands = net_brands + separator + pd.Series(brand, index=household_summary.index).where(has_brand, '')
+    return net_brands
+
+
+def select_households(household_summary, hhids):
+    """Return the summary rows for the given household ids, ignoring unknown ids"""
+    return household_summary[household_summary.index.isin(hhids)]
+
+
+def brand_counts(household_summary):
+    """Return the per-household net counts by brand, with brand names as columns"""
+    columns = [col for col in household_summary.columns if col.startswith(BRAND_PREFIX)]
+    counts = household_summary[columns]
+    counts.columns = pd.Index([col[len(BRAND_PREFIX):] for col in columns], name='brand')
+    return counts
+
+
+def build_location_cube(survey_df, household_summary):
+    """Aggregate households and nets to one row per district/subcounty/parish/village
+
+    Columns: households (survey visits), nets_tagged, nets_lost, hole_count and
+    one ``brand_<name>`` tagged-net count per brand. The cube is small (one row
+    per village) so every dashboard table is a cheap slice or roll-up of it.
+    """
+    households = survey_df.groupby(LOCATION_COLUMNS, observed=True).size().rename('households')
+    count_columns = [col for col in household_summary.columns
+                     if col in ('nets_tagged', 'nets_lost', 'hole_count') or col.startswith(BRAND_PREFIX)]
+    nets = household_summary.groupby(LOCATION_COLUMNS, observed=True)[count_columns].sum()
+    cube = households.to_frame().join(nets, how='outer').fillna(0).astype(int)
+    # Drop unused categories so roll-ups never produce empty location combinations
+    cube.index = cube.index.remove_unused_levels()
+    return cube.sort_index()
+
+
+def slice_cube(cube, district='All', subcounty='All'):
+    """Return the cube rows for the sidebar selection ('All' leaves a level unfiltered)"""
+    if district != 'All':
+        cube = cube[cube.index.get_level_values('selected_district') == district]
+        if subcounty != 'All':
+            cube = cube[cube.index.get_level_values('selected_subcounty') == subcounty]
+    return cube
+
+
+def roll_up(cube, levels):
+    """Sum the cube up to the given location levels"""
+    return cube.groupby(level=levels, observed=True).sum()
+
+
+def net_counts_by(cube, levels):
+    """Return tagged nets per brand rolled up to the given location levels"""
+    return brand_counts(roll_up(cube, levels))
+
+
+def filter_by_location(df, district='All', subcounty='All'):
+    """Return the rows of a frame with location columns that match the sidebar selection"""
+    if district != 'All':
+        df = df[df['selected_district'] == district]
+        if subcounty != 'All':
+            df = df[df['selected_subcounty'] == subcounty]
+    return df
+
+
+def kpis(cube):
+    """Return the headline KPIs for a (sliced) location cube"""
+    nets_tagged = int(cube['nets_tagged'].sum())
+    nets_lost = int(cube['nets_lost'].sum())
+    return {
+        'households': int(cube['households'].sum()),
+        'villages': len(cube),
+        'nets_tagged': nets_tagged,
+        'nets_lost': nets_lost,
+        'lost_percentage': nets_lost / (nets_lost + nets_tagged) * 100 if (nets_lost + nets_tagged) > 0 else 0,
+    }
+
+
+def filtered_view(survey_df, campnets_df, lostnets_df, cube, district='All', subcounty='All'):
+    """Return the filtered survey/campnets/lostnets frames, cube slice and KPIs for one selection"""
+    survey = filter_by_location(survey_df, district, subcounty)
+    hhids = survey['hhid'].unique()
+    cube = slice_cube(cube, district, subcounty)
+    return {
+        'survey': survey,
+        'campnets': campnets_df[campnets_df['hhid'].isin(hhids)],
+        'lostnets': lostnets_df[lostnets_df['hhid'].isin(hhids)],
+        'cube': cube,
+        'kpis': kpis(cube),
+    }
+
+
+def location_summary(cube, levels):
+    """Return households, villages, tagged and lost nets and Nets Lost (%) rolled up to the given levels"""
+    summary = roll_up(cube[['households', 'nets_tagged', 'nets_lost']], levels)
+    summary.insert(1, 'villages', cube.groupby(level=levels, observed=True).size())
+    cohort = summary['nets_tagged'] + summary['nets_lost']
+    summary['lost_percentage'] = (summary['nets_lost'] / cohort.where(cohort > 0) * 100).fillna(0)
+    return summary
+
+
+def brand_pivot(cube, levels):
+    """Return tagged nets per brand at the given levels, with a Total row and column"""
+    pivot = net_counts_by(cube, levels)
+    pivot.loc['Total' if len(levels) == 1 else ('Total',) + ('',) * (len(levels) - 1), :] = pivot.sum()
+    pivot['Total'] = pivot.sum(axis=1)
+    # Adding a row to a MultiIndex frame upcasts the counts to float
+    return pivot.astype(int)
@@ -0,0 +1,212 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from data_store import LOCATION_COLUMNS, data_version, load_table
+from filter_cache import LRUCache
+from metrics import (
+    HOUSEHOLD_SUMMARY_COLUMNS, brand_pivot, build_household_summary, build_location_cube, filter_by_location,
+    kpis, location_summary, slice_cube,
+)
+from spatial import village_centroids
+import sql_backend
+
+# Same switch as the dashboard: 'pandas' reads the columnar cache, 'sql' the database from database.py
+DATA_BACKEND = os.getenv('DASHBOARD_BACKEND', 'pandas').lower()
+HOST = '127.0.0.1'
+PORT = 8502
+FORMATS = {'json': 'application/json', 'csv': 'text/csv; charset=utf-8'}
+
+DISTRICT_LEVELS = ['selected_district']
+SUBCOUNTY_LEVELS = ['selected_district', 'selected_subcounty']
+# Villages are keyed with their parish, as in the dashboard, since names repeat across parishes
+VILLAGE_LEVELS = LOCATION_COLUMNS
+BRAND_VILLAGE_LEVELS = ['selected_district', 'selected_subcounty', 'selected_village']
+
+# Rendered responses per (backend, version, dataset, district, subcounty, format); a new data
+# version changes the key, so stale entries are never served and simply age out
+_responses = LRUCache(maxsize=256)
+# Household summary and location cube per (backend, version); two versions cover a reload in progress
+_sources = LRUCache(maxsize=2)
+_database_ready = False
+
+
+def current_version(backend=DATA_BACKEND):
+    """Return the data version responses are cached and tagged under"""
+    if backend == 'sql':
+        return sql_backend.data_version()
+    return data_version(['survey', 'campnets', 'lostnets'])
+
+
+def _build_sources(backend):
+    global _database_ready
+    if backend == 'sql':
+        if not _database_ready:
+            sql_backend.ensure_indexes()
+            _database_ready = True
+        return sql_backend.query_household_summary(), sql_backend.query_location_cube()
+    survey_df, campnets_df, lostnets_df = (
+        load_table(name, HOUSEHOLD_SUMMARY_COLUMNS[name]) for name in ['survey', 'campnets', 'lostnets']
+    )
+    household_summary = build_household_summary(survey_df, campnets_df, lostnets_df)
+    return household_summary, build_location_cube(survey_df, household_summary)
+
+
+def load_sources(version, backend=DATA_BACKEND):
+    """Return the household summary and location cube for a data version, built once per version"""
+    return _sources.get_or_compute((backend, version), lambda: _build_sources(backend))
+
+
+# Every dataset is computed from the household summary and the selection's slice of the cube
+DATASETS = {
+    'kpis': lambda household_summary, cube: pd.DataFrame([kpis(cube)]),
+    'districts': lambda household_summary, cube: location_summary(cube, DISTRICT_LEVELS),
+    'subcounties': lambda household_summary, cube: location_summary(cube, SUBCOUNTY_LEVELS),
+    'villages': lambda household_summary, cube: location_summary(cube, VILLAGE_LEVELS),
+    'brands_by_district': lambda household_summary, cube: brand_pivot(cube, DISTRICT_LEVELS),
+    'brands_by_subcounty': lambda household_summary, cube: brand_pivot(cube, SUBCOUNTY_LEVELS),
+    'brands_by_village': lambda household_summary, cube: brand_pivot(cube, BRAND_VILLAGE_LEVELS),
+    'households': lambda household_summary, cube: household_summary,
+    'village_centroids': lambda household_summary, cube: village_centroids(household_summary),
+}
+
+
+def compute_dataset(name, version, district='All', subcounty='All', backend=DATA_BACKEND):
+    """Return one dataset for a selection as a flat table ('All' leaves a level unfiltered)"""
+    household_summary, cube = load_sources(version, backend)
+    household_summary = filter_by_location(household_summary, district, subcounty)
+    table = DATASETS[name](household_summary, slice_cube(cube, district, subcounty))
+    if name == 'kpis':
+        return table
+    table = table.reset_index()
+    table.columns = [str(col) for col in table.columns]
+    return table
+
+
+def render(table, fmt, meta):
+    """Serialise a dataset as JSON (with its version and filters) or CSV"""
+    if fmt == 'csv':
+        return table.to_csv(index=False).encode()
+    # to_json writes NaN as null and numpy scalars as plain numbers
+    rows = json.loads(table.to_json(orient='records', date_format='iso'))
+    return json.dumps({**meta, 'rows': rows}).encode()
+
+
+def get_response(name, district='All', subcounty='All', fmt='json', backend=DATA_BACKEND):
+    """Return (body, etag) for a dataset, rendering it only once per data version and selection
+
+    The ETag is a digest of the body, so it stays valid across restarts and
+    only changes when the numbers do.
+    """
+    version = current_version(backend)
+
+    def build():
+        table = compute_dataset(name, version, district, subcounty, backend)
+        meta = {'dataset': name, 'version': version, 'district': district, 'subcounty': subcounty}
+        body = render(table, fmt, meta)
+        return body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+    return _responses.get_or_compute((backend, version, name, district, subcounty, fmt), build)
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header lists the ETag (weak comparison, as RFC 9110 requires)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return etag in candidates
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves GET /<dataset>?district=&subcounty=&format=json|csv and GET / for the dataset list"""
+
+    server_version = 'MetricsAPI/1.0'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        name = url.path.strip('/')
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if not name:
+            body = json.dumps({'datasets': list(DATASETS), 'formats': list(FORMATS)}).encode()
+            return self._send(HTTPStatus.OK, body, FORMATS['json'])
+        if name not in DATASETS:
+            return self._send_error(HTTPStatus.NOT_FOUND, f"Unknown dataset '{name}'")
+        fmt = query.get('format', 'json')
+        if fmt not in FORMATS:
+            return self._send_error(HTTPStatus.BAD_REQUEST, f"Unknown format '{fmt}'")
+
+        body, etag = get_response(name, query.get('district', 'All'), query.get('subcounty', 'All'), fmt)
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            return self._send(HTTPStatus.NOT_MODIFIED, b'', None, etag)
+        self._send(HTTPStatus.OK, body, FORMATS[fmt], etag)
+
+    def _send(self, status, body, content_type, etag=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        if etag:
+            self.send_header('ETag', etag)
+            # Clients may keep the body but must revalidate, which costs a 304 when nothing changed
+            self.send_header('Cache-Control', 'no-cache')
+        if status != HTTPStatus.NOT_MODIFIED:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        self._send(status, json.dumps({'error': message}).encode(), FORMATS['json'])
+
+    do_HEAD = do_GET
+
+
+def serve(host=HOST, port=PORT):
+    """Serve the metrics over HTTP until interrupted"""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    print(f"Serving {', '.join(DATASETS)} on http://{host}:{port}/ ({DATA_BACKEND} backend)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Dashboard metrics as JSON or CSV, without the Streamlit app")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    get = commands.add_parser('get', help="Print one dataset")
+    get.add_argument('dataset', choices=list(DATASETS))
+    get.add_argument('--district', default='All')
+    get.add_argument('--subcounty', default='All')
+    get.add_argument('--format', choices=list(FORMATS), default='json')
+    get.add_argument('--output', help="File to write instead of standard output")
+
+    server = commands.add_parser('serve', help="Serve every dataset over HTTP")
+    server.add_argument('--host', default=HOST)
+    server.add_argument('--port', type=int, default=PORT)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == 'serve':
+        serve(args.host, args.port)
+    else:
+        body, _ = get_response(args.dataset, args.district, args.subcounty, args.format)
+        if args.output:
+            with open(args.output, 'wb') as f:
+                f.write(body)
+        else:
+            sys.stdout.buffer.write(body)
+            sys.stdout.buffer.write(b'\n')
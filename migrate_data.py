@@ -1,45 +1,239 @@
+import argparse
+import math
 import sqlite3
-import pandas as pd
-from database import get_db_connection
-
-def migrate_data():
-    # Connect to SQLite
-    sqlite_conn = sqlite3.connect('your_old_database.db')
-    
-    # Read data from SQLite
-    survey_df = pd.read_sql_query("SELECT * FROM survey", sqlite_conn)
-    campnets_df = pd.read_sql_query("SELECT * FROM campnets", sqlite_conn)
-    lostnets_df = pd.read_sql_query("SELECT * FROM lostnets", sqlite_conn)
-    
-    sqlite_conn.close()
-    
-    # Connect to SQL Server and insert data
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        
-        # Insert survey data
-        for _, row in survey_df.iterrows():
-            cursor.execute("""
-                INSERT INTO survey (hhid, selected_district, selected_subcounty, 
-                                  selected_parish, selected_village, gpsloc)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, tuple(row))
-            
-        # Insert campnets data
-        for _, row in campnets_df.iterrows():
-            cursor.execute("""
-                INSERT INTO campnets (hhid, brand, distribution_date)
-                VALUES (?, ?, ?)
-            """, tuple(row))
-            
-        # Insert lostnets data
-        for _, row in lostnets_df.iterrows():
-            cursor.execute("""
-                INSERT INTO lostnets (hhid, reason, loss_date)
-                VALUES (?, ?, ?)
-            """, tuple(row))
-        
-        conn.commit()
+import time
+
+SOURCE_DB = 'mosquito_net.db'
+TABLES = ['survey', 'campnets', 'lostnets', 'hhmembers', 'othernets']
+BATCH_SIZE = 5000
+CHECKPOINT_TABLE = 'migration_checkpoint'
+
+# SQLite column affinity -> SQL Server type for tables the migration has to create; other columns are text
+SQLSERVER_TYPES = {
+    'INTEGER': 'BIGINT',
+    'REAL': 'FLOAT',
+    'TIMESTAMP': 'DATETIME2',
+}
+# Text columns become NVARCHAR(n), n the longest source value rounded up to a power of two (at least
+# TEXT_MIN_LENGTH). pyodbc's fast_executemany sends NVARCHAR(MAX) parameters row by row, so MAX is only
+# used for values past NVARCHAR's TEXT_MAX_LENGTH characters
+TEXT_MIN_LENGTH = 64
+TEXT_MAX_LENGTH = 4000
+
+
+def quote(name):
+    """Quote an identifier the ANSI way, which both SQLite and SQL Server accept"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def is_sqlite(conn):
+    return isinstance(conn, sqlite3.Connection)
+
+
+def source_columns(source_conn, table):
+    """Return (name, declared type) for each column of a source table"""
+    return [(row[1], row[2].upper()) for row in source_conn.execute(f"PRAGMA table_info({quote(table)})")]
+
+
+def target_columns(target_conn, table):
+    """Return the column names of a target table, or None if it does not exist"""
+    cursor = target_conn.cursor()
+    try:
+        cursor.execute(f"SELECT * FROM {quote(table)} WHERE 1 = 0")
+    except Exception:
+        target_conn.rollback()
+        return None
+    return [column[0] for column in cursor.description]
+
+
+def text_lengths(source_conn, table, columns):
+    """Return the longest value, in characters, of each text column of a source table (0 if all NULL)"""
+    text = [name for name, declared in columns if declared not in SQLSERVER_TYPES]
+    if not text:
+        return {}
+    row = source_conn.execute(
+        f"SELECT {', '.join(f'MAX(LENGTH({quote(name)}))' for name in text)} FROM {quote(table)}"
+    ).fetchone()
+    return {name: length or 0 for name, length in zip(text, row)}
+
+
+def nvarchar_length(longest):
+    """Return the NVARCHAR length for a column whose longest value has this many characters (-1 for MAX)"""
+    if longest > TEXT_MAX_LENGTH:
+        return -1
+    return min(TEXT_MAX_LENGTH, max(TEXT_MIN_LENGTH, 2 ** math.ceil(math.log2(max(longest, 1)))))
+
+
+def _sqlserver_text_lengths(target_conn, table):
+    """Return the declared length of each character column of a SQL Server table (-1 for MAX)"""
+    cursor = target_conn.cursor()
+    cursor.execute(
+        "SELECT COLUMN_NAME, CHARACTER_MAXIMUM_LENGTH FROM INFORMATION_SCHEMA.COLUMNS "
+        "WHERE TABLE_NAME = ? AND CHARACTER_MAXIMUM_LENGTH IS NOT NULL", (table,)
+    )
+    return {name.lower(): length for name, length in cursor.fetchall()}
+
+
+def ensure_target_table(target_conn, table, columns, lengths=None):
+    """Create the target table with every source column, or add the columns it is missing
+
+    schema.sql only declares a handful of columns; the wide Kobo columns are
+    added here so nothing is dropped on the way to SQL Server. Text columns
+    are sized from ``lengths`` (text_lengths()), and on SQL Server existing
+    ones too narrow for the source values are widened.
+    """
+    lengths = lengths or {}
+
+    def column_type(name, declared):
+        if is_sqlite(target_conn):
+            return declared or 'TEXT'
+        if declared in SQLSERVER_TYPES:
+            return SQLSERVER_TYPES[declared]
+        length = nvarchar_length(lengths.get(name, 0))
+        return 'NVARCHAR(MAX)' if length == -1 else f'NVARCHAR({length})'
+
+    existing = target_columns(target_conn, table)
+    cursor = target_conn.cursor()
+    if existing is None:
+        definitions = ', '.join(f"{quote(name)} {column_type(name, declared)}" for name, declared in columns)
+        cursor.execute(f"CREATE TABLE {quote(table)} ({definitions})")
+    else:
+        existing = {name.lower() for name in existing}
+        declared_lengths = {} if is_sqlite(target_conn) else _sqlserver_text_lengths(target_conn, table)
+        for name, declared in columns:
+            if name.lower() not in existing:
+                cursor.execute(f"ALTER TABLE {quote(table)} ADD {quote(name)} {column_type(name, declared)}")
+                continue
+            width = declared_lengths.get(name.lower())
+            if width is not None and width != -1 and lengths.get(name, 0) > width:
+                # Otherwise the batch fails with "String or binary data would be truncated"
+                cursor.execute(f"ALTER TABLE {quote(table)} ALTER COLUMN {quote(name)} {column_type(name, declared)}")
+    target_conn.commit()
+
+
+def ensure_checkpoint_table(target_conn):
+    if target_columns(target_conn, CHECKPOINT_TABLE) is None:
+        target_conn.cursor().execute(
+            f"CREATE TABLE {CHECKPOINT_TABLE} (table_name VARCHAR(100) PRIMARY KEY, "
+            f"last_rowid BIGINT NOT NULL, rows_copied BIGINT NOT NULL)"
+        )
+        target_conn.commit()
+
+
+def read_checkpoint(target_conn, table):
+    """Return (last source rowid, rows copied) recorded for a table"""
+    cursor = target_conn.cursor()
+    cursor.execute(f"SELECT last_rowid, rows_copied FROM {CHECKPOINT_TABLE} WHERE table_name = ?", (table,))
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def write_checkpoint(cursor, table, last_rowid, rows_copied):
+    """Record progress in the same transaction as the batch it describes"""
+    cursor.execute(
+        f"UPDATE {CHECKPOINT_TABLE} SET last_rowid = ?, rows_copied = ? WHERE table_name = ?",
+        (last_rowid, rows_copied, table)
+    )
+    if cursor.rowcount == 0:
+        cursor.execute(
+            f"INSERT INTO {CHECKPOINT_TABLE} (table_name, last_rowid, rows_copied) VALUES (?, ?, ?)",
+            (table, last_rowid, rows_copied)
+        )
+
+
+def migrate_table(source_conn, target_conn, table, batch_size=BATCH_SIZE, report=print):
+    """Copy one table in committed batches, resuming after the last checkpointed source row"""
+    columns = source_columns(source_conn, table)
+    if not columns:
+        report(f"{table}: not in source database, skipped")
+        return 0
+    lengths = {} if is_sqlite(target_conn) else text_lengths(source_conn, table, columns)
+    ensure_target_table(target_conn, table, columns, lengths)
+
+    last_rowid, rows_copied = read_checkpoint(target_conn, table)
+    total = source_conn.execute(f"SELECT COUNT(*) FROM {quote(table)}").fetchone()[0]
+    names = [name for name, _ in columns]
+    insert_sql = (
+        f"INSERT INTO {quote(table)} ({', '.join(quote(name) for name in names)}) "
+        f"VALUES ({', '.join('?' for _ in names)})"
+    )
+    select_sql = (
+        f"SELECT rowid, {', '.join(quote(name) for name in names)} FROM {quote(table)} "
+        f"WHERE rowid > ? ORDER BY rowid"
+    )
+
+    cursor = target_conn.cursor()
+    if hasattr(cursor, 'fast_executemany'):
+        # pyodbc sends the whole parameter array in one round trip
+        cursor.fast_executemany = True
+
+    start = time.perf_counter()
+    copied_this_run = 0
+    source_cursor = source_conn.execute(select_sql, (last_rowid,))
+    while True:
+        rows = source_cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        cursor.executemany(insert_sql, [row[1:] for row in rows])
+        last_rowid = rows[-1][0]
+        rows_copied += len(rows)
+        copied_this_run += len(rows)
+        write_checkpoint(cursor, table, last_rowid, rows_copied)
+        target_conn.commit()
+
+        elapsed = time.perf_counter() - start
+        report(f"{table}: {rows_copied:,}/{total:,} rows ({copied_this_run / elapsed:,.0f} rows/s)")
+
+    if copied_this_run == 0:
+        report(f"{table}: {rows_copied:,}/{total:,} rows, already up to date")
+    return copied_this_run
+
+
+def migrate_data(source_path=SOURCE_DB, target_conn=None, tables=TABLES, batch_size=BATCH_SIZE,
+                 restart=False, report=print):
+    """Migrate the SQLite tables to the target database (SQL Server by default)"""
+    source_conn = sqlite3.connect(source_path)
+    try:
+        if target_conn is None:
+            # Imported here so SQLite-to-SQLite runs work without pyodbc installed
+            from database import get_db_connection
+            with get_db_connection() as conn:
+                return _migrate(source_conn, conn, tables, batch_size, restart, report)
+        return _migrate(source_conn, target_conn, tables, batch_size, restart, report)
+    finally:
+        source_conn.close()
+
+
+def _migrate(source_conn, target_conn, tables, batch_size, restart, report):
+    ensure_checkpoint_table(target_conn)
+    if restart:
+        target_conn.cursor().execute(f"DELETE FROM {CHECKPOINT_TABLE}")
+        target_conn.commit()
+
+    start = time.perf_counter()
+    copied = 0
+    for table in tables:
+        copied += migrate_table(source_conn, target_conn, table, batch_size, report)
+    elapsed = time.perf_counter() - start
+    report(f"Migrated {copied:,} rows in {elapsed:.1f}s ({copied / elapsed if elapsed else 0:,.0f} rows/s)")
+    return copied
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Migrate mosquito_net.db to SQL Server in resumable batches")
+    parser.add_argument('--source', default=SOURCE_DB, help="SQLite database to read from")
+    parser.add_argument('--target-sqlite', help="Write to this SQLite file instead of SQL Server (for testing)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Rows per insert batch and commit")
+    parser.add_argument('--tables', nargs='+', default=TABLES, help="Tables to migrate")
+    parser.add_argument('--restart', action='store_true', help="Ignore saved checkpoints and copy from the first row (does not empty the target tables)")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    migrate_data() 
\ No newline at end of file
+    args = parse_args()
+    target = sqlite3.connect(args.target_sqlite) if args.target_sqlite else None
+    try:
+        migrate_data(args.source, target, args.tables, args.batch_size, args.restart)
+    finally:
+        if target is not None:
+            target.close()
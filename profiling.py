@@ -0,0 +1,185 @@
+import cProfile
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+# '' (off), 'timing' (per-section table), 'cprofile' or 'pyinstrument' (timing plus a whole-rerun profile dump)
+PROFILE_MODE = os.getenv('DASHBOARD_PROFILE', '').lower()
+PROFILE_DIR = os.path.join('.cache', 'profiles')
+# Sections listed in the log line for each profiled rerun
+HOTTEST_SECTIONS = 5
+
+# tracemalloc is process-wide and each Streamlit session reruns in its own thread: the first profiled rerun
+# starts tracing, the last one to finish stops it, and a section's memory is only recorded if no other
+# rerun was traced while it ran, since their allocations and peak resets would land in its figures
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+# Reruns that started tracing so far; a section whose count moved overlapped another profiled rerun
+_tracing_starts = 0
+# Tracing was already on (e.g. PYTHONTRACEMALLOC) when the first rerun came; it is left on and shared
+_tracing_external = False
+
+logger = logging.getLogger(__name__)
+if not logger.handlers:
+    # Streamlit only configures its own loggers; profiled reruns should still reach the console
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.INFO)
+
+
+def _start_tracing():
+    global _tracing_users, _tracing_starts, _tracing_external
+    with _tracing_lock:
+        if _tracing_users == 0:
+            _tracing_external = tracemalloc.is_tracing()
+            if not _tracing_external:
+                tracemalloc.start()
+        _tracing_users += 1
+        _tracing_starts += 1
+
+
+def _stop_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and not _tracing_external:
+            # Tracing slows every allocation; do not leave it on for unprofiled reruns
+            tracemalloc.stop()
+
+
+class RunProfiler:
+    """Collects wall time, rows processed and memory per dashboard section for one rerun
+
+    Sections either wrap a block (``with profiler.section(name):``) or run
+    from one ``start_section()`` to the next, which suits a top-level
+    script. When disabled every call is a no-op, so instrumentation can stay
+    in place in production.
+    """
+
+    def __init__(self, mode=PROFILE_MODE, profile_dir=PROFILE_DIR):
+        self.mode = mode
+        self.enabled = bool(mode)
+        self.profile_dir = profile_dir
+        self.records = []
+        self._current = None
+        self._profiler = None
+        self._started = time.perf_counter()
+        self._tracing = False
+        if not self.enabled:
+            return
+        _start_tracing()
+        self._tracing = True
+        if mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif mode == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                logger.warning("pyinstrument is not installed; recording section timings only")
+            else:
+                self._profiler = Profiler()
+                self._profiler.start()
+
+    def start_section(self, name):
+        """End the running section, if any, and start timing the next one"""
+        if not self.enabled:
+            return
+        self.end_section()
+        with _tracing_lock:
+            alone = _tracing_users == 1 and not _tracing_external
+            if alone:
+                tracemalloc.reset_peak()
+            self._current = {
+                'section': name,
+                'rows': 0,
+                'start': time.perf_counter(),
+                'memory_start': tracemalloc.get_traced_memory()[0] if alone else None,
+                'tracing_starts': _tracing_starts,
+            }
+
+    def end_section(self):
+        if not self.enabled or self._current is None:
+            return
+        record = self._current
+        seconds = time.perf_counter() - record['start']
+        with _tracing_lock:
+            alone = record['memory_start'] is not None and _tracing_starts == record['tracing_starts']
+            current, peak = tracemalloc.get_traced_memory()
+        self.records.append({
+            'section': record['section'],
+            'seconds': seconds,
+            'rows': record['rows'],
+            # NaN when another session was profiled during the section
+            'memory_delta_mb': (current - record['memory_start']) / 2 ** 20 if alone else float('nan'),
+            'peak_mb': (peak - record['memory_start']) / 2 ** 20 if alone else float('nan'),
+        })
+        self._current = None
+
+    @contextmanager
+    def section(self, name):
+        self.start_section(name)
+        try:
+            yield self
+        finally:
+            self.end_section()
+
+    def add_rows(self, rows):
+        """Count rows processed by the running section"""
+        if self.enabled and self._current is not None:
+            self._current['rows'] += int(rows)
+
+    def finish(self):
+        """Close the last section, save any profile dump and log the hottest sections
+
+        Returns the path of the profile dump, if one was written. Sections
+        started afterwards, e.g. by a fragment rerun, are not recorded.
+        """
+        if not self.enabled:
+            return None
+        self.end_section()
+        self.enabled = False
+        if self._tracing:
+            _stop_tracing()
+            self._tracing = False
+        total = time.perf_counter() - self._started
+        hottest = sorted(self.records, key=lambda record: record['seconds'], reverse=True)[:HOTTEST_SECTIONS]
+        logger.info("Rerun took %.3fs; hottest sections: %s", total,
+                    ', '.join(f"{record['section']} {record['seconds']:.3f}s" for record in hottest))
+        if self.memory_skipped:
+            logger.info("Memory not recorded for %d section(s): other sessions were profiled at the same time",
+                        self.memory_skipped)
+        return self._dump_profile()
+
+    @property
+    def memory_skipped(self):
+        """Number of recorded sections without memory figures because another rerun was traced meanwhile"""
+        return sum(record['peak_mb'] != record['peak_mb'] for record in self.records)
+
+    def _dump_profile(self):
+        if self._profiler is None:
+            return None
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        if self.mode == 'cprofile':
+            self._profiler.disable()
+            path = os.path.join(self.profile_dir, f"rerun-{stamp}.prof")
+            self._profiler.dump_stats(path)
+        else:
+            self._profiler.stop()
+            path = os.path.join(self.profile_dir, f"rerun-{stamp}.html")
+            with open(path, 'w') as f:
+                f.write(self._profiler.output_html())
+        self._profiler = None
+        logger.info("Profile written to %s", path)
+        return path
+
+    def report(self):
+        """Return the recorded sections as a table, slowest first"""
+        columns = ['section', 'seconds', 'rows', 'memory_delta_mb', 'peak_mb']
+        return pd.DataFrame(self.records, columns=columns).sort_values('seconds', ascending=False, ignore_index=True)
@@ -0,0 +1,351 @@
+import argparse
+import hashlib
+import html
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from access import ACCESS_COLUMNS, access_indicators, build_access_cube, build_household_access, use_by_age_group
+from bootstrap import brand_share_intervals, format_interval, lost_percentage_intervals
+from data_store import data_version, load_table
+from durability import (
+    DURABILITY_COLUMNS, build_lost_frame, build_net_frame, durability_summary, household_survey_dates,
+)
+from metrics import brand_counts, brand_pivot, filter_by_location, kpis, location_summary, roll_up, slice_cube
+from metrics_api import DATA_BACKEND, load_sources
+import sql_backend
+
+REPORT_DIR = 'reports'
+# Bump when the report layout changes so every report is rendered again
+REPORT_VERSION = 1
+MANIFEST = 'manifest.json'
+# Written once per output directory; every report loads it instead of embedding 3 MB of JavaScript
+PLOTLY_JS = 'plotly.min.js'
+MAX_WORKERS = int(os.getenv('REPORT_WORKERS', str(os.cpu_count() or 1)))
+
+# The table below each report's KPIs breaks its location down one level further
+NEXT_LEVELS = {
+    'all': ['selected_district'],
+    'district': ['selected_district', 'selected_subcounty'],
+    'subcounty': ['selected_district', 'selected_subcounty', 'selected_parish', 'selected_village'],
+}
+LABELS = {
+    'selected_district': 'District', 'selected_subcounty': 'Subcounty', 'selected_parish': 'Parish',
+    'selected_village': 'Village', 'households': 'Households', 'villages': 'Villages',
+    'nets_tagged': 'Nets Tagged', 'nets_lost': 'Nets Lost', 'lost_percentage': 'Nets Lost (%)',
+    'nets_present': 'Nets Present', 'nets_assessed': 'Nets Assessed', 'mean_phi': 'Mean pHI',
+    'median_phi': 'Median pHI', 'good_pct': 'Good (%)', 'damaged_pct': 'Damaged (%)', 'too_torn_pct': 'Too Torn (%)',
+    'population': 'De Facto Population', 'users': 'Slept Under a Net', 'use_pct': 'Use (%)',
+}
+
+STYLE = """
+body { font-family: Arial, sans-serif; margin: 2rem; color: #262730; }
+h1 { margin-bottom: 0; }
+.generated { color: #808495; margin-top: 0.25rem; }
+.kpis { display: flex; gap: 1rem; flex-wrap: wrap; }
+.kpi { background: #f0f2f6; border-radius: 0.5rem; padding: 1rem 1.2rem; min-width: 10rem; }
+.kpi .value { font-size: 1.6rem; font-weight: bold; }
+.kpi .note { color: #808495; font-size: 0.8rem; }
+table { border-collapse: collapse; margin: 0.5rem 0 1.5rem; font-size: 0.9rem; }
+th, td { border: 1px solid #d6d6d9; padding: 0.25rem 0.6rem; text-align: right; }
+th { background: #f0f2f6; }
+td:first-child, th:first-child { text-align: left; }
+.charts { display: flex; flex-wrap: wrap; gap: 1rem; }
+.chart { flex: 1 1 30rem; }
+@page { size: A4; margin: 1.5cm; }
+@media print {
+    body { margin: 0; }
+    section, .chart, table { break-inside: avoid; }
+}
+"""
+
+
+def slug(*names):
+    """Return a file-name-safe name for a location"""
+    return '--'.join(re.sub(r'[^a-z0-9]+', '-', str(name).lower()).strip('-') for name in names)
+
+
+def report_name(district, subcounty):
+    if district == 'All':
+        return 'all.html'
+    if subcounty == 'All':
+        return slug(district) + '.html'
+    return slug(district, subcounty) + '.html'
+
+
+def report_level(district, subcounty):
+    if district == 'All':
+        return 'all'
+    return 'district' if subcounty == 'All' else 'subcounty'
+
+
+def current_version(backend=DATA_BACKEND):
+    """Return the version of every input the reports read"""
+    if backend == 'sql':
+        return sql_backend.data_version()
+    return data_version()
+
+
+def load_inputs(version, backend=DATA_BACKEND):
+    """Load every table the reports use once, for all locations
+
+    Returns the location cube, the access cube and the per-net durability
+    frames, each carrying the location columns the reports are sliced by.
+    """
+    household_summary, cube = load_sources(version, backend)
+    if backend == 'sql':
+        campnets_access, hhmembers_df, othernets_df = sql_backend.load_access_tables()
+        survey_df, campnets_df, lostnets_df = sql_backend.load_durability_tables()
+    else:
+        campnets_access, hhmembers_df, othernets_df = (
+            load_table(name, ACCESS_COLUMNS[name]) for name in ['campnets', 'hhmembers', 'othernets']
+        )
+        survey_df, campnets_df, lostnets_df = (
+            load_table(name, DURABILITY_COLUMNS[name]) for name in ['survey', 'campnets', 'lostnets']
+        )
+    access_cube = build_access_cube(build_household_access(household_summary, campnets_access, hhmembers_df,
+                                                           othernets_df))
+    nets = build_net_frame(campnets_df, household_summary, household_survey_dates(survey_df))
+    lost = build_lost_frame(lostnets_df, household_summary)
+    return cube, access_cube, nets, lost
+
+
+def locations(cube):
+    """Return every (district, subcounty) a report is written for, the whole study first"""
+    pairs = cube.index.droplevel(['selected_parish', 'selected_village']).unique().sort_values()
+    districts = pairs.get_level_values('selected_district').unique()
+    return [('All', 'All')] + [(district, 'All') for district in districts] + list(pairs)
+
+
+def location_inputs(inputs, district, subcounty):
+    """Slice the shared inputs down to one location; this is all a worker receives"""
+    cube, access_cube, nets, lost = inputs
+    return {
+        'district': district,
+        'subcounty': subcounty,
+        'cube': slice_cube(cube, district, subcounty),
+        'access_cube': slice_cube(access_cube, district, subcounty),
+        'nets': filter_by_location(nets, district, subcounty),
+        'lost': filter_by_location(lost, district, subcounty),
+    }
+
+
+def inputs_digest(payload):
+    """Fingerprint a location's inputs, so a report is only rendered again when they change"""
+    digest = hashlib.sha256(f"{REPORT_VERSION}:{payload['district']}:{payload['subcounty']}".encode())
+    for key in ['cube', 'access_cube', 'nets', 'lost']:
+        digest.update(pd.util.hash_pandas_object(payload[key]).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _table(df, formats=None):
+    df = df.rename(columns=LABELS).rename_axis(index=[LABELS.get(name, name) for name in df.index.names])
+    formatters = {LABELS.get(col, col): fmt.format for col, fmt in (formats or {}).items()}
+    return df.to_html(formatters=formatters, float_format='{:,.1f}'.format, border=0, na_rep='')
+
+
+def _kpi(label, value, note=''):
+    note_html = f'<div class="note">{html.escape(note)}</div>' if note else ''
+    return f'<div class="kpi"><div>{html.escape(label)}</div><div class="value">{value}</div>{note_html}</div>'
+
+
+def _chart(fig):
+    fig.update_layout(margin=dict(l=20, r=20, t=50, b=20), height=380)
+    return '<div class="chart">' + fig.to_html(full_html=False, include_plotlyjs=False) + '</div>'
+
+
+def render_report(payload, generated):
+    """Render one location's report as a standalone HTML page (print it to PDF from any browser)"""
+    # Imported in the worker, so the parent does not pay for plotly when every report is current
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    district, subcounty = payload['district'], payload['subcounty']
+    cube, access_cube = payload['cube'], payload['access_cube']
+    level = report_level(district, subcounty)
+    title = 'All districts' if level == 'all' else (district if level == 'district' else f"{district} – {subcounty}")
+
+    # The workers already run in parallel, so the bootstrap draws stay in this process
+    figures = kpis(cube)
+    lost_interval = lost_percentage_intervals(cube, parallel=False).iloc[0]
+    kpi_html = ''.join([
+        _kpi('Households Visited', f"{figures['households']:,}"),
+        _kpi('Villages Visited', f"{figures['villages']:,}"),
+        _kpi('Campaign Nets Tagged', f"{figures['nets_tagged']:,}"),
+        _kpi('Nets Lost (%)', f"{figures['lost_percentage']:.1f}%",
+             f"95% CI {format_interval(lost_interval['lower'], lost_interval['upper'])}"),
+    ])
+
+    breakdown = location_summary(cube, NEXT_LEVELS[level])
+    villages = roll_up(cube, ['selected_parish', 'selected_village'])['households'].reset_index()
+    villages['village'] = villages['selected_village'].astype(str) + ' (' + villages['selected_parish'].astype(str) + ')'
+    village_chart = px.bar(villages.sort_values('households', ascending=False), x='village', y='households',
+                           title='Households by Village', labels={'village': 'Village (Parish)', 'households': 'Households'})
+    village_chart.update_layout(xaxis_tickangle=-45)
+
+    brand_totals = brand_counts(cube).sum().sort_values(ascending=False)
+    brand_intervals = brand_share_intervals(cube, parallel=False)
+    brands = pd.DataFrame({
+        'Net Count': brand_totals,
+        'Percentage': brand_totals / brand_totals.sum() * 100 if brand_totals.sum() else 0.0,
+        '95% CI': [format_interval(*brand_intervals.loc[brand, ['lower', 'upper']]) for brand in brand_totals.index],
+    }).rename_axis('Brand')
+    brand_chart = px.pie(brands.reset_index(), values='Net Count', names='Brand', title='Tagged Nets by Brand', hole=0.4)
+    pivot = brand_pivot(cube, NEXT_LEVELS[level][-2:] if level == 'subcounty' else NEXT_LEVELS[level])
+
+    lost_chart = go.Figure(go.Pie(labels=['Lost Nets', 'Active Nets'], hole=0.7, marker_colors=['#FF9999', '#99FF99'],
+                                  values=[figures['nets_lost'], figures['nets_tagged'] - figures['nets_lost']]))
+    lost_chart.update_layout(title='Nets Lost vs Active Nets')
+
+    access = access_indicators(access_cube)
+    access_html = ''.join([
+        _kpi('De Facto Population', f"{access['de_facto_population']:,}"),
+        _kpi('Population with Access', f"{access['population_with_access_pct']:.1f}%"),
+        _kpi('Nets per 2 People', f"{access['nets_per_two_people']:.2f}"),
+        _kpi('Slept Under a Net', f"{access['use_pct']:.1f}%"),
+    ])
+    age_use = use_by_age_group(access_cube)
+    age_chart = px.bar(age_use.reset_index(), x='age_group', y='use_pct', range_y=[0, 100], title='Net Use by Age Group',
+                       labels={'age_group': 'Age Group', 'use_pct': 'Slept Under a Net (%)'})
+    durability = durability_summary(payload['nets'], payload['lost'], ['brand'])
+
+    sections = [
+        f'<section><div class="kpis">{kpi_html}</div></section>',
+        f'<section><h2>Coverage</h2>{_table(breakdown)}<div class="charts">{_chart(village_chart)}</div></section>',
+        f'<section><h2>Brands</h2>{_table(brands, {"Net Count": "{:,.0f}"})}'
+        f'<div class="charts">{_chart(brand_chart)}{_chart(lost_chart)}</div>'
+        f'<h3>Tagged Nets by Location and Brand</h3>{_table(pivot)}</section>',
+        f'<section><h2>Net Access and Use</h2><div class="kpis">{access_html}</div>'
+        f'{_table(age_use, {"population": "{:,.0f}", "users": "{:,.0f}"})}<div class="charts">{_chart(age_chart)}</div></section>',
+        f'<section><h2>Net Durability by Brand</h2>{_table(durability)}</section>',
+    ]
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)} – LLIN Durability Study</title>
+<script src="{PLOTLY_JS}"></script>
+<style>{STYLE}</style>
+</head>
+<body>
+<h1>🦟 {html.escape(title)}</h1>
+<p class="generated">Vestergaard LLIN Durability Study · generated {generated} · <a href="index.html">all reports</a></p>
+{''.join(sections)}
+</body>
+</html>
+"""
+
+
+def write_report(path, payload, generated):
+    """Render a report and write it atomically; runs in a worker process"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(render_report(payload, generated))
+    os.replace(tmp_path, path)
+    return path
+
+
+def write_index(output_dir, rows, generated):
+    """Write the page linking every report, with each location's headline figures"""
+    links = ''.join(
+        f'<tr><td><a href="{name}">{html.escape(title)}</a></td><td>{figures["households"]:,}</td>'
+        f'<td>{figures["nets_tagged"]:,}</td><td>{figures["lost_percentage"]:.1f}%</td></tr>'
+        for name, title, figures in rows
+    )
+    page = f"""<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>LLIN Durability Study reports</title><style>{STYLE}</style></head>
+<body>
+<h1>🦟 LLIN Durability Study reports</h1>
+<p class="generated">Generated {generated}</p>
+<table><tr><th>Location</th><th>Households</th><th>Nets Tagged</th><th>Nets Lost (%)</th></tr>{links}</table>
+</body>
+</html>
+"""
+    with open(os.path.join(output_dir, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write(page)
+
+
+def _read_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def export_reports(output_dir=REPORT_DIR, backend=DATA_BACKEND, workers=MAX_WORKERS, force=False, report=print):
+    """Write a report per district and subcounty plus the whole study, skipping unchanged ones
+
+    The data is loaded once; each location's slice is fingerprinted and only
+    reports whose inputs changed since the last export are rendered, spread
+    over a process pool. Returns the names of the reports written.
+    """
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    manifest = _read_manifest(manifest_path)
+    version = current_version(backend)
+    previous = manifest.get('reports', {})
+    if (not force and manifest.get('data_version') == version and manifest.get('report_version') == REPORT_VERSION
+            and all(os.path.exists(os.path.join(output_dir, name)) for name in previous)):
+        report(f"All {len(previous):,} reports are up to date for data version {version}")
+        return []
+
+    inputs = load_inputs(version, backend)
+    generated = datetime.now().strftime('%Y-%m-%d %H:%M')
+    digests, stale, index_rows = {}, [], []
+    for district, subcounty in locations(inputs[0]):
+        payload = location_inputs(inputs, district, subcounty)
+        name = report_name(district, subcounty)
+        digests[name] = inputs_digest(payload)
+        title = 'All districts' if district == 'All' else (district if subcounty == 'All' else f"{district} – {subcounty}")
+        index_rows.append((name, title, kpis(payload['cube'])))
+        if force or previous.get(name) != digests[name] or not os.path.exists(os.path.join(output_dir, name)):
+            stale.append((os.path.join(output_dir, name), payload))
+    report(f"Loaded data version {version} in {time.perf_counter() - start:.2f}s; "
+           f"{len(stale):,} of {len(digests):,} reports to render")
+
+    if stale and not os.path.exists(os.path.join(output_dir, PLOTLY_JS)):
+        from plotly.offline import get_plotlyjs
+        with open(os.path.join(output_dir, PLOTLY_JS), 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+
+    render_start = time.perf_counter()
+    if workers > 1 and len(stale) > 1:
+        # Spawned workers import only this module and what it needs, never the Streamlit app
+        with ProcessPoolExecutor(min(workers, len(stale)), mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(write_report, path, payload, generated) for path, payload in stale]
+            written = [future.result() for future in futures]
+    else:
+        written = [write_report(path, payload, generated) for path, payload in stale]
+    if stale:
+        report(f"Rendered {len(written):,} reports in {time.perf_counter() - render_start:.2f}s "
+               f"({min(workers, len(stale))} worker(s))")
+
+    # Reports of locations that no longer exist are left on disk but dropped from the index
+    write_index(output_dir, index_rows, generated)
+    with open(manifest_path, 'w') as f:
+        json.dump({'report_version': REPORT_VERSION, 'data_version': version, 'reports': digests}, f, indent=2)
+    report(f"Reports in {os.path.abspath(output_dir)} ({time.perf_counter() - start:.2f}s)")
+    return [os.path.basename(path) for path in written]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Write an HTML report for the study, every district and every subcounty")
+    parser.add_argument('--output', default=REPORT_DIR, help="Directory to write the reports to")
+    parser.add_argument('--backend', choices=['pandas', 'sql'], default=DATA_BACKEND)
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="Processes rendering reports")
+    parser.add_argument('--force', action='store_true', help="Render every report, even if its data is unchanged")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    export_reports(args.output, args.backend, args.workers, args.force)
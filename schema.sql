@@ -1,12 +1,13 @@
--- Survey table
+-- Survey table, keyed on the Kobo submission id: a household can be submitted more than once (validation.py flags it)
 CREATE TABLE survey (
-    hhid VARCHAR(50) PRIMARY KEY,
+    _id BIGINT PRIMARY KEY,
+    hhid VARCHAR(50),
     selected_district VARCHAR(100),
     selected_subcounty VARCHAR(100),
     selected_parish VARCHAR(100),
     selected_village VARCHAR(100),
     gpsloc VARCHAR(100)
-    -- Add other columns as needed
+    -- migrate_data.py adds the remaining Kobo export columns
 );
 
 -- Campaign nets table
@@ -15,7 +16,8 @@ CREATE TABLE campnets (
     hhid VARCHAR(50),
     brand VARCHAR(100),
     distribution_date DATE,
-    FOREIGN KEY (hhid) REFERENCES survey (hhid)
+    _submission__id BIGINT,
+    FOREIGN KEY (_submission__id) REFERENCES survey (_id)
 );
 
 -- Lost nets table
@@ -24,5 +26,28 @@ CREATE TABLE lostnets (
     hhid VARCHAR(50),
     reason VARCHAR(255),
     loss_date DATE,
-    FOREIGN KEY (hhid) REFERENCES survey (hhid)
-); 
\ No newline at end of file
+    _submission__id BIGINT,
+    FOREIGN KEY (_submission__id) REFERENCES survey (_id)
+); 
+
+-- Issues found by validation.py at ingest time; the dashboard only reads them
+CREATE TABLE validation_issues (
+    check_name VARCHAR(50),
+    table_name VARCHAR(50),
+    hhid BIGINT,
+    submission_id BIGINT,
+    selected_district VARCHAR(100),
+    selected_subcounty VARCHAR(100),
+    detail VARCHAR(255)
+);
+
+-- Writes counted by ingest.py; part of sql_backend.data_version(), so cached figures see edited submissions
+CREATE TABLE data_revision (
+    revision BIGINT NOT NULL
+);
+
+-- Indexes for the dashboard's SQL pushdown mode (survey._id is indexed as the primary key)
+CREATE INDEX idx_survey_hhid ON survey (hhid);
+CREATE INDEX idx_survey_location ON survey (selected_district, selected_subcounty, selected_parish, selected_village);
+CREATE INDEX idx_campnets_hhid ON campnets (hhid, brand);
+CREATE INDEX idx_lostnets_hhid ON lostnets (hhid);
@@ -0,0 +1,124 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Text columns with at most this share of distinct values become categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+# Answer sets that are always categorical, however short the table
+YES_NO_VALUES = {'Yes', 'No', "Don't know"}
+# Kobo expands a select-multiple question into one 0/1 column per option, named "<question>/<option>"
+SELECT_MULTIPLE_OPTION = re.compile(r'^(?P<question>[^/]+)/(?P<option>\w+)$')
+
+
+def is_text(series):
+    return series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+
+
+def select_multiple_options(df):
+    """Return {question: [option columns]} for the 0/1 select-multiple expansions in a frame"""
+    questions = {}
+    for col in df.columns:
+        match = SELECT_MULTIPLE_OPTION.match(str(col))
+        if match is None or not pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_bool_dtype(df[col]):
+            continue
+        values = df[col].dropna()
+        if values.isin([0, 1]).all():
+            questions.setdefault(match['question'], []).append(col)
+    return questions
+
+
+def to_boolean(series):
+    """Convert a 0/1 option column to bool, or nullable boolean where the question was skipped"""
+    if series.isna().any():
+        return series.astype('boolean')
+    return series.astype(bool)
+
+
+def downcast_integer(series):
+    """Return an integer column in the narrowest integer type that holds its range"""
+    values = series.dropna()
+    if values.empty:
+        return series
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= values.min() and values.max() <= info.max:
+            nullable = isinstance(series.dtype, pd.api.extensions.ExtensionDtype)
+            return series.astype(pd.api.types.pandas_dtype(dtype).name.capitalize() if nullable else dtype)
+    return series
+
+
+def downcast_float(series):
+    """Return a float column as float32 when that loses nothing (counts, codes, empty columns)"""
+    narrow = series.astype(np.float32)
+    if ((narrow.astype(np.float64) == series) | series.isna()).all():
+        return narrow
+    # GPS coordinates and other measurements keep their full precision
+    return series
+
+
+def optimize_dtypes(df, skip=()):
+    """Shrink a freshly parsed export in place and return it
+
+    Select-multiple option columns become bool (nullable boolean when the
+    question could be skipped), low-cardinality text becomes categorical,
+    integers are downcast to the narrowest type that holds their range and
+    floats to float32 where the round trip is exact. Columns in ``skip``
+    (those with an explicit type in the table schema) are left alone.
+    """
+    options = {col for columns in select_multiple_options(df).values() for col in columns}
+    for col in df.columns:
+        if col in skip:
+            continue
+        series = df[col]
+        if col in options:
+            df[col] = to_boolean(series)
+        elif is_text(series):
+            values = series.dropna()
+            unique = values.nunique()
+            if unique and (set(values.unique()) <= YES_NO_VALUES or unique <= CATEGORY_MAX_UNIQUE_RATIO * len(values)):
+                df[col] = series.astype('category')
+        elif pd.api.types.is_integer_dtype(series):
+            df[col] = downcast_integer(series)
+        elif pd.api.types.is_float_dtype(series):
+            df[col] = downcast_float(series)
+    return df
+
+
+def memory_usage(df):
+    """Return a frame's deep memory footprint in bytes"""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def memory_report(before, after):
+    """Compare two versions of a frame column by column, largest saving first
+
+    Columns: dtype_before, dtype_after, bytes_before, bytes_after and saved_pct.
+    """
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'dtype_after': after.dtypes.astype(str),
+        'bytes_before': before.memory_usage(deep=True, index=False),
+        'bytes_after': after.memory_usage(deep=True, index=False),
+    })
+    report['saved_pct'] = (1 - report['bytes_after'] / report['bytes_before'].where(report['bytes_before'] > 0)) * 100
+    saved = report['bytes_before'] - report['bytes_after']
+    return report.loc[saved.sort_values(ascending=False).index]
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from data_store import DATA_DIR, TABLES, apply_schema
+
+    parser = argparse.ArgumentParser(description="Show how much memory type inference saves per column")
+    parser.add_argument('table', choices=list(TABLES))
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--top', type=int, default=20, help="Number of columns to list")
+    args = parser.parse_args()
+
+    raw = pd.read_csv(os.path.join(args.data_dir, TABLES[args.table]['source']), low_memory=False)
+    typed = apply_schema(raw.copy(), TABLES[args.table])
+    print(memory_report(raw, typed).head(args.top).to_string())
+    print(f"\n{memory_usage(raw) / 2 ** 20:,.2f} MB as parsed -> {memory_usage(typed) / 2 ** 20:,.2f} MB typed")
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Allow running as `python scripts/benchmark_durability.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark_household_summary import make_tables
+from durability import (
+    ATTRITION_REASONS, build_lost_frame, build_net_frame, durability_summary, household_survey_dates,
+    net_survival,
+)
+from metrics import build_household_summary, filter_by_location
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def make_durability_tables(num_households, seed=0):
+    """Add the survey date, campaign, hole and loss columns the durability module reads"""
+    survey_df, campnets_df, lostnets_df = make_tables(num_households, seed)
+    rng = np.random.default_rng(seed + 1)
+    survey_df['start'] = pd.Timestamp('2025-05-08') + pd.to_timedelta(rng.integers(0, 10, len(survey_df)), unit='D')
+    campnets_df['netcampaign'] = rng.choice(['November', 'December'], len(campnets_df), p=[0.8, 0.2])
+    campnets_df['holesever'] = np.where(campnets_df[['numhole1', 'numhole2']].sum(axis=1) > 0, 'Yes', 'No')
+    lostnets_df['netlong'] = rng.integers(0, 19, len(lostnets_df))
+    lostnets_df['hpnnet'] = rng.choice(list(ATTRITION_REASONS) + ['Other'], len(lostnets_df))
+    return survey_df, campnets_df, lostnets_df
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def per_filter(nets, lost):
+    """What the dashboard recomputes on a filter change"""
+    nets = filter_by_location(nets, 'GULU', 'AWACH')
+    lost = filter_by_location(lost, 'GULU', 'AWACH')
+    durability_summary(nets, lost, ['brand'])
+    durability_summary(nets, lost, ['selected_subcounty', 'selected_parish'])
+    net_survival(nets, lost)
+    net_survival(nets, lost, 'selected_parish')
+
+
+def run_benchmark():
+    print(f"{'households':>12} {'nets':>10} {'frames (s)':>11} {'filter change (s)':>18} {'us/net':>8}")
+    for size in SIZES:
+        survey_df, campnets_df, lostnets_df = make_durability_tables(size)
+        summary = build_household_summary(survey_df, campnets_df, lostnets_df)
+
+        def build_frames():
+            dates = household_survey_dates(survey_df)
+            return build_net_frame(campnets_df, summary, dates), build_lost_frame(lostnets_df, summary)
+
+        frames_time, (nets, lost) = time_call(build_frames)
+        filter_time, _ = time_call(per_filter, nets, lost)
+        print(f"{size:>12,} {len(nets):>10,} {frames_time:>11.3f} {filter_time:>18.3f} "
+              f"{filter_time / len(nets) * 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
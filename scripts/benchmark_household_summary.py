@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Allow running as `python scripts/benchmark_household_summary.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import build_household_summary
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+NAIVE_MAX_SIZE = 10_000
+
+
+def make_tables(num_households, seed=0):
+    """Create survey/campnets/lostnets frames with the real data's shape (~1.8 nets, ~0.45 lost per household)"""
+    rng = np.random.default_rng(seed)
+    hhids = np.arange(12210000, 12210000 + num_households)
+    survey_df = pd.DataFrame({
+        'hhid': hhids,
+        'selected_district': 'GULU',
+        'selected_subcounty': rng.choice(['AWACH', 'PAICHO'], num_households),
+        'selected_parish': rng.choice([f'PARISH {i}' for i in range(20)], num_households),
+        'selected_village': rng.choice([f'VILLAGE {i}' for i in range(200)], num_households),
+        '_gpsloc_latitude': rng.uniform(2.9, 3.0, num_households),
+        '_gpsloc_longitude': rng.uniform(32.3, 32.5, num_households),
+    })
+    net_hhids = np.repeat(hhids, rng.poisson(1.8, num_households))
+    campnets_df = pd.DataFrame({
+        'hhid': net_hhids,
+        'brand': rng.choice(['PermaNet 3.0', 'PermaNet Dual'], len(net_hhids)),
+    })
+    for col in ['numhole1', 'numhole2', 'numhole3', 'numhole4']:
+        campnets_df[col] = rng.poisson(2, len(net_hhids))
+    lostnets_df = pd.DataFrame({'hhid': np.repeat(hhids, rng.poisson(0.45, num_households))})
+    return survey_df, campnets_df, lostnets_df
+
+
+def naive_counts(survey_df, campnets_df, lostnets_df):
+    """The per-household boolean scans the map loop used to do"""
+    counts = []
+    for _, row in survey_df.iterrows():
+        household_nets = len(campnets_df[campnets_df['hhid'] == row['hhid']])
+        household_lost = len(lostnets_df[lostnets_df['hhid'] == row['hhid']])
+        counts.append((household_nets, household_lost))
+    return counts
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def run_benchmark():
+    print(f"{'households':>12} {'nets':>10} {'summary (s)':>12} {'us/household':>13} {'naive (s)':>10}")
+    for size in SIZES:
+        tables = make_tables(size)
+        summary_time = time_call(build_household_summary, *tables)
+        naive_time = time_call(naive_counts, *tables) if size <= NAIVE_MAX_SIZE else float('nan')
+        print(f"{size:>12,} {len(tables[1]):>10,} {summary_time:>12.3f} "
+              f"{summary_time / size * 1e6:>13.2f} {naive_time:>10.3f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import pandas as pd
+
+# Allow running as `python scripts/benchmark_pipeline.py` from the repo root
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from create_database import bulk_load
+from create_sample_data import generate_study, write_study
+from data_store import TABLE_NAMES, build_cache, load_table
+from ingest import ingest_submissions, read_exports
+from map_view import render_map_html
+from metrics import HOUSEHOLD_SUMMARY_COLUMNS, build_household_summary, build_location_cube, filtered_view
+from migrate_data import migrate_data
+
+# Multiples of the real study's household count
+SCALES = [1, 10, 100]
+REAL_HOUSEHOLDS = 471
+RESULTS_PATH = 'benchmark_results.json'
+# A stage counts as a regression when it is this much slower than the baseline
+REGRESSION_THRESHOLD = 1.25
+# ...and at least this many seconds slower, so timer noise on tiny stages is not flagged
+REGRESSION_MIN_SECONDS = 0.05
+
+
+def _fresh_path(workdir, prefix):
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix='.db', dir=workdir)
+    os.close(fd)
+    os.remove(path)
+    return path
+
+
+def stage_load_csv(context):
+    """Parse every CSV export into the columnar cache"""
+    return sum(build_cache(name, context['data_dir'], context['cache_dir'])['rows'] for name in TABLE_NAMES)
+
+
+def stage_load_cache(context):
+    """Read the dashboard's columns from the warm cache"""
+    context['tables'] = [
+        load_table(name, HOUSEHOLD_SUMMARY_COLUMNS[name], context['data_dir'], context['cache_dir'])
+        for name in ['survey', 'campnets', 'lostnets']
+    ]
+    return sum(len(df) for df in context['tables'])
+
+
+def stage_aggregate(context):
+    """Build the household summary and location cube"""
+    survey_df = context['tables'][0]
+    context['household_summary'] = build_household_summary(*context['tables'])
+    context['cube'] = build_location_cube(survey_df, context['household_summary'])
+    return sum(len(df) for df in context['tables'])
+
+
+def stage_filter(context):
+    """Select one subcounty of the first district"""
+    district, subcounty = context['cube'].index[0][:2]
+    view = filtered_view(*context['tables'], context['cube'], district, subcounty)
+    return len(view['survey'])
+
+
+def stage_map(context):
+    """Render the coverage map for every household"""
+    render_map_html(context['household_summary'])
+    return len(context['household_summary'])
+
+
+def stage_db_load(context):
+    """Bulk-load every export into a new SQLite database, as create_database.py does"""
+    db_path = _fresh_path(context['workdir'], 'load-')
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        loaded = bulk_load(conn, context['data_dir'], report=lambda message: None)
+    finally:
+        conn.close()
+    context['db_path'] = db_path
+    return sum(loaded.values())
+
+
+def stage_ingest(context):
+    """Ingest every export as new submissions into an empty SQLite database"""
+    frames = read_exports(context['data_dir'])
+    conn = sqlite3.connect(_fresh_path(context['workdir'], 'ingest-'), isolation_level=None)
+    try:
+        ingest_submissions(conn, frames)
+    finally:
+        conn.close()
+    return sum(len(df) for df in frames.values())
+
+
+def stage_migrate(context):
+    """Copy the SQLite database to another SQLite database in checkpointed batches"""
+    target = sqlite3.connect(_fresh_path(context['workdir'], 'migrate-'))
+    try:
+        return migrate_data(context['db_path'], target, report=lambda message: None)
+    finally:
+        target.close()
+
+
+STAGES = {
+    'load_csv': stage_load_csv,
+    'load_cache': stage_load_cache,
+    'aggregate': stage_aggregate,
+    'filter': stage_filter,
+    'map': stage_map,
+    'db_load': stage_db_load,
+    'ingest': stage_ingest,
+    'migrate': stage_migrate,
+}
+# Stages that must have run first to populate the context; run untimed when not selected
+PREREQUISITES = {
+    'aggregate': ['load_cache'],
+    'filter': ['load_cache', 'aggregate'],
+    'map': ['load_cache', 'aggregate'],
+    'migrate': ['db_load'],
+}
+
+
+def run_stage(func, context, track_memory):
+    """Time a stage, then run it again under tracemalloc for its peak allocation"""
+    start = time.perf_counter()
+    rows = func(context)
+    seconds = time.perf_counter() - start
+    peak_mb = None
+    if track_memory:
+        tracemalloc.start()
+        try:
+            func(context)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    return {'seconds': round(seconds, 4), 'rows': int(rows), 'peak_mb': None if peak_mb is None else round(peak_mb, 1)}
+
+
+def run_scale(scale, stages, track_memory, seed, report=print):
+    households = REAL_HOUSEHOLDS * scale
+    results = []
+    with tempfile.TemporaryDirectory(prefix='benchmark-') as workdir:
+        context = {
+            'workdir': workdir,
+            'data_dir': os.path.join(workdir, 'exports'),
+            'cache_dir': os.path.join(workdir, 'cache'),
+        }
+        start = time.perf_counter()
+        write_study(generate_study(households, REPO_DIR, seed), context['data_dir'])
+        report(f"{scale}x ({households:,} households): generated in {time.perf_counter() - start:.1f}s")
+
+        done = set()
+        for name in stages:
+            for prerequisite in PREREQUISITES.get(name, []):
+                if prerequisite not in done:
+                    STAGES[prerequisite](context)
+                    done.add(prerequisite)
+            done.add(name)
+            result = {'scale': scale, 'households': households, 'stage': name,
+                      **run_stage(STAGES[name], context, track_memory)}
+            peak = '' if result['peak_mb'] is None else f" {result['peak_mb']:>9,.1f} MB"
+            report(f"  {name:<11} {result['seconds']:>9.3f}s {result['rows']:>12,} rows{peak}")
+            results.append(result)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline_path, threshold=REGRESSION_THRESHOLD, report=print):
+    """Report stages slower than the baseline run by more than threshold; return how many there are"""
+    with open(baseline_path) as f:
+        baseline = {(r['scale'], r['stage']): r for r in json.load(f)['results']}
+    regressions = 0
+    report(f"\nCompared with {baseline_path}:")
+    for result in results:
+        previous = baseline.get((result['scale'], result['stage']))
+        if previous is None or not previous['seconds']:
+            continue
+        ratio = result['seconds'] / previous['seconds']
+        slower = result['seconds'] - previous['seconds'] > REGRESSION_MIN_SECONDS
+        flag = '  REGRESSION' if ratio > threshold and slower else ''
+        regressions += bool(flag)
+        report(f"  {result['scale']:>5}x {result['stage']:<11} {previous['seconds']:>9.3f}s -> "
+               f"{result['seconds']:>9.3f}s ({ratio:.2f}x){flag}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time each pipeline stage on synthetic studies of several sizes")
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES,
+                        help="Multiples of the real study's household count")
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=list(STAGES))
+    parser.add_argument('--output', default=RESULTS_PATH, help="JSON file to write the results to")
+    parser.add_argument('--baseline', help="Earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = []
+    for scale in args.scales:
+        results.extend(run_scale(scale, args.stages, not args.no_memory, args.seed))
+    with open(args.output, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.baseline and compare(results, args.baseline, args.threshold):
+        sys.exit(1)
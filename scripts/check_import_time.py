@@ -0,0 +1,140 @@
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Allow running as `python scripts/check_import_time.py` from the repo root
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from benchmark_pipeline import REGRESSION_MIN_SECONDS, REGRESSION_THRESHOLD, environment
+
+APP_PATH = os.path.join(REPO_DIR, 'app.py')
+RESULTS_PATH = 'import_time.json'
+# What every worker pays whatever the dashboard does; timed in the same run as the app's imports
+REFERENCE_IMPORTS = ['import streamlit', 'import pandas']
+# Wall time app.py's module-level imports may add on top of the reference in a fresh interpreter.
+# The deferred libraries together add about 0.8 s; the app's own modules add well under 0.1 s
+IMPORT_BUDGET_SECONDS = 0.35
+# Imported by the sections that draw with them; loading one at startup undoes the deferral
+DEFERRED_MODULES = ['folium', 'branca', 'plotly.express', 'matplotlib']
+RUNS = 5
+TOP_MODULES = 10
+
+# Run in a fresh interpreter: time the imports, then list the deferred modules they pulled in
+CHILD = """\
+import sys, time
+start = time.perf_counter()
+{imports}
+seconds = time.perf_counter() - start
+print(seconds)
+print(' '.join(name for name in {deferred!r} if name in sys.modules))
+"""
+
+
+def startup_imports(path=APP_PATH):
+    """Return the source of the module-level import statements of a script"""
+    with open(path) as f:
+        source = f.read()
+    return [ast.get_source_segment(source, node) for node in ast.parse(source).body
+            if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def run_child(imports, deferred, importtime=False):
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else [])
+    command += ['-c', CHILD.format(imports='\n'.join(imports), deferred=deferred)]
+    done = subprocess.run(command, cwd=REPO_DIR, capture_output=True, text=True)
+    if done.returncode:
+        raise RuntimeError(f"Importing app.py's dependencies failed:\n{done.stderr}")
+    seconds, loaded = (done.stdout.splitlines() + [''])[:2]
+    return float(seconds), loaded.split(), done.stderr
+
+
+def slowest_modules(importtime_log, top=TOP_MODULES):
+    """Return the top-level packages with the largest cumulative time in a -X importtime log"""
+    packages = {}
+    for line in importtime_log.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented; the unindented lines are the top-level ones and include their children
+        if not name.startswith('  '):
+            package = name.strip().split('.')[0]
+            packages[package] = packages.get(package, 0) + int(cumulative) / 1e6
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def measure(runs=RUNS, report=print):
+    """Time the reference and app.py's imports in alternating fresh interpreters
+
+    Each app run is paired with the reference run before it, so load on the
+    machine shifts both; the median of the differences is what app.py adds.
+    """
+    imports = startup_imports()
+    run_child(imports, DEFERRED_MODULES)  # warm the bytecode and disk caches
+    references, timings = [], []
+    for _ in range(runs):
+        references.append(run_child(REFERENCE_IMPORTS, [])[0])
+        seconds, loaded, _ = run_child(imports, DEFERRED_MODULES)
+        timings.append(seconds)
+    _, _, log = run_child(imports, DEFERRED_MODULES, importtime=True)
+    result = {
+        'seconds': statistics.median(timings),
+        'reference_seconds': statistics.median(references),
+        'overhead_seconds': statistics.median(app - reference for app, reference in zip(timings, references)),
+        'runs': timings,
+        'reference_runs': references,
+        'deferred_loaded': loaded,
+        'modules': [{'module': name, 'seconds': seconds} for name, seconds in slowest_modules(log)],
+    }
+    report(f"app.py imports: {result['seconds']:.3f}s median of {runs} "
+           f"(min {min(timings):.3f}s, max {max(timings):.3f}s)")
+    report(f"streamlit + pandas: {result['reference_seconds']:.3f}s; app.py adds {result['overhead_seconds']:.3f}s")
+    for module in result['modules']:
+        report(f"  {module['module']:<24} {module['seconds']:>7.3f}s")
+    return result
+
+
+def check(result, budget=IMPORT_BUDGET_SECONDS, baseline_path=None, threshold=REGRESSION_THRESHOLD, report=print):
+    """Report every way the startup imports went over budget; return how many there are"""
+    failures = 0
+    overhead = result['overhead_seconds']
+    if result['deferred_loaded']:
+        report(f"Loaded at startup but meant to be deferred: {', '.join(result['deferred_loaded'])}")
+        failures += 1
+    if overhead > budget:
+        report(f"Over the {budget:.2f}s import budget: app.py adds {overhead:.3f}s to streamlit + pandas")
+        failures += 1
+    if baseline_path:
+        with open(baseline_path) as f:
+            previous = json.load(f)['result']['overhead_seconds']
+        ratio = overhead / previous if previous > 0 else 1.0
+        slower = overhead - previous > REGRESSION_MIN_SECONDS
+        flag = '  REGRESSION' if ratio > threshold and slower else ''
+        failures += bool(flag)
+        report(f"Compared with {baseline_path}: app.py adds {previous:.3f}s -> {overhead:.3f}s ({ratio:.2f}x){flag}")
+    return failures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time app.py's module-level imports in fresh interpreters")
+    parser.add_argument('--runs', type=int, default=RUNS)
+    parser.add_argument('--budget', type=float, default=IMPORT_BUDGET_SECONDS,
+                        help="Seconds app.py's imports may add to streamlit + pandas")
+    parser.add_argument('--output', default=RESULTS_PATH, help="JSON file to write the results to")
+    parser.add_argument('--baseline', help="Earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = measure(args.runs)
+    with open(args.output, 'w') as f:
+        json.dump({'environment': environment(), 'result': result}, f, indent=2)
+    print(f"Results written to {args.output}")
+    if check(result, args.budget, args.baseline, args.threshold):
+        sys.exit(1)
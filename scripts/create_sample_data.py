@@ -1,32 +1,149 @@
-import pandas as pd
+import argparse
+import math
+import os
+import sys
+
 import numpy as np
+import pandas as pd
+
+# Allow running as `python scripts/create_sample_data.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_store import TABLES, TABLE_NAMES
+
+TEMPLATE_DIR = '.'
+OUTPUT_DIR = 'data/raw'
+CHILD_TABLES = [name for name in TABLE_NAMES if name != 'survey']
+# Each copy of the study's villages gets its own name suffix; every this many copies start a new district
+COPIES_PER_DISTRICT = 20
+# Copies are laid out on a grid so their households do not overlap on the map
+VILLAGE_COPY_OFFSET_DEGREES = 0.02
+DISTRICT_COPY_OFFSET_DEGREES = 0.5
+GPS_JITTER_DEGREES = 0.001
+FIRST_HHID = 12210001
+FIRST_SUBMISSION_ID = 500000000
+
+
+def load_template(template_dir=TEMPLATE_DIR):
+    """Read the real Kobo exports as text, so generated files keep their exact layout and formatting"""
+    return {
+        name: pd.read_csv(os.path.join(template_dir, TABLES[name]['source']), dtype=str, keep_default_na=False)
+        for name in TABLE_NAMES
+    }
+
+
+def _uuids(rng, count):
+    digits = rng.bytes(16 * count).hex()
+    return [f"{digits[i:i + 8]}-{digits[i + 8:i + 12]}-4{digits[i + 13:i + 16]}-"
+            f"{digits[i + 16:i + 20]}-{digits[i + 20:i + 32]}" for i in range(0, 32 * count, 32)]
+
+
+def _with_suffix(values, copy):
+    """Append ' <copy + 1>' to the names of every copy but the first"""
+    suffixed = values + ' ' + pd.Series(copy + 1, index=values.index).astype(str)
+    return values.where(copy == 0, suffixed)
+
+
+def _shift_coordinates(survey, village_copy, district_copy, rng):
+    has_gps = (survey['_gpsloc_latitude'] != '') & (survey['_gpsloc_longitude'] != '')
+    latitude = pd.to_numeric(survey['_gpsloc_latitude'].where(has_gps), errors='coerce')
+    longitude = pd.to_numeric(survey['_gpsloc_longitude'].where(has_gps), errors='coerce')
+    latitude = latitude + village_copy * VILLAGE_COPY_OFFSET_DEGREES + rng.normal(0, GPS_JITTER_DEGREES, len(survey))
+    longitude = longitude + district_copy * DISTRICT_COPY_OFFSET_DEGREES + rng.normal(0, GPS_JITTER_DEGREES, len(survey))
+    latitude_text = latitude.map('{:.7f}'.format)
+    longitude_text = longitude.map('{:.7f}'.format)
+
+    # gpsloc is "lat lon altitude precision"; altitude and precision come from the template row
+    rest = survey['gpsloc'].str.split(' ', n=2).str[2].fillna('')
+    survey['_gpsloc_latitude'] = latitude_text.where(has_gps, '')
+    survey['_gpsloc_longitude'] = longitude_text.where(has_gps, '')
+    survey['gpsloc'] = (latitude_text + ' ' + longitude_text + ' ' + rest).str.strip().where(has_gps, survey['gpsloc'])
+
+
+def generate_study(num_households, template_dir=TEMPLATE_DIR, seed=0, report=print):
+    """Generate survey, campnets, lostnets, hhmembers and othernets exports for num_households households
+
+    Every synthetic household is a copy of a random real submission, with all
+    of its repeat-group rows, so column layout and the joint distributions of
+    answers match the real exports. Households are spread over copies of the
+    real villages (about as many households per village as the real study),
+    with fresh hhids, submission ids and uuids and jittered GPS positions.
+    Template repeat-group rows whose parent survey row is missing are left
+    out and reported.
+    """
+    rng = np.random.default_rng(seed)
+    template = load_template(template_dir)
+    template_survey = template['survey']
+
+    source = rng.integers(0, len(template_survey), num_households)
+    survey = template_survey.iloc[source].reset_index(drop=True)
+
+    copies = max(1, math.ceil(num_households / len(template_survey)))
+    copy = np.arange(num_households) % copies
+    village_copy = pd.Series(copy % COPIES_PER_DISTRICT)
+    district_copy = pd.Series(copy // COPIES_PER_DISTRICT)
+    survey['selected_district'] = _with_suffix(survey['selected_district'], district_copy)
+    survey['selected_village'] = _with_suffix(survey['selected_village'], village_copy)
+    _shift_coordinates(survey, village_copy, district_copy, rng)
+
+    hhids = (FIRST_HHID + np.arange(num_households)).astype(str)
+    submission_ids = (FIRST_SUBMISSION_ID + np.arange(num_households)).astype(str)
+    uuids = _uuids(rng, num_households)
+    survey['hhid'] = hhids
+    survey['_id'] = submission_ids
+    survey['_uuid'] = uuids
+    survey['_index'] = np.arange(1, num_households + 1).astype(str)
+    tables = {'survey': survey}
+
+    # Template survey rows are found by _index, the key repeat-group rows point back to
+    template_position = pd.Series(np.arange(len(template_survey)), index=template_survey['_index'])
+    for name in CHILD_TABLES:
+        child = template[name]
+        parent = child['_parent_index'].map(template_position)
+        orphaned = parent.isna()
+        if orphaned.any():
+            report(f"{name}: skipping {orphaned.sum():,} template rows whose _parent_index matches no survey row")
+            child, parent = child[~orphaned], parent[~orphaned]
+        parent = parent.to_numpy(dtype='int64')
+        order = np.argsort(parent, kind='stable')
+        per_parent = np.bincount(parent, minlength=len(template_survey))
+        first_row = np.concatenate([[0], np.cumsum(per_parent)[:-1]])
+
+        counts = per_parent[source]
+        total = int(counts.sum())
+        household = np.repeat(np.arange(num_households), counts)
+        # Position of each output row within its household's block of template rows
+        offset = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = child.iloc[order[first_row[source][household] + offset]].reset_index(drop=True)
+
+        rows['hhid'] = hhids[household]
+        rows['_parent_index'] = (household + 1).astype(str)
+        rows['_submission__id'] = submission_ids[household]
+        rows['_submission__uuid'] = np.asarray(uuids, dtype=object)[household]
+        rows['_index'] = np.arange(1, total + 1).astype(str)
+        tables[name] = rows
+    return tables
+
+
+def write_study(tables, output_dir=OUTPUT_DIR):
+    """Write generated tables as CSV exports named like the real ones"""
+    os.makedirs(output_dir, exist_ok=True)
+    for name, df in tables.items():
+        df.to_csv(os.path.join(output_dir, TABLES[name]['source']), index=False)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate a synthetic study shaped like the real Kobo exports")
+    parser.add_argument('--households', type=int, default=5000, help="Number of households to generate")
+    parser.add_argument('--output', default=OUTPUT_DIR, help="Directory to write the CSV exports to")
+    parser.add_argument('--template', default=TEMPLATE_DIR, help="Directory holding the real exports to resample")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
 
-# Create sample survey data
-survey_data = {
-    'hhid': [f'1221{str(i).zfill(4)}' for i in range(1, 6)],
-    'selected_district': ['GULU'] * 5,
-    'selected_subcounty': ['AWACH'] * 5,
-    'selected_parish': ['PADUNY'] * 5,
-    'selected_village': ['PAROMO'] * 5,
-    'gpsloc': ['2.9606783 32.3875777 1019.3 4.675'] * 5
-}
-survey_df = pd.DataFrame(survey_data)
-survey_df.to_csv('data/raw/survey.csv', index=False)
-
-# Create sample campaign nets data
-campnets_data = {
-    'hhid': [f'1221{str(i).zfill(4)}' for i in range(1, 6)],
-    'brand': ['Brand A', 'Brand B'] * 3,
-    'distribution_date': ['2024-01-01'] * 5
-}
-campnets_df = pd.DataFrame(campnets_data)
-campnets_df.to_csv('data/raw/campnets.csv', index=False)
-
-# Create sample lost nets data
-lostnets_data = {
-    'hhid': [f'1221{str(i).zfill(4)}' for i in range(1, 3)],
-    'reason': ['Damaged', 'Lost'],
-    'loss_date': ['2024-03-01', '2024-03-15']
-}
-lostnets_df = pd.DataFrame(lostnets_data)
-lostnets_df.to_csv('data/raw/lostnets.csv', index=False) 
\ No newline at end of file
+if __name__ == "__main__":
+    args = parse_args()
+    study = generate_study(args.households, args.template, args.seed)
+    write_study(study, args.output)
+    for table, frame in study.items():
+        print(f"{table}: {len(frame):,} rows")
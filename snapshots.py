@@ -0,0 +1,429 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from data_store import LOCATION_COLUMNS, TABLE_NAMES
+from metrics import HOUSEHOLD_SUMMARY_COLUMNS, brand_counts, build_household_summary, build_location_cube
+
+ARCHIVE_PATH = os.getenv('ARCHIVE_DB_PATH', 'mosquito_netArchive.db')
+DB_PATH = 'mosquito_net.db'
+# Tables the aggregates are computed from; a snapshot must contain them
+AGGREGATE_TABLES = ['survey', 'campnets', 'lostnets']
+AGG_COLUMNS = ['households', 'nets_tagged', 'nets_lost', 'hole_count']
+# Column each table keeps its Kobo submission id in (ingest.SUBMISSION_KEYS); archived rows are
+# filed under it so an ingest only compares the submissions it replaced
+SUBMISSION_ID_COLUMNS = {name: '_id' if name == 'survey' else '_submission__id' for name in TABLE_NAMES}
+SNAPSHOT_COLUMNS = ['snapshot_id', 'taken_at', 'label', 'content_hash', 'rows_total', 'rows_added', 'rows_removed']
+# Figures compared between rounds; Nets Lost (%) is derived from the counts
+TREND_COLUMNS = ['households', 'villages', 'nets_tagged', 'nets_lost', 'lost_percentage']
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS snapshots (
+        snapshot_id INTEGER PRIMARY KEY,
+        taken_at TEXT NOT NULL,
+        label TEXT,
+        content_hash TEXT NOT NULL,
+        rows_total INTEGER NOT NULL,
+        rows_added INTEGER NOT NULL,
+        rows_removed INTEGER NOT NULL
+    )""",
+    # One row per distinct row version; a row is part of every snapshot from valid_from up to,
+    # but not including, valid_to (NULL while it is still current)
+    """CREATE TABLE IF NOT EXISTS snapshot_rows (
+        table_name TEXT NOT NULL,
+        row_hash TEXT NOT NULL,
+        valid_from INTEGER NOT NULL REFERENCES snapshots (snapshot_id),
+        valid_to INTEGER REFERENCES snapshots (snapshot_id),
+        payload BLOB NOT NULL,
+        submission_id INTEGER
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_snapshot_rows_current ON snapshot_rows (table_name, valid_to, row_hash)",
+    "CREATE INDEX IF NOT EXISTS idx_snapshot_rows_range ON snapshot_rows (table_name, valid_from)",
+    f"""CREATE TABLE IF NOT EXISTS snapshot_location (
+        snapshot_id INTEGER NOT NULL REFERENCES snapshots (snapshot_id),
+        {', '.join(f'{col} TEXT NOT NULL' for col in LOCATION_COLUMNS)},
+        {', '.join(f'{col} INTEGER NOT NULL' for col in AGG_COLUMNS)},
+        PRIMARY KEY (snapshot_id, {', '.join(LOCATION_COLUMNS)})
+    )""",
+    f"""CREATE TABLE IF NOT EXISTS snapshot_location_brand (
+        snapshot_id INTEGER NOT NULL REFERENCES snapshots (snapshot_id),
+        {', '.join(f'{col} TEXT NOT NULL' for col in LOCATION_COLUMNS)},
+        brand TEXT NOT NULL,
+        nets INTEGER NOT NULL,
+        PRIMARY KEY (snapshot_id, {', '.join(LOCATION_COLUMNS)}, brand)
+    )""",
+]
+# Created after _add_submission_ids() so archives written before the column existed can be opened
+SUBMISSION_INDEX = ("CREATE INDEX IF NOT EXISTS idx_snapshot_rows_submission "
+                    "ON snapshot_rows (table_name, submission_id) WHERE valid_to IS NULL")
+
+
+def connect(archive_path=ARCHIVE_PATH):
+    """Open the archive database, creating its tables on first use"""
+    conn = sqlite3.connect(archive_path, isolation_level=None)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    if 'submission_id' not in {row[1] for row in conn.execute("PRAGMA table_info(snapshot_rows)")}:
+        _add_submission_ids(conn)
+    conn.execute(SUBMISSION_INDEX)
+    return conn
+
+
+def _add_submission_ids(conn):
+    """Add snapshot_rows.submission_id to an older archive, filled in for the current rows"""
+    conn.execute('BEGIN')
+    try:
+        conn.execute("ALTER TABLE snapshot_rows ADD COLUMN submission_id INTEGER")
+        rows = conn.execute("SELECT rowid, table_name, payload FROM snapshot_rows WHERE valid_to IS NULL").fetchall()
+        conn.executemany(
+            "UPDATE snapshot_rows SET submission_id = ? WHERE rowid = ?",
+            ((json.loads(zlib.decompress(payload)).get(SUBMISSION_ID_COLUMNS.get(name, '_submission__id')), rowid)
+             for rowid, name, payload in rows)
+        )
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def row_payloads(columns, rows):
+    """Return each row as canonical JSON (sorted keys, NULLs left out) and its SHA-1
+
+    Leaving out NULLs keeps a row's hash stable when an export gains a column
+    the row does not answer. The rows are the values SQLite returns, not a
+    DataFrame's, so a row hashes the same whether it is read alone or with
+    the rest of its table.
+    """
+    payloads = [
+        json.dumps({col: value for col, value in zip(columns, row) if value is not None}, sort_keys=True)
+        for row in rows
+    ]
+    return payloads, [hashlib.sha1(payload.encode()).hexdigest() for payload in payloads]
+
+
+def read_database(conn):
+    """Read every export table from the live database, as the next snapshot's contents"""
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return {name: pd.read_sql_query(f'SELECT * FROM "{name}"', conn) for name in TABLE_NAMES if name in existing}
+
+
+def snapshot_aggregates(frames):
+    """Compute the location and location x brand counts of one snapshot's tables"""
+    survey_df = frames['survey'].dropna(subset=LOCATION_COLUMNS)
+    household_summary = build_household_summary(survey_df, frames['campnets'], frames['lostnets'])
+    cube = build_location_cube(survey_df, household_summary)
+    brands = brand_counts(cube).stack().rename('nets')
+    return cube[AGG_COLUMNS].reset_index(), brands[brands > 0].reset_index()
+
+
+def latest_snapshot(conn):
+    """Return the newest snapshot as a dict, or None for an empty archive"""
+    row = conn.execute(
+        "SELECT snapshot_id, taken_at, label, content_hash FROM snapshots ORDER BY snapshot_id DESC LIMIT 1"
+    ).fetchone()
+    return None if row is None else dict(zip(['snapshot_id', 'taken_at', 'label', 'content_hash'], row))
+
+
+def take_snapshot(live, archive_path=ARCHIVE_PATH, label=None, submissions=None):
+    """Archive the live database as a new snapshot, storing only rows that changed
+
+    Rows already current in the archive are left alone, new row versions are
+    added and rows that disappeared are closed at this snapshot. Identical
+    contents do not create a snapshot. The snapshot's location and brand
+    aggregates are stored with it, so trends never rescan archived rows.
+
+    With ``submissions`` (the Kobo ids an ingest replaced) only those
+    submissions' rows are read and compared, and only the villages their old
+    and new rows touch get their aggregates recomputed; the rest is carried
+    over from the previous snapshot, which the archive is trusted to match.
+    Without them, or into an empty archive, every table is compared in full.
+    Returns (snapshot_id, created).
+    """
+    live_columns = {name: [row[1] for row in live.execute(f'PRAGMA table_info("{name}")')] for name in TABLE_NAMES}
+    live_columns = {name: columns for name, columns in live_columns.items() if columns}
+    missing = [name for name in AGGREGATE_TABLES if name not in live_columns]
+    if missing:
+        raise ValueError(f"A snapshot needs the {', '.join(missing)} table(s)")
+
+    conn = connect(archive_path)
+    try:
+        latest = latest_snapshot(conn)
+        scoped = submissions is not None and latest is not None
+        if scoped:
+            ids = [(int(i),) for i in set(submissions)]
+            for db in (live, conn):
+                _stage(db, 'snapshot_submissions', ['id INTEGER PRIMARY KEY'], ids)
+        names = set(live_columns) if scoped else set(live_columns) | _archived_tables(conn)
+
+        conn.execute('BEGIN')
+        try:
+            cursor = conn.execute(
+                "INSERT INTO snapshots (taken_at, label, content_hash, rows_total, rows_added, rows_removed) "
+                "VALUES (?, ?, '', 0, 0, 0)",
+                (datetime.now(timezone.utc).isoformat(timespec='seconds'), label)
+            )
+            snapshot_id = cursor.lastrowid
+            content = hashlib.sha256((latest['content_hash'] if latest else '').encode())
+            touched = {name: [] for name in AGGREGATE_TABLES}
+            added = removed = total = 0
+            for name in sorted(names):
+                columns = live_columns.get(name, [])
+                key = SUBMISSION_ID_COLUMNS.get(name)
+                # Tables without the submission id column (none in the Kobo exports) are compared in full
+                in_scope = scoped and key in columns
+                rows = []
+                if columns:
+                    where = f'WHERE "{key}" IN (SELECT id FROM temp.snapshot_submissions)' if in_scope else ''
+                    rows = live.execute(f'SELECT * FROM "{name}" {where}').fetchall()
+                payloads, hashes = row_payloads(columns, rows)
+                position = columns.index(key) if key in columns else None
+                incoming = {row_hash: (payload, row) for row_hash, payload, row in zip(hashes, payloads, rows)}
+                where = " AND submission_id IN (SELECT id FROM temp.snapshot_submissions)" if in_scope else ''
+                current = dict(conn.execute(
+                    f"SELECT row_hash, {'payload' if scoped else 'NULL'} FROM snapshot_rows "
+                    f"WHERE table_name = ? AND valid_to IS NULL{where}", (name,)
+                ).fetchall())
+                gone = current.keys() - incoming.keys()
+                conn.executemany(
+                    "UPDATE snapshot_rows SET valid_to = ? WHERE table_name = ? AND row_hash = ? AND valid_to IS NULL",
+                    ((snapshot_id, name, row_hash) for row_hash in gone)
+                )
+                new = [row_hash for row_hash in incoming if row_hash not in current]
+                conn.executemany(
+                    "INSERT INTO snapshot_rows (table_name, row_hash, valid_from, payload, submission_id) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    ((name, row_hash, snapshot_id, zlib.compress(incoming[row_hash][0].encode()),
+                      None if position is None else incoming[row_hash][1][position]) for row_hash in new)
+                )
+                if scoped and name in touched:
+                    touched[name] += [json.loads(zlib.decompress(current[row_hash])) for row_hash in gone]
+                    touched[name] += [dict(zip(columns, incoming[row_hash][1])) for row_hash in new]
+                content.update(name.encode())
+                content.update(''.join(sorted(new)).encode())
+                content.update(''.join(sorted(gone)).encode())
+                added += len(new)
+                removed += len(gone)
+                # A scoped snapshot counts the change; the previous snapshot's total is added below
+                total += len(incoming) - len(current) if scoped else len(incoming)
+            if not added and not removed:
+                conn.execute('ROLLBACK')
+                return latest['snapshot_id'], False
+
+            if scoped:
+                total += conn.execute("SELECT rows_total FROM snapshots WHERE snapshot_id = ?",
+                                      (latest['snapshot_id'],)).fetchone()[0]
+                _carry_aggregates(live, conn, latest['snapshot_id'], snapshot_id, touched)
+            else:
+                locations, brands = snapshot_aggregates(_summary_frames(live))
+                _insert_frame(conn, 'snapshot_location', locations.assign(snapshot_id=snapshot_id))
+                _insert_frame(conn, 'snapshot_location_brand', brands.assign(snapshot_id=snapshot_id))
+            conn.execute(
+                "UPDATE snapshots SET content_hash = ?, rows_total = ?, rows_added = ?, rows_removed = ? "
+                "WHERE snapshot_id = ?",
+                (content.hexdigest(), total, added, removed, snapshot_id)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return snapshot_id, True
+    finally:
+        conn.close()
+
+
+def _stage(conn, table, columns, rows):
+    """Load rows into a temp table with the given column definitions, replacing an earlier one"""
+    conn.execute(f"DROP TABLE IF EXISTS temp.{table}")
+    conn.execute(f"CREATE TEMP TABLE {table} ({', '.join(columns)})")
+    conn.executemany(f"INSERT INTO temp.{table} VALUES ({', '.join('?' for _ in columns)})", rows)
+
+
+def _summary_frames(live, villages=False):
+    """Read the columns snapshot_aggregates() needs from the live database, in insertion order
+
+    With ``villages`` only the survey rows in temp.snapshot_villages and the
+    households that have one are read, with all of their rows, so those
+    villages' counts (first visits included) come out as in a full read.
+    """
+    locations = ', '.join(LOCATION_COLUMNS)
+    in_villages = f"({locations}) IN (SELECT {locations} FROM temp.snapshot_villages)"
+    frames = {}
+    for name, wanted in HOUSEHOLD_SUMMARY_COLUMNS.items():
+        available = {row[1] for row in live.execute(f'PRAGMA table_info("{name}")')}
+        columns = ', '.join(f'"{col}"' for col in wanted if col in available)
+        where = ''
+        if villages:
+            where = f"WHERE hhid IN (SELECT hhid FROM survey WHERE {in_villages})"
+            if name == 'survey':
+                where += f" OR {in_villages}"
+        frames[name] = pd.read_sql_query(f'SELECT {columns} FROM "{name}" {where} ORDER BY rowid', live)
+    return frames
+
+
+def _carry_aggregates(live, conn, previous_id, snapshot_id, touched):
+    """Store a scoped snapshot's aggregates: recomputed for the villages its changed rows touch, copied otherwise
+
+    A village's counts move when one of its survey rows changes or when a
+    household first visited there gains or loses nets, so the villages of the
+    changed survey rows and of every survey row of the changed rows'
+    households are recomputed.
+    """
+    households = {record.get('hhid') for records in touched.values() for record in records} - {None}
+    _stage(live, 'snapshot_households', ['hhid'], [(hhid,) for hhid in households])
+    locations = ', '.join(LOCATION_COLUMNS)
+    villages = {tuple(record.get(col) for col in LOCATION_COLUMNS) for record in touched['survey']}
+    villages |= set(live.execute(
+        f"SELECT DISTINCT {locations} FROM survey WHERE hhid IN (SELECT hhid FROM temp.snapshot_households)"
+    ))
+    villages = [village for village in villages if None not in village]
+    for db in (live, conn):
+        _stage(db, 'snapshot_villages', LOCATION_COLUMNS, villages)
+
+    if villages:
+        for table, df in zip(['snapshot_location', 'snapshot_location_brand'],
+                             snapshot_aggregates(_summary_frames(live, villages=True))):
+            # Households first visited elsewhere were read too; their villages are copied below
+            df = df[df.set_index(LOCATION_COLUMNS).index.isin(villages)]
+            _insert_frame(conn, table, df.assign(snapshot_id=snapshot_id))
+    outside = f"({locations}) NOT IN (SELECT {locations} FROM temp.snapshot_villages)"
+    for table, columns in [('snapshot_location', LOCATION_COLUMNS + AGG_COLUMNS),
+                           ('snapshot_location_brand', LOCATION_COLUMNS + ['brand', 'nets'])]:
+        columns = ', '.join(columns)
+        conn.execute(
+            f"INSERT INTO {table} (snapshot_id, {columns}) SELECT ?, {columns} FROM {table} "
+            f"WHERE snapshot_id = ? AND {outside}",
+            (snapshot_id, previous_id)
+        )
+
+
+def _archived_tables(conn):
+    return {row[0] for row in conn.execute("SELECT DISTINCT table_name FROM snapshot_rows WHERE valid_to IS NULL")}
+
+
+def _insert_frame(conn, table, df):
+    columns = ', '.join(df.columns)
+    conn.executemany(
+        f"INSERT INTO {table} ({columns}) VALUES ({', '.join('?' for _ in df.columns)})",
+        df.astype(object).itertuples(index=False, name=None)
+    )
+
+
+def read_archive(query, columns, params=(), archive_path=ARCHIVE_PATH):
+    """Run a query on the archive opened read-only; an empty frame with the given columns if it has no tables yet
+
+    Readers never create the archive file or its tables; only take_snapshot() writes.
+    """
+    if not os.path.exists(archive_path):
+        return pd.DataFrame(columns=columns)
+    conn = sqlite3.connect(f"file:{archive_path}?mode=ro", uri=True)
+    try:
+        return pd.read_sql_query(query, conn, params=params)
+    except pd.errors.DatabaseError:
+        # An archive file without the tables, e.g. one take_snapshot() is still creating
+        return pd.DataFrame(columns=columns)
+    finally:
+        conn.close()
+
+
+def load_snapshot_table(name, snapshot_id, archive_path=ARCHIVE_PATH):
+    """Rebuild one table as it was in a snapshot"""
+    rows = read_archive(
+        "SELECT payload FROM snapshot_rows WHERE table_name = ? AND valid_from <= ? "
+        "AND (valid_to IS NULL OR valid_to > ?)",
+        ['payload'], (name, snapshot_id, snapshot_id), archive_path
+    )
+    return pd.DataFrame([json.loads(zlib.decompress(payload)) for payload in rows['payload']])
+
+
+def list_snapshots(archive_path=ARCHIVE_PATH):
+    """Return every snapshot with its row counts, oldest first"""
+    return read_archive("SELECT * FROM snapshots ORDER BY snapshot_id", SNAPSHOT_COLUMNS, archive_path=archive_path)
+
+
+def snapshot_version(archive_path=ARCHIVE_PATH):
+    """Return the newest snapshot id (0 for an empty or missing archive) for cache keys"""
+    latest = read_archive("SELECT COALESCE(MAX(snapshot_id), 0) AS snapshot_id FROM snapshots", ['snapshot_id'],
+                          archive_path=archive_path)
+    return int(latest['snapshot_id'].iloc[0]) if len(latest) else 0
+
+
+def _location_filter(district, subcounty):
+    conditions, params = [], []
+    if district != 'All':
+        conditions.append("selected_district = ?")
+        params.append(district)
+        if subcounty != 'All':
+            conditions.append("selected_subcounty = ?")
+            params.append(subcounty)
+    return ('AND ' + ' AND '.join(conditions)) if conditions else '', params
+
+
+def load_trend(district='All', subcounty='All', archive_path=ARCHIVE_PATH):
+    """Return the selection's KPIs in every snapshot, from the stored aggregates only
+
+    One row per snapshot (snapshot_id, taken_at, label and TREND_COLUMNS).
+    """
+    where, params = _location_filter(district, subcounty)
+    trend = read_archive(
+        f"SELECT s.snapshot_id, s.taken_at, s.label, COALESCE(SUM(a.households), 0) AS households, "
+        f"COUNT(a.snapshot_id) AS villages, COALESCE(SUM(a.nets_tagged), 0) AS nets_tagged, "
+        f"COALESCE(SUM(a.nets_lost), 0) AS nets_lost "
+        f"FROM snapshots s LEFT JOIN snapshot_location a ON a.snapshot_id = s.snapshot_id {where} "
+        f"GROUP BY s.snapshot_id, s.taken_at, s.label ORDER BY s.snapshot_id",
+        ['snapshot_id', 'taken_at', 'label', 'households', 'villages', 'nets_tagged', 'nets_lost'],
+        params, archive_path
+    )
+    cohort = trend['nets_tagged'] + trend['nets_lost']
+    trend['lost_percentage'] = (trend['nets_lost'] / cohort.where(cohort > 0) * 100).fillna(0)
+    return trend
+
+
+def load_brand_trend(district='All', subcounty='All', archive_path=ARCHIVE_PATH):
+    """Return tagged nets per brand in every snapshot (snapshots as rows, brands as columns)"""
+    where, params = _location_filter(district, subcounty)
+    brands = read_archive(
+        f"SELECT snapshot_id, brand, SUM(nets) AS nets FROM snapshot_location_brand WHERE 1 = 1 {where} "
+        f"GROUP BY snapshot_id, brand",
+        ['snapshot_id', 'brand', 'nets'], params, archive_path
+    )
+    return brands.pivot(index='snapshot_id', columns='brand', values='nets').fillna(0).astype(int)
+
+
+def round_deltas(trend):
+    """Return each snapshot's change in TREND_COLUMNS from the one before it"""
+    deltas = trend[TREND_COLUMNS].diff()
+    deltas.insert(0, 'snapshot_id', trend['snapshot_id'])
+    return deltas.iloc[1:]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Archive the study database as versioned snapshots")
+    parser.add_argument('command', choices=['take', 'list'])
+    parser.add_argument('--db', default=DB_PATH, help="Live SQLite database to snapshot")
+    parser.add_argument('--archive', default=ARCHIVE_PATH)
+    parser.add_argument('--label', help="Name for the round, e.g. 'Round 2'")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == 'list':
+        print(list_snapshots(args.archive).to_string(index=False))
+    else:
+        start = time.perf_counter()
+        live = sqlite3.connect(args.db)
+        try:
+            snapshot_id, created = take_snapshot(live, args.archive, args.label)
+        finally:
+            live.close()
+        if created:
+            print(f"Snapshot {snapshot_id} written in {time.perf_counter() - start:.2f}s")
+        else:
+            print(f"No changes since snapshot {snapshot_id}")
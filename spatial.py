@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+from data_store import LOCATION_COLUMNS
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = EARTH_RADIUS_KM * np.pi / 180
+# Grid cell size; a query measures only the points in the cells its circle overlaps
+CELL_KM = 1.0
+# Longitude cells are sized at this latitude at most, so they never collapse near the poles
+MAX_LATITUDE = 89.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between (arrays of) points given in degrees"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(values, dtype=float)) for values in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class GridIndex:
+    """Equal-angle grid over a set of points for haversine radius and nearest-neighbour queries
+
+    Points are sorted by cell once; a query looks up the cells within reach
+    with a binary search and measures only the points in them, so its cost
+    follows the points nearby rather than the size of the study. Points
+    without coordinates are left out.
+    """
+
+    def __init__(self, latitudes, longitudes, ids=None, weights=None, cell_km=CELL_KM):
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        ids = np.arange(len(latitudes)) if ids is None else np.asarray(ids)
+        weights = np.ones(len(latitudes)) if weights is None else np.asarray(weights, dtype=float)
+        known = ~(np.isnan(latitudes) | np.isnan(longitudes))
+        latitudes, longitudes, ids, weights = latitudes[known], longitudes[known], ids[known], weights[known]
+
+        self.cell_km = cell_km
+        self.lat_step = cell_km / KM_PER_DEGREE
+        # Sized where a longitude degree is shortest, every cell is at least cell_km wide
+        widest = min(np.abs(latitudes).max(), MAX_LATITUDE) if len(latitudes) else 0.0
+        self.lon_step = self.lat_step / np.cos(np.radians(widest))
+        rows, cols = self._cell(latitudes, longitudes)
+        self.row0, self.col0 = (rows.min(), cols.min()) if len(rows) else (0, 0)
+        self.nrows = int(rows.max() - self.row0 + 1) if len(rows) else 0
+        self.ncols = int(cols.max() - self.col0 + 1) if len(cols) else 0
+
+        keys = (rows - self.row0) * self.ncols + (cols - self.col0)
+        order = np.argsort(keys, kind='stable')
+        self.latitudes, self.longitudes = latitudes[order], longitudes[order]
+        self.ids, self.weights = ids[order], weights[order]
+        self.cells, self.starts = np.unique(keys[order], return_index=True)
+        self.ends = np.append(self.starts[1:], len(order))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _cell(self, latitudes, longitudes):
+        return (np.floor(np.asarray(latitudes) / self.lat_step).astype(np.int64),
+                np.floor(np.asarray(longitudes) / self.lon_step).astype(np.int64))
+
+    def _reach(self, lat_min, lat_max, lon_min, lon_max, radius_km):
+        """Return the positions of the points in every cell within radius_km of a box"""
+        dlat = radius_km / KM_PER_DEGREE
+        widest = min(max(abs(lat_min - dlat), abs(lat_max + dlat)), MAX_LATITUDE)
+        dlon = dlat / np.cos(np.radians(widest))
+        (row_lo, col_lo), (row_hi, col_hi) = (self._cell(lat_min - dlat, lon_min - dlon),
+                                              self._cell(lat_max + dlat, lon_max + dlon))
+        rows = np.arange(max(row_lo - self.row0, 0), min(row_hi - self.row0, self.nrows - 1) + 1)
+        cols = np.arange(max(col_lo - self.col0, 0), min(col_hi - self.col0, self.ncols - 1) + 1)
+        if not len(rows) or not len(cols):
+            return np.empty(0, dtype=np.int64)
+        keys = np.add.outer(rows * self.ncols, cols).ravel()
+        found = np.searchsorted(self.cells, keys)
+        found = found[(found < len(self.cells)) & (self.cells[np.minimum(found, len(self.cells) - 1)] == keys)]
+        starts, ends = self.starts[found], self.ends[found]
+        # Concatenate the cells' position ranges without a Python loop
+        lengths = ends - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return offsets + np.arange(lengths.sum())
+
+    def _covers_all(self, latitude, longitude, radius_km):
+        return len(self._reach(latitude, latitude, longitude, longitude, radius_km)) == len(self)
+
+    def within(self, latitude, longitude, radius_km):
+        """Return the distance (km) to every point within radius_km, nearest first, indexed by id"""
+        positions = self._reach(latitude, latitude, longitude, longitude, radius_km)
+        distance = haversine_km(latitude, longitude, self.latitudes[positions], self.longitudes[positions])
+        inside = distance <= radius_km
+        return self._result(positions[inside], distance[inside])
+
+    def nearest(self, latitude, longitude, k=1):
+        """Return the distance (km) to the k nearest points, nearest first, indexed by id"""
+        reach = self.cell_km
+        while True:
+            positions = self._reach(latitude, latitude, longitude, longitude, reach)
+            distance = haversine_km(latitude, longitude, self.latitudes[positions], self.longitudes[positions])
+            # Only points within the reach are certain to be nearer than any point not yet looked at
+            if (distance <= reach).sum() >= k or len(positions) == len(self):
+                nearest = np.argsort(distance, kind='stable')[:k]
+                return self._result(positions[nearest], distance[nearest])
+            reach *= 2
+
+    def sum_within(self, latitudes, longitudes, radius_km):
+        """For each query point, sum the weights (default: count the points) within radius_km
+
+        Queries are grouped by grid cell, and each group is measured against
+        its candidates in one distance matrix.
+        """
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        totals = np.full(len(latitudes), np.nan)
+        known = np.flatnonzero(~(np.isnan(latitudes) | np.isnan(longitudes)))
+        rows, cols = self._cell(latitudes[known], longitudes[known])
+        _, groups = np.unique(np.stack([rows, cols], axis=1), axis=0, return_inverse=True)
+        order = np.argsort(groups.ravel(), kind='stable')
+        bounds = np.flatnonzero(np.diff(groups.ravel()[order])) + 1
+        for members in np.split(known[order], bounds):
+            lat, lon = latitudes[members], longitudes[members]
+            positions = self._reach(lat.min(), lat.max(), lon.min(), lon.max(), radius_km)
+            distance = haversine_km(lat[:, None], lon[:, None], self.latitudes[positions], self.longitudes[positions])
+            totals[members] = (distance <= radius_km) @ self.weights[positions]
+        return totals
+
+    def _result(self, positions, distance):
+        order = np.argsort(distance, kind='stable')
+        return pd.Series(distance[order], index=pd.Index(self.ids[positions[order]], name='id'), name='distance_km')
+
+
+def build_household_index(household_summary, weights=None, cell_km=CELL_KM):
+    """Index the household summary's first-visit GPS points by hhid
+
+    Pass a column name as ``weights`` (for example 'nets_lost') to have
+    sum_within() add that column up instead of counting households.
+    """
+    return GridIndex(household_summary['latitude'], household_summary['longitude'], household_summary.index,
+                     None if weights is None else household_summary[weights], cell_km)
+
+
+def village_centroids(households):
+    """Return each village's centre and spread from households with latitude/longitude columns
+
+    The centre is the median position, which a few mis-keyed points do not
+    move. Columns: households (located), latitude, longitude, median_km,
+    p90_km and max_km (distance of the households from the centre).
+    """
+    located = households.dropna(subset=['latitude', 'longitude'] + LOCATION_COLUMNS)
+    villages = located.groupby(LOCATION_COLUMNS, observed=True)
+    centroids = villages[['latitude', 'longitude']].median()
+    distance = pd.Series(distance_from_village(located, centroids), index=located.index)
+    spread = distance.groupby([located[col] for col in LOCATION_COLUMNS], observed=True)
+    centroids.insert(0, 'households', villages.size())
+    centroids['median_km'] = spread.median()
+    centroids['p90_km'] = spread.quantile(0.9)
+    centroids['max_km'] = spread.max()
+    return centroids
+
+
+def distance_from_village(households, centroids):
+    """Return each household's distance (km) from its village centre, NaN without coordinates"""
+    keys = pd.MultiIndex.from_frame(households[LOCATION_COLUMNS].astype(object))
+    centres = centroids[['latitude', 'longitude']].reindex(keys).to_numpy()
+    return haversine_km(households['latitude'], households['longitude'], centres[:, 0], centres[:, 1])
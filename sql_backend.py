@@ -0,0 +1,225 @@
+import time
+
+from data_store import LOCATION_COLUMNS
+from access import ACCESS_COLUMNS
+from database import get_pool, read_query
+from durability import DURABILITY_COLUMNS
+from filter_cache import LRUCache
+from ingest import REVISION_TABLE
+from metrics import BRAND_PREFIX, HOLE_COLUMNS, UNKNOWN_HOLE_COUNTS, brand_list, kpis
+from validation import ISSUE_COLUMNS, ISSUES_TABLE
+
+# Indexes the pushed-down queries rely on; SQL Server gets the same ones from schema.sql
+INDEXES = {
+    'idx_survey_hhid': ('survey', ['hhid']),
+    'idx_survey_location': ('survey', LOCATION_COLUMNS),
+    'idx_survey_submission': ('survey', ['_id']),
+    'idx_campnets_hhid': ('campnets', ['hhid', 'brand']),
+    'idx_lostnets_hhid': ('lostnets', ['hhid']),
+}
+
+# data_version() recounts the rows after every counted write, and otherwise at most this often, to catch
+# databases written by other tools; one entry per (revision, window), shared by every session
+ROW_COUNT_TTL_SECONDS = 30
+_row_count_cache = LRUCache(maxsize=2)
+
+# A household's location is that of its first survey visit, as in metrics.build_household_summary()
+FIRST_VISIT = f"""
+    SELECT s.hhid, {', '.join(f's.{col}' for col in LOCATION_COLUMNS)},
+           s._gpsloc_latitude AS latitude, s._gpsloc_longitude AS longitude
+    FROM survey s
+    JOIN (SELECT hhid, MIN(_id) AS first_id FROM survey GROUP BY hhid) f ON s._id = f.first_id
+"""
+
+
+def ensure_indexes():
+    """Create the indexes on hhid and the location columns (SQLite; SQL Server uses schema.sql)"""
+    if get_pool().backend.name != 'sqlite':
+        return
+    with get_pool().connection() as conn:
+        for name, (table, columns) in INDEXES.items():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+        # Databases not yet ingested since validation was added read as having no issues
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {ISSUES_TABLE} ({', '.join(ISSUE_COLUMNS)})")
+        conn.commit()
+
+
+def table_columns(table):
+    """Return the column names of a database table"""
+    return list(read_query(f'SELECT * FROM {table} WHERE 1 = 0').columns)
+
+
+def missing_tables(tables):
+    """Return the tables the database does not have (databases built before they were exported)"""
+    missing = []
+    for table in tables:
+        try:
+            table_columns(table)
+        except Exception:
+            missing.append(table)
+    return missing
+
+
+def _row_counts():
+    counts = read_query(
+        "SELECT (SELECT COUNT(*) FROM survey) AS survey, (SELECT MAX(_id) FROM survey) AS last_submission, "
+        "(SELECT COUNT(*) FROM campnets) AS campnets, (SELECT COUNT(*) FROM lostnets) AS lostnets"
+    )
+    return tuple(counts.iloc[0])
+
+
+def data_version():
+    """Return a cheap fingerprint of the database contents for cache keys
+
+    ingest.py and create_database.py count every write in the revision
+    table, so edits to existing submissions change the fingerprint; the row
+    counts cover databases written by other tools. Only the revision is read
+    on every call: the counts scan the tables, so they are reused for the
+    same revision for up to ROW_COUNT_TTL_SECONDS.
+    """
+    try:
+        revision = read_query(f"SELECT MAX(revision) AS revision FROM {REVISION_TABLE}").iloc[0, 0]
+    except Exception:
+        # Written before writes were counted
+        revision = None
+    window = int(time.monotonic() // ROW_COUNT_TTL_SECONDS)
+    counts = _row_count_cache.get_or_compute((revision, window), _row_counts)
+    return 'sql-' + '-'.join(str(value) for value in [revision, *counts])
+
+
+def _hole_total(alias):
+    """Return an expression adding up a net's hole counts, leaving out the unknown codes"""
+    unknown = ', '.join(str(code) for code in UNKNOWN_HOLE_COUNTS)
+    return ' + '.join(f"CASE WHEN {alias}{col} IN ({unknown}) THEN 0 ELSE COALESCE({alias}{col}, 0) END"
+                      for col in HOLE_COLUMNS)
+
+
+def _location_filter(alias, district, subcounty, require_location=True):
+    """Return a WHERE clause and parameters for the sidebar selection
+
+    Aggregates skip rows with a missing location level, as pandas' groupby does.
+    """
+    conditions = [f"{alias}.{col} IS NOT NULL" for col in LOCATION_COLUMNS] if require_location else ['1 = 1']
+    params = []
+    if district != 'All':
+        conditions.append(f"{alias}.selected_district = ?")
+        params.append(district)
+        if subcounty != 'All':
+            conditions.append(f"{alias}.selected_subcounty = ?")
+            params.append(subcounty)
+    return 'WHERE ' + ' AND '.join(conditions), params
+
+
+def query_location_cube(district='All', subcounty='All'):
+    """Compute the location cube for a selection inside the database
+
+    Returns the same frame as slicing metrics.build_location_cube(); only one
+    row per village and brand comes back from the database.
+    """
+    locations = ', '.join(f'fv.{col}' for col in LOCATION_COLUMNS)
+    where, params = _location_filter('fv', district, subcounty)
+    holes = _hole_total('c.')
+
+    households = read_query(
+        f"SELECT {locations}, COUNT(*) AS households FROM survey fv {where} GROUP BY {locations}",
+        params
+    )
+    nets = read_query(
+        f"SELECT {locations}, COUNT(*) AS nets_tagged, SUM({holes}) AS hole_count "
+        f"FROM campnets c JOIN ({FIRST_VISIT}) fv ON c.hhid = fv.hhid {where} GROUP BY {locations}",
+        params
+    )
+    lost = read_query(
+        f"SELECT {locations}, COUNT(*) AS nets_lost "
+        f"FROM lostnets l JOIN ({FIRST_VISIT}) fv ON l.hhid = fv.hhid {where} GROUP BY {locations}",
+        params
+    )
+    brands = read_query(
+        f"SELECT {locations}, c.brand, COUNT(*) AS nets "
+        f"FROM campnets c JOIN ({FIRST_VISIT}) fv ON c.hhid = fv.hhid {where} AND c.brand IS NOT NULL "
+        f"GROUP BY {locations}, c.brand",
+        params
+    )
+
+    cube = households.set_index(LOCATION_COLUMNS)
+    cube = cube.join(nets.set_index(LOCATION_COLUMNS), how='outer')
+    cube = cube.join(lost.set_index(LOCATION_COLUMNS), how='outer')
+    brand_table = brands.set_index(LOCATION_COLUMNS + ['brand'])['nets'].unstack(fill_value=0)
+    brand_table.columns = [BRAND_PREFIX + str(brand) for brand in brand_table.columns]
+    cube = cube.join(brand_table, how='outer').fillna(0).astype(int)
+    cube = cube[['households', 'nets_tagged', 'nets_lost', 'hole_count'] + list(brand_table.columns)]
+    return cube.sort_index()
+
+
+def query_household_summary():
+    """Compute metrics.build_household_summary() inside the database, one row per hhid"""
+    holes = _hole_total('')
+    households = read_query(FIRST_VISIT + ' ORDER BY s._id').set_index('hhid')
+    nets = read_query(
+        f"SELECT hhid, COUNT(*) AS nets_tagged, SUM({holes}) AS hole_count FROM campnets GROUP BY hhid"
+    ).set_index('hhid')
+    lost = read_query("SELECT hhid, COUNT(*) AS nets_lost FROM lostnets GROUP BY hhid").set_index('hhid')
+    brands = read_query(
+        "SELECT hhid, brand, COUNT(*) AS nets FROM campnets WHERE brand IS NOT NULL GROUP BY hhid, brand"
+    )
+    brand_table = brands.set_index(['hhid', 'brand'])['nets'].unstack(fill_value=0)
+    brand_table.columns = [BRAND_PREFIX + str(brand) for brand in brand_table.columns]
+
+    summary = households.join([nets['nets_tagged'], lost, nets['hole_count'], brand_table])
+    count_columns = ['nets_tagged', 'nets_lost', 'hole_count'] + list(brand_table.columns)
+    summary[count_columns] = summary[count_columns].fillna(0).astype(int)
+    summary['net_brands'] = brand_list(summary)
+    return summary
+
+
+def filtered_view(district='All', subcounty='All'):
+    """SQL counterpart of metrics.filtered_view(): the selection's households, cube slice and KPIs
+
+    Net-level rows stay in the database; only household ids and aggregates are returned.
+    """
+    where, params = _location_filter('s', district, subcounty, require_location=False)
+    survey = read_query(
+        f"SELECT s.hhid, {', '.join(f's.{col}' for col in LOCATION_COLUMNS)} FROM survey s {where}",
+        params
+    )
+    cube = query_location_cube(district, subcounty)
+    return {'survey': survey, 'cube': cube, 'kpis': kpis(cube)}
+
+
+def load_detail_table(name, district='All', subcounty='All'):
+    """Read every column of a table for the households in the selection"""
+    where, params = _location_filter('s', district, subcounty, require_location=False)
+    return read_query(f"SELECT * FROM {name} WHERE hhid IN (SELECT s.hhid FROM survey s {where})", params)
+
+
+def load_durability_tables():
+    """Read the survey/campnets/lostnets columns the durability module uses, survey in submission order
+
+    Columns a database does not have are skipped, as in load_access_tables().
+    """
+    tables = []
+    for table in ['survey', 'campnets', 'lostnets']:
+        available = set(table_columns(table))
+        columns = ', '.join(f'"{col}"' for col in DURABILITY_COLUMNS[table] if col in available)
+        order = ' ORDER BY _id' if table == 'survey' else ''
+        tables.append(read_query(f"SELECT {columns} FROM {table}{order}"))
+    return tuple(tables)
+
+
+def load_access_tables():
+    """Read the campnets/hhmembers/othernets columns the access module uses
+
+    Select-multiple option columns ('usdnet/1', ...) need quoting; columns a
+    database does not have are skipped, as load_table() does.
+    """
+    tables = []
+    for table in ['campnets', 'hhmembers', 'othernets']:
+        available = set(table_columns(table))
+        columns = ', '.join(f'"{col}"' for col in ACCESS_COLUMNS[table] if col in available)
+        tables.append(read_query(f"SELECT {columns} FROM {table}"))
+    return tuple(tables)
+
+
+def load_validation_issues():
+    """Read the issues the last ingest's validation run wrote (validation.py)"""
+    return read_query(f"SELECT {', '.join(ISSUE_COLUMNS)} FROM {ISSUES_TABLE}")
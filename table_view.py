@@ -0,0 +1,87 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Rows sent to the browser per page
+PAGE_SIZE = 50
+# Colour steps per colormap; finer steps are indistinguishable in a table cell
+COLOR_STEPS = 256
+# Cells darker than this relative luminance get light text, as in Styler.background_gradient
+TEXT_COLOR_THRESHOLD = 0.408
+DARK_TEXT = '#000000'
+LIGHT_TEXT = '#f1f1f1'
+
+
+@lru_cache(maxsize=8)
+def color_steps(cmap):
+    """Return the background and text colour of each of COLOR_STEPS steps through a matplotlib colormap"""
+    from matplotlib import colormaps
+
+    rgb = colormaps[cmap](np.linspace(0, 1, COLOR_STEPS))[:, :3]
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    luminance = linear @ np.array([0.2126, 0.7152, 0.0722])
+    backgrounds = ['#{:02x}{:02x}{:02x}'.format(*channels) for channels in np.round(rgb * 255).astype(int)]
+    texts = np.where(luminance < TEXT_COLOR_THRESHOLD, LIGHT_TEXT, DARK_TEXT)
+    return np.array([f"background-color: {background}; color: {text}" for background, text in zip(backgrounds, texts)])
+
+
+def color_scale(df, columns=None):
+    """Return {column: (min, max)} over the whole table, for shading any page of it consistently
+
+    ``columns`` defaults to every numeric column, like background_gradient().
+    """
+    if columns is None:
+        columns = df.select_dtypes(include='number').columns
+    values = df[list(columns)]
+    return dict(zip(values.columns, zip(values.min().to_numpy(), values.max().to_numpy())))
+
+
+def gradient_css(page, scale, cmap):
+    """Return a frame of cell styles for one page, shaded by the whole table's scale"""
+    styles = pd.DataFrame('', index=page.index, columns=page.columns)
+    steps = color_steps(cmap)
+    for col, (low, high) in scale.items():
+        values = pd.to_numeric(page[col], errors='coerce').to_numpy(dtype=float)
+        span = high - low
+        position = (values - low) / span if span else np.zeros_like(values)
+        known = ~np.isnan(position)
+        codes = np.clip(np.round(position[known] * (COLOR_STEPS - 1)), 0, COLOR_STEPS - 1).astype(int)
+        column = styles[col].to_numpy(dtype=object)
+        column[known] = steps[codes]
+        styles[col] = column
+    return styles
+
+
+def search_rows(df, query):
+    """Return a mask of the rows where any column contains the query text, ignoring case"""
+    mask = np.zeros(len(df), dtype=bool)
+    if not query:
+        return ~mask
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Search the distinct labels once, then map the hits back through the codes
+            hits = series.cat.categories.astype(str).str.contains(query, case=False, regex=False)
+            codes = series.cat.codes.to_numpy()
+            mask |= np.append(hits, False)[codes]  # code -1 (missing) picks the appended False
+        else:
+            mask |= series.astype(str).str.contains(query, case=False, regex=False).to_numpy(dtype=bool)
+    return mask
+
+
+def page_count(rows, page_size=PAGE_SIZE):
+    return max(1, -(-rows // page_size))
+
+
+def table_page(df, sort_by=None, descending=False, page=1, page_size=PAGE_SIZE):
+    """Sort a table on the server and return one page of it
+
+    Only this page is styled and sent to the browser, whatever the size of
+    the table. Pages past the end return the last page.
+    """
+    if sort_by is not None:
+        df = df.sort_values(sort_by, ascending=not descending, kind='stable', na_position='last')
+    page = min(max(page, 1), page_count(len(df), page_size))
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size]
@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+from data_store import CACHE_DIR, DATA_DIR, LOCATION_COLUMNS, TABLE_NAMES, data_version, load_table
+from spatial import distance_from_village, village_centroids
+
+# Table the issues are written to in the database, and file name of the pandas backend's copy
+ISSUES_TABLE = 'validation_issues'
+ISSUE_COLUMNS = ['check_name', 'table_name', 'hhid', 'submission_id',
+                 'selected_district', 'selected_subcounty', 'detail']
+ISSUE_DTYPES = {'hhid': 'int64', 'submission_id': 'int64'}
+CHECKS = {
+    'duplicate_hhid': "Household surveyed in more than one submission",
+    'orphan_rows': "Rows whose hhid has no survey submission",
+    'gps_far_from_village': "Household located far from the rest of its village",
+    'member_count_mismatch': "numhhmembers disagrees with the household member rows",
+}
+
+# A household this far from the median position of its village is flagged; villages span ~3 km
+GPS_MAX_DISTANCE_KM = 5.0
+# The median of fewer points cannot tell which of them is misplaced
+GPS_MIN_VILLAGE_POINTS = 3
+
+# Columns the checks read from each table
+CHILD_TABLES = [name for name in TABLE_NAMES if name != 'survey']
+VALIDATION_COLUMNS = {
+    'survey': ['_id', 'hhid'] + LOCATION_COLUMNS + ['_gpsloc_latitude', '_gpsloc_longitude', 'numhhmembers'],
+    **{name: ['hhid', '_submission__id'] for name in CHILD_TABLES},
+}
+
+
+def _issues(check, table, rows, hhid, submission_id, detail):
+    """Build issue rows from aligned columns, taking the location from ``rows`` when it has one"""
+    issues = pd.DataFrame({
+        'check_name': check,
+        'table_name': table,
+        'hhid': np.asarray(hhid),
+        'submission_id': np.asarray(submission_id),
+        'detail': np.asarray(detail, dtype=object),
+    })
+    for col in ['selected_district', 'selected_subcounty']:
+        issues[col] = rows[col].to_numpy(dtype=object) if col in rows.columns else None
+    return issues[ISSUE_COLUMNS]
+
+
+def duplicate_households(survey_df):
+    """Flag every submission after the first for a household; the first visit is the one analysed"""
+    repeated = survey_df['hhid'].duplicated()
+    if not repeated.any():
+        return None
+    first = survey_df.loc[~repeated].set_index('hhid')['_id']
+    repeats = survey_df.loc[repeated]
+    detail = 'also submitted as _id ' + repeats['hhid'].map(first).astype(str) + ', which is kept'
+    return _issues('duplicate_hhid', 'survey', repeats, repeats['hhid'], repeats['_id'], detail)
+
+
+def orphan_rows(frames):
+    """Flag child rows whose hhid matches no survey submission, one issue per table and submission"""
+    households = pd.Index(frames['survey']['hhid'].unique())
+    found = []
+    for name in CHILD_TABLES:
+        df = frames.get(name)
+        if df is None or df.empty:
+            continue
+        # Hash lookup of every row's hhid against the survey's
+        orphans = df.loc[households.get_indexer(df['hhid'].to_numpy()) < 0]
+        if orphans.empty:
+            continue
+        counts = orphans.groupby(['hhid', '_submission__id']).size().reset_index(name='rows')
+        detail = counts['rows'].astype(str) + ' row(s) with no survey submission for this hhid'
+        found.append(_issues('orphan_rows', name, counts, counts['hhid'], counts['_submission__id'], detail))
+    return pd.concat(found, ignore_index=True) if found else None
+
+
+def gps_outliers(survey_df, max_distance_km=GPS_MAX_DISTANCE_KM):
+    """Flag households further than ``max_distance_km`` from the median position of their village"""
+    households = survey_df.loc[~survey_df['hhid'].duplicated()].rename(
+        columns={'_gpsloc_latitude': 'latitude', '_gpsloc_longitude': 'longitude'})
+    centroids = village_centroids(households)
+    if centroids.empty:
+        return None
+    distance = distance_from_village(households, centroids)
+    keys = pd.MultiIndex.from_frame(households[LOCATION_COLUMNS].astype(object))
+    located = centroids['households'].reindex(keys).to_numpy() >= GPS_MIN_VILLAGE_POINTS
+    far = located & (distance > max_distance_km)
+    if not far.any():
+        return None
+    outliers = households.loc[far]
+    detail = [f"{km:,.1f} km from the centre of {village}" for km, village in
+              zip(distance[far], outliers['selected_village'].astype(str))]
+    return _issues('gps_far_from_village', 'survey', outliers, outliers['hhid'], outliers['_id'], detail)
+
+
+def member_count_mismatches(survey_df, hhmembers_df):
+    """Flag submissions whose numhhmembers differs from the number of hhmembers rows they carry"""
+    if hhmembers_df is None or 'numhhmembers' not in survey_df.columns:
+        return None
+    rows = hhmembers_df['_submission__id'].value_counts()
+    listed = survey_df['_id'].map(rows).fillna(0).astype(int)
+    reported = pd.to_numeric(survey_df['numhhmembers'], errors='coerce')
+    mismatched = reported.notna().to_numpy() & (reported != listed).to_numpy()
+    if not mismatched.any():
+        return None
+    survey_rows = survey_df.loc[mismatched]
+    detail = ('numhhmembers is ' + reported[mismatched].astype(int).astype(str) + ' but '
+              + listed[mismatched].astype(str) + ' member row(s) were recorded')
+    return _issues('member_count_mismatch', 'hhmembers', survey_rows, survey_rows['hhid'], survey_rows['_id'], detail)
+
+
+def validate(frames):
+    """Run every check over the five tables at once and return the issues, one row each
+
+    ``frames`` maps table names to frames holding at least
+    VALIDATION_COLUMNS; a missing child table skips its checks. Every check
+    is a column operation or a hash lookup on hhid or the submission id, so
+    the cost grows with the rows, not with households x rows.
+    """
+    survey_df = frames['survey']
+    found = [
+        duplicate_households(survey_df),
+        orphan_rows(frames),
+        gps_outliers(survey_df),
+        member_count_mismatches(survey_df, frames.get('hhmembers')),
+    ]
+    found = [issues for issues in found if issues is not None]
+    if not found:
+        return pd.DataFrame({col: pd.Series(dtype=ISSUE_DTYPES.get(col, object)) for col in ISSUE_COLUMNS})
+    return pd.concat(found, ignore_index=True).astype(ISSUE_DTYPES)
+
+
+def issue_counts(issues):
+    """Return the number of issues per check, every check listed"""
+    return issues['check_name'].value_counts().reindex(list(CHECKS), fill_value=0)
+
+
+def write_issues(conn, issues):
+    """Replace the issues table of a SQLite database with a fresh run's results"""
+    conn.execute('BEGIN')
+    try:
+        conn.execute(f"DROP TABLE IF EXISTS {ISSUES_TABLE}")
+        conn.execute(f"CREATE TABLE {ISSUES_TABLE} ({', '.join(ISSUE_COLUMNS)})")
+        rows = issues[ISSUE_COLUMNS].astype(object).where(issues[ISSUE_COLUMNS].notna(), None)
+        conn.executemany(f"INSERT INTO {ISSUES_TABLE} VALUES ({', '.join('?' * len(ISSUE_COLUMNS))})",
+                         rows.itertuples(index=False, name=None))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def _stage(conn, table, columns, rows):
+    """Load rows into a fresh temp table that the scoping queries join against"""
+    conn.execute(f"DROP TABLE IF EXISTS temp.{table}")
+    conn.execute(f"CREATE TEMP TABLE {table} ({', '.join(columns)})")
+    conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(columns))})", rows)
+
+
+def _read(conn, name, condition=''):
+    """Read a table's VALIDATION_COLUMNS (those it has) from a SQLite database"""
+    available = {row[1] for row in conn.execute(f'PRAGMA table_info("{name}")')}
+    columns = ', '.join(f'"{col}"' for col in VALIDATION_COLUMNS[name] if col in available)
+    return pd.read_sql_query(f'SELECT {columns} FROM "{name}" {condition}', conn)
+
+
+def revalidate(conn, submissions, previous):
+    """Re-run the checks around replaced survey submissions and update their issues in place
+
+    ``previous`` holds the hhid and location columns the submissions had
+    before an ingest replaced them (no rows for new ones). Only the survey
+    rows sharing an hhid or a village with the submissions, old or new, and
+    the child rows of those households and submissions are read and
+    checked, so the cost follows the submissions rather than the study. A
+    database that was never validated is checked in full. Returns every
+    issue the table now holds.
+    """
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    children = [name for name in CHILD_TABLES if name in tables]
+    if ISSUES_TABLE not in tables:
+        frames = {name: _read(conn, name) for name in children}
+        frames['survey'] = _read(conn, 'survey', 'ORDER BY _id')
+        issues = validate(frames)
+        write_issues(conn, issues)
+        return issues
+
+    locations = ', '.join(LOCATION_COLUMNS)
+    _stage(conn, 'validate_submissions', ['id INTEGER PRIMARY KEY'], ((int(i),) for i in submissions))
+    in_submissions = "(SELECT id FROM validate_submissions)"
+    touched = pd.concat([
+        pd.read_sql_query(f"SELECT hhid, {locations} FROM survey WHERE _id IN {in_submissions}", conn),
+        previous[['hhid'] + LOCATION_COLUMNS],
+    ] + [
+        # Repeat-group rows can name an hhid their survey row does not
+        pd.read_sql_query(f'SELECT DISTINCT hhid FROM "{name}" WHERE _submission__id IN {in_submissions}', conn)
+        for name in children
+    ])
+    hhids = {int(hhid) for hhid in touched['hhid'].dropna()}
+    villages = touched[LOCATION_COLUMNS].dropna().drop_duplicates()
+    _stage(conn, 'validate_hhids', ['hhid PRIMARY KEY'], ((hhid,) for hhid in hhids))
+    _stage(conn, 'validate_villages', LOCATION_COLUMNS, villages.itertuples(index=False, name=None))
+    in_hhids = "(SELECT hhid FROM validate_hhids)"
+
+    # Whole households, so the first visit and every duplicate are seen, for the touched hhids and villages
+    same_village = ' AND '.join(f"s.{col} = v.{col}" for col in LOCATION_COLUMNS)
+    frames = {'survey': _read(conn, 'survey', (
+        f"WHERE hhid IN {in_hhids} OR hhid IN "
+        f"(SELECT s.hhid FROM survey s JOIN validate_villages v ON {same_village}) ORDER BY _id"
+    ))}
+    for name in children:
+        frames[name] = _read(conn, name, f"WHERE _submission__id IN {in_submissions} OR hhid IN {in_hhids}")
+    issues = validate(frames)
+
+    # Keep only the issues whose inputs were read in full
+    survey_df = frames['survey']
+    in_village = pd.MultiIndex.from_frame(survey_df[LOCATION_COLUMNS].astype(object)).isin(
+        pd.MultiIndex.from_frame(villages.astype(object)))
+    village_rows = set(survey_df.loc[in_village, '_id'].astype('int64')) | set(submissions)
+    check = issues['check_name']
+    issues = issues[
+        (check.isin(['duplicate_hhid', 'orphan_rows']) & issues['hhid'].isin(hhids))
+        | ((check == 'gps_far_from_village') & issues['submission_id'].isin(village_rows))
+        | ((check == 'member_count_mismatch') & issues['submission_id'].isin(set(submissions)))
+    ]
+    _stage(conn, 'validate_village_rows', ['id INTEGER PRIMARY KEY'], ((int(i),) for i in village_rows))
+
+    conn.execute('BEGIN')
+    try:
+        conn.execute(
+            f"DELETE FROM {ISSUES_TABLE} WHERE "
+            f"(check_name IN ('duplicate_hhid', 'orphan_rows') "
+            f" AND (hhid IN {in_hhids} OR submission_id IN {in_submissions})) "
+            f"OR (check_name = 'gps_far_from_village' AND submission_id IN (SELECT id FROM validate_village_rows)) "
+            f"OR (check_name = 'member_count_mismatch' AND submission_id IN {in_submissions})"
+        )
+        rows = issues[ISSUE_COLUMNS].astype(object).where(issues[ISSUE_COLUMNS].notna(), None)
+        conn.executemany(f"INSERT INTO {ISSUES_TABLE} VALUES ({', '.join('?' * len(ISSUE_COLUMNS))})",
+                         rows.itertuples(index=False, name=None))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return pd.read_sql_query(f"SELECT {', '.join(ISSUE_COLUMNS)} FROM {ISSUES_TABLE}", conn).astype(ISSUE_DTYPES)
+
+
+def _cache_paths(cache_dir):
+    return os.path.join(cache_dir, f"{ISSUES_TABLE}.feather"), os.path.join(cache_dir, f"{ISSUES_TABLE}.json")
+
+
+def ensure_issues(data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """Validate the columnar cache once per data version; return the path of the issues file"""
+    version = data_version(data_dir=data_dir, cache_dir=cache_dir)
+    path, meta_path = _cache_paths(cache_dir)
+    try:
+        with open(meta_path) as f:
+            if json.load(f).get('data_version') == version and os.path.exists(path):
+                return path
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+    frames = {name: load_table(name, columns, data_dir, cache_dir) for name, columns in VALIDATION_COLUMNS.items()}
+    issues = validate(frames)
+    tmp_path = path + '.tmp'
+    feather.write_feather(issues, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+    with open(meta_path, 'w') as f:
+        json.dump({'data_version': version, 'issues': len(issues)}, f, indent=2)
+    return path
+
+
+def load_issues(data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """Read the pandas backend's issues, validating first only if the exports changed since"""
+    return feather.read_table(ensure_issues(data_dir, cache_dir)).to_pandas()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check the exports for duplicate, orphaned and inconsistent records")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--check', choices=list(CHECKS), help="Only list issues from this check")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    issues = load_issues(args.data_dir)
+    for check, count in issue_counts(issues).items():
+        print(f"{check}: {count:,} ({CHECKS[check]})")
+    if args.check:
+        issues = issues[issues['check_name'] == args.check]
+    if not issues.empty:
+        print()
+        print(issues.to_string(index=False))